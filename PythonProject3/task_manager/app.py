@@ -1,12 +1,89 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+import click
 import json
+import os
+import base64
+
+db = SQLAlchemy()
+
+# Маршруты и команды приложения; create_app() подключает их к экземпляру Flask
+bp = Blueprint('task_manager', __name__, cli_group=None)
+
+# Профили подключения к SQLite. production включает WAL (читатели не ждут писателя),
+# ожидание блокировки вместо мгновенной ошибки "database is locked" и пул побольше
+SQLITE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',        # в режиме WAL безопасно и намного быстрее FULL
+            'busy_timeout': 5000,           # мс ожидания занятой базы
+            'cache_size': -64000,           # отрицательное значение - в КиБ, т.е. ~64 МБ
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY'
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30
+        }
+    }
+}
+
+
+def create_app(config=None):
+    """Создать и настроить приложение.
+
+    config - словарь настроек поверх значений по умолчанию. Таблицы фабрика
+    не создает: это делает `flask init-db`.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('TASK_MANAGER_DATABASE_URI', 'sqlite:///tasks.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Настройки SQLite: 'production' (см. SQLITE_PROFILES) или 'default' - как у драйвера
+    app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+
+    app.config.update(config or {})
+    app.config.setdefault(
+        'SQLALCHEMY_ENGINE_OPTIONS', SQLITE_PROFILES[app.config['SQLITE_PROFILE']]['engine_options']
+    )
+
+    db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+
+    app.register_blueprint(bp)
+    return app
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Выставляет PRAGMA выбранного профиля на каждом новом соединении"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PROFILES[current_app.config['SQLITE_PROFILE']]['pragmas'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+    dbapi_connection.create_function('casefold', 1, sql_casefold, deterministic=True)
+
+
+def sql_casefold(value):
+    """casefold() для SQL: lower() и LIKE в SQLite не меняют регистр кириллицы"""
+    return value.casefold() if isinstance(value, str) else value
+
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+def task_search_filter(search):
+    """Условие поиска подстроки в названии или описании без учета регистра"""
+    term = search.casefold()
+    return db.or_(
+        db.func.instr(db.func.casefold(Task.title), term) > 0,
+        db.func.instr(db.func.casefold(Task.description), term) > 0
+    )
 
 
 # Модель задачи
@@ -33,23 +110,44 @@ class Task(db.Model):
         }
 
 
-# Создаем таблицы
-with app.app_context():
+@bp.cli.command('init-db')
+def init_db_command():
+    """Создать таблицы базы данных"""
     db.create_all()
+    click.echo('База данных готова')
+
+
+# Размер страницы для постраничной выдачи задач
+TASKS_PAGE_SIZE = 50
+TASKS_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(task):
+    """Кодирует позицию задачи (created_at, id) в непрозрачный курсор"""
+    raw = f"{task.created_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирует курсор в пару (created_at, id). Бросает ValueError для некорректного курсора"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, task_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(task_id)
 
 
-@app.route('/')
+@bp.route('/')
 def index():
     """Главная страница"""
     return render_template('index.html')
 
 
-@app.route('/api/tasks', methods=['GET'])
+@bp.route('/api/tasks', methods=['GET'])
 def get_tasks():
     """Получить все задачи с фильтрацией"""
     status_filter = request.args.get('status')
     priority_filter = request.args.get('priority')
     category_filter = request.args.get('category')
+    search = request.args.get('q', '').strip()
 
     query = Task.query
 
@@ -59,12 +157,43 @@ def get_tasks():
         query = query.filter_by(priority=priority_filter)
     if category_filter and category_filter != 'all':
         query = query.filter_by(category=category_filter)
+    if search:
+        query = query.filter(task_search_filter(search))
 
-    tasks = query.order_by(Task.created_at.desc()).all()
-    return jsonify([task.to_dict() for task in tasks])
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
+
+    # Без limit/after возвращаем весь список, как раньше
+    if 'limit' not in request.args and 'after' not in request.args:
+        return jsonify([task.to_dict() for task in query.all()])
+
+    try:
+        limit = int(request.args.get('limit', TASKS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Некорректный параметр limit'}), 400
+    limit = max(1, min(limit, TASKS_MAX_PAGE_SIZE))
+
+    after = request.args.get('after')
+    if after:
+        try:
+            after_created_at, after_id = decode_cursor(after)
+        except ValueError:
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        query = query.filter(db.or_(
+            Task.created_at < after_created_at,
+            db.and_(Task.created_at == after_created_at, Task.id < after_id)
+        ))
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    tasks = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(tasks[limit - 1]) if len(tasks) > limit else None
+
+    return jsonify({
+        'tasks': [task.to_dict() for task in tasks[:limit]],
+        'next_cursor': next_cursor
+    })
 
 
-@app.route('/api/tasks', methods=['POST'])
+@bp.route('/api/tasks', methods=['POST'])
 def create_task():
     """Создать новую задачу"""
     data = request.json
@@ -91,7 +220,7 @@ def create_task():
     return jsonify(task.to_dict()), 201
 
 
-@app.route('/api/tasks/<int:task_id>', methods=['PUT'])
+@bp.route('/api/tasks/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
     """Обновить задачу"""
     task = Task.query.get_or_404(task_id)
@@ -117,7 +246,7 @@ def update_task(task_id):
     return jsonify(task.to_dict())
 
 
-@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@bp.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Удалить задачу"""
     task = Task.query.get_or_404(task_id)
@@ -126,7 +255,7 @@ def delete_task(task_id):
     return jsonify({'message': 'Task deleted successfully'})
 
 
-@app.route('/api/stats')
+@bp.route('/api/stats')
 def get_stats():
     """Получить статистику по задачам"""
     total = Task.query.count()
@@ -150,7 +279,7 @@ def get_stats():
     })
 
 
-@app.route('/api/categories')
+@bp.route('/api/categories')
 def get_categories():
     """Получить список всех категорий"""
     categories = db.session.query(Task.category).distinct().filter(Task.category.isnot(None)).all()
@@ -158,4 +287,7 @@ def get_categories():
 
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        db.create_all()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -17,16 +17,35 @@ document.addEventListener('DOMContentLoaded', function() {
         category: 'all'
     };
 
-    // Загрузить задачи
+    // Постраничная загрузка задач (бесконечная прокрутка)
+    const TASKS_PAGE_SIZE = 50;
+    let nextCursor = null;
+    let loadingMoreTasks = false;
+    let tasksRequestId = 0;
+
+    const tasksSentinel = document.createElement('div');
+    tasksSentinel.className = 'tasks-sentinel';
+
+    const sentinelObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreTasks();
+        }
+    }, { rootMargin: '200px' });
+
+    // Загрузить задачи (первая страница)
     function loadTasks() {
         tasksContainer.innerHTML = '<div class="loading"><i class="fas fa-spinner fa-spin"></i> Загрузка задач...</div>';
 
-        const params = new URLSearchParams(currentFilters);
+        const requestId = ++tasksRequestId;
+        nextCursor = null;
 
-        fetch(`/api/tasks?${params}`)
-            .then(response => response.json())
-            .then(tasks => {
-                displayTasks(tasks);
+        fetchTasksPage(null)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                nextCursor = page.next_cursor;
+                displayTasks(page.tasks);
                 updateStats();
                 loadCategories();
             })
@@ -36,6 +55,47 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Запросить одну страницу задач начиная с курсора
+    function fetchTasksPage(cursor) {
+        const params = new URLSearchParams(currentFilters);
+        const searchTerm = searchInput.value.trim();
+        if (searchTerm) {
+            params.set('q', searchTerm);
+        }
+        params.set('limit', TASKS_PAGE_SIZE);
+        if (cursor) {
+            params.set('after', cursor);
+        }
+
+        return fetch(`/api/tasks?${params}`)
+            .then(response => response.json());
+    }
+
+    // Догрузить следующую страницу при прокрутке
+    function loadMoreTasks() {
+        if (!nextCursor || loadingMoreTasks) {
+            return;
+        }
+
+        const requestId = tasksRequestId;
+        loadingMoreTasks = true;
+
+        fetchTasksPage(nextCursor)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                nextCursor = page.next_cursor;
+                appendTasks(page.tasks);
+            })
+            .catch(error => {
+                console.error('Ошибка загрузки задач:', error);
+            })
+            .finally(() => {
+                loadingMoreTasks = false;
+            });
+    }
+
     // Отобразить задачи
     function displayTasks(tasks) {
         if (tasks.length === 0) {
@@ -50,19 +110,22 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         tasksContainer.innerHTML = '';
+        tasksContainer.appendChild(tasksSentinel);
+        appendTasks(tasks);
+    }
 
-        const searchTerm = searchInput.value.toLowerCase();
-
+    // Добавить задачи в конец списка
+    function appendTasks(tasks) {
         tasks.forEach(task => {
-            // Фильтр поиска
-            if (searchTerm && !task.title.toLowerCase().includes(searchTerm) &&
-                !task.description.toLowerCase().includes(searchTerm)) {
-                return;
-            }
-
             const taskElement = createTaskElement(task);
-            tasksContainer.appendChild(taskElement);
+            tasksContainer.insertBefore(taskElement, tasksSentinel);
         });
+
+        // Повторно наблюдаем за маркером: если он все еще виден, догружаем дальше
+        sentinelObserver.unobserve(tasksSentinel);
+        if (nextCursor) {
+            sentinelObserver.observe(tasksSentinel);
+        }
     }
 
     // Создать элемент задачи
@@ -318,9 +381,13 @@ document.addEventListener('DOMContentLoaded', function() {
         loadTasks();
     });
 
-    // Поиск
+    // Поиск выполняет сервер; запрос уходит после паузы в наборе
+    const SEARCH_DELAY = 300;
+    let searchTimer = null;
+
     searchInput.addEventListener('input', function() {
-        loadTasks();
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadTasks, SEARCH_DELAY);
     });
 
     // Показать уведомление
@@ -0,0 +1,9 @@
+"""Бенчмарки HTTP API Task Manager.
+
+    python -m benchmarks.seed --tasks 100000        # подготовить базу (кешируется)
+    python -m benchmarks.run --tasks 100000         # замеры через тестовый клиент Flask
+    python -m benchmarks.run --tasks 100000 --server --concurrency 8
+    python -m benchmarks.compare old.json new.json  # сравнить два отчета
+
+Команды запускаются из каталога PythonProject4.
+"""
@@ -0,0 +1,101 @@
+"""Общие функции бенчмарков"""
+import os
+import shutil
+import sys
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(PROJECT_DIR, 'task_manager')
+DATA_DIR = os.path.join(PROJECT_DIR, 'benchmarks', '.data')
+RESULTS_DIR = os.path.join(PROJECT_DIR, 'benchmarks', 'results')
+
+
+def import_task_app():
+    """Импортировать task_manager/app.py"""
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+
+    import app as task_app
+    return task_app
+
+
+def load_app(db_path, config=None, init_schema=True):
+    """Импортировать task_manager/app.py и создать приложение над базой db_path.
+
+    Возвращает пару (модуль, приложение); config дополняет настройки. Схема
+    базы приводится к текущей, как после `flask init-db`, если не передано
+    init_schema=False (несколько процессов над уже готовой базой). Фоновые
+    отправители писем отключаются, SMTP в замерах не участвует.
+    """
+    task_app = import_task_app()
+    app = task_app.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(db_path),
+        'EMAIL_INPROCESS_WORKERS': False,
+        **(config or {})
+    })
+    if init_schema:
+        with app.app_context():
+            task_app.init_database()
+    return task_app, app
+
+
+def database_files(db_path):
+    """Файлы базы db_path: сама база и архив, который приложение подключает рядом с ней"""
+    return db_path, import_task_app().archive_database_path(db_path)
+
+
+def copy_database(source_path, target_path):
+    """Скопировать базу вместе с архивом (если он есть)"""
+    for source, target in zip(database_files(source_path), database_files(target_path)):
+        if os.path.exists(source):
+            shutil.copyfile(source, target)
+
+
+def move_database(source_path, target_path):
+    """Переместить базу вместе с архивом (если он есть)"""
+    for source, target in zip(database_files(source_path), database_files(target_path)):
+        if os.path.exists(source):
+            shutil.move(source, target)
+
+
+def git_revision():
+    """Текущий коммит (с пометкой -dirty при незакоммиченных изменениях)"""
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--', 'task_manager'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return revision + ('-dirty' if dirty else '')
+
+
+def reset_peak_rss(pid='self'):
+    """Сбросить пиковое потребление памяти процесса (Linux, /proc/<pid>/clear_refs)"""
+    try:
+        with open(f'/proc/{pid}/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb(pid='self'):
+    """Пиковый RSS процесса в МБ с момента последнего reset_peak_rss()"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    if pid == 'self':
+        # Без /proc доступен только пик за все время жизни процесса
+        import resource
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+    return None
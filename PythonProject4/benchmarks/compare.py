@@ -0,0 +1,67 @@
+"""Сравнение двух отчетов benchmarks.run.
+
+    python -m benchmarks.compare benchmarks/results/old.json benchmarks/results/new.json
+
+Для каждого сценария печатает задержки и пропускную способность обоих отчетов
+и изменение в процентах; ухудшение больше --threshold процентов помечается.
+"""
+import argparse
+import json
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def change(old, new):
+    """Изменение new относительно old в процентах"""
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сравнить два отчета бенчмарков')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='порог регрессии p95, %%')
+    args = parser.parse_args()
+
+    old, new = load_report(args.old), load_report(args.new)
+    for label, report in (('было', old), ('стало', new)):
+        meta = report['meta']
+        print(f"{label}: {meta['revision']}, {meta['tasks']} задач, {meta['mode']}, {meta['created_at']}")
+    if (old['meta']['tasks'], old['meta']['mode']) != (new['meta']['tasks'], new['meta']['mode']):
+        print('Внимание: отчеты сняты на разных размерах базы или в разных режимах')
+
+    old_results = {row['name']: row for row in old['results']}
+    header = f"{'сценарий':<24}{'p50 мс':>20}{'p95 мс':>20}{'p99 мс':>20}{'req/s':>20}"
+    print(header)
+    print('-' * len(header))
+
+    regressions = 0
+    for row in new['results']:
+        before = old_results.get(row['name'])
+        if before is None:
+            print(f"{row['name']:<24}  (нет в старом отчете)")
+            continue
+
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            delta = change(before[key], row[key])
+            delta_text = f'{delta:+.0f}%' if delta is not None else '-'
+            cells.append(f"{before[key] or 0:.1f}→{row[key] or 0:.1f} {delta_text:>5}")
+
+        p95_delta = change(before['p95_ms'], row['p95_ms'])
+        marker = ''
+        if p95_delta is not None and p95_delta > args.threshold:
+            marker = '  <- регрессия'
+            regressions += 1
+        print(f"{row['name']:<24}" + ''.join(f'{cell:>20}' for cell in cells) + marker)
+
+    print(f'Регрессий p95 больше {args.threshold:.0f}%: {regressions}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Сжатие ответов: сколько байт экономит каждый уровень gzip/brotli и сколько это стоит CPU.
+
+    python -m benchmarks.compression --tasks 10000 [--bandwidth 10]
+
+Ответы берутся у приложения без сжатия (тестовый клиент Flask, копия
+кешированной базы) и сжимаются теми же компрессорами, что в app.py, частями,
+как их отдает приложение. Время передачи считается для канала --bandwidth
+Мбит/с: сжатие окупается, когда выигрыш (передача без сжатия минус сжатие и
+передача сжатого) положительный. brotli замеряется, если он установлен.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from .common import copy_database, load_app
+from .seed import DEFAULT_SEED, ensure_database
+
+PAYLOADS = (
+    ('tasks_page', '/api/tasks?limit=200'),
+    ('tasks_search', '/api/tasks/search?q=отчет&limit=200'),
+    ('tasks_full_list', '/api/tasks'),
+    ('tasks_export_ndjson', '/api/tasks/export?format=ndjson'),
+)
+LEVELS = (('gzip', 1), ('gzip', 6), ('gzip', 9), ('br', 1), ('br', 4), ('br', 6), ('br', 11))
+REPEATS = 3          # лучший из запусков; долгое сжатие (больше секунды) не повторяется
+
+
+def fetch_chunks(client, path):
+    """Тело ответа без сжатия списком частей, как их отдает приложение"""
+    response = client.get(path, buffered=False)
+    try:
+        return [chunk.encode() if isinstance(chunk, str) else chunk for chunk in response.response]
+    finally:
+        response.close()
+
+
+def compress_chunks(task_app, encoding, level, chunks):
+    """Сжать части так же, как compress_response(); вернуть (размер, секунды CPU)"""
+    best = None
+    for _ in range(REPEATS):
+        started = time.process_time()
+        if encoding == 'br':
+            compressor = task_app.brotli.Compressor(quality=level)
+        else:
+            compressor = task_app.GzipCompressor(level)
+        if len(chunks) == 1:
+            size = len(compressor.process(chunks[0]) + compressor.finish())
+        else:
+            size = sum(len(compressor.process(chunk) + compressor.flush()) for chunk in chunks)
+            size += len(compressor.finish())
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+        if elapsed > 1:
+            break
+    return size, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры сжатия ответов Task Manager')
+    parser.add_argument('--tasks', type=int, default=10_000, help='размер базы (10000, 100000, 1000000)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--bandwidth', type=float, default=10, help='скорость канала клиента, Мбит/с')
+    args = parser.parse_args()
+
+    source_path = ensure_database(args.tasks, args.seed)
+    work_dir = tempfile.mkdtemp(prefix='task-manager-bench-')
+    db_path = os.path.join(work_dir, 'tasks.db')
+    copy_database(source_path, db_path)
+
+    try:
+        task_app, app = load_app(db_path)
+        client = app.test_client()
+        bytes_per_second = args.bandwidth * 1_000_000 / 8
+        levels = [(encoding, level) for encoding, level in LEVELS if encoding == 'gzip' or task_app.brotli]
+
+        header = (f"{'ответ':<22}{'сжатие':<9}{'КБ':>10}{'% от исх.':>11}{'CPU мс':>9}"
+                  f"{'МБ/с':>8}{'передача мс':>13}{'выигрыш мс':>12}")
+        print(f'{args.tasks} задач, канал {args.bandwidth:g} Мбит/с')
+        print(header)
+        print('-' * len(header))
+        for name, path in PAYLOADS:
+            chunks = fetch_chunks(client, path)
+            raw_size = sum(len(chunk) for chunk in chunks)
+            raw_transfer = raw_size / bytes_per_second
+            print(f"{name:<22}{'-':<9}{raw_size / 1024:>10.1f}{100:>11.1f}{0:>9.1f}{'-':>8}"
+                  f"{raw_transfer * 1000:>13.1f}{0:>12.1f}")
+            for encoding, level in levels:
+                size, cpu = compress_chunks(task_app, encoding, level, chunks)
+                transfer = size / bytes_per_second
+                speed = raw_size / cpu / 2 ** 20 if cpu else float('inf')
+                print(f"{'':<22}{f'{encoding}-{level}':<9}{size / 1024:>10.1f}{size / raw_size * 100:>11.1f}"
+                      f"{cpu * 1000:>9.1f}{speed:>8.0f}{transfer * 1000:>13.1f}"
+                      f"{(raw_transfer - cpu - transfer) * 1000:>12.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Параллельные чтения и записи в отдельных процессах для профилей SQLite.
+
+    python -m benchmarks.concurrency --tasks 10000 [--duration 8] [--profiles default,production]
+
+Каждый клиент - отдельный процесс со своим приложением (тестовый клиент
+Flask) над общей копией кешированной базы, как воркеры gunicorn. Сценарии:
+  readers  - 4 читателя страниц списка;
+  mixed    - 4 читателя и 4 писателя, меняющих статус случайных задач;
+  batch    - 3 читателя и пакетная вставка по 5000 задач подряд.
+Для каждого профиля (SQLITE_PROFILE) и сценария база копируется заново.
+Выводятся чтения и записи в секунду, p50/p99 чтений и число ошибок
+(ответы 5xx, в том числе `database is locked`).
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from .common import copy_database, database_files, load_app
+from .seed import DEFAULT_SEED, ensure_database
+
+SCENARIOS = {
+    'readers': {'reader': 4},
+    'mixed': {'reader': 4, 'writer': 4},
+    'batch': {'reader': 3, 'batch': 1},
+}
+BATCH_SIZE = 5000
+START_DELAY = 3  # секунд на импорт и создание приложения во всех процессах
+
+
+def client_process(role, number, db_path, profile, task_count, start_at, duration, results):
+    """Один клиент: выполнять запросы роли role от start_at в течение duration секунд"""
+    _, app = load_app(db_path, {'SQLITE_PROFILE': profile, 'METRICS_ENABLED': False}, init_schema=False)
+    client = app.test_client()
+    rnd = random.Random(number)
+    latencies = []
+    errors = 0
+
+    time.sleep(max(0, start_at - time.time()))
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        started = time.perf_counter()
+        if role == 'reader':
+            status = rnd.choice(('all', 'pending', 'in_progress', 'completed'))
+            response = client.get(f'/api/tasks?limit=50&status={status}')
+        elif role == 'writer':
+            status = rnd.choice(('pending', 'in_progress', 'completed'))
+            response = client.put(f'/api/tasks/{rnd.randint(1, task_count)}', json={'status': status})
+        else:
+            response = client.post('/api/tasks/batch', json={
+                'tasks': [{'title': f'Пакет {number}-{index}'} for index in range(BATCH_SIZE)]
+            })
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 500:
+            errors += 1
+        else:
+            latencies.append(elapsed)
+    results.put((role, latencies, errors))
+
+
+def prepare_database(source_path, work_dir, profile):
+    """Копия базы в work_dir с текущей схемой; для профиля default - в исходном режиме журнала драйвера"""
+    db_path = os.path.join(work_dir, 'tasks.db')
+    copy_database(source_path, db_path)
+    # Схему доводим один раз здесь, а не в каждом клиенте
+    task_app, app = load_app(db_path)
+    with app.app_context():
+        task_app.db.engine.dispose()
+    if profile == 'default':
+        # Режим WAL хранится в самом файле, а профиль default его не сбрасывает
+        for path in database_files(db_path):
+            if os.path.exists(path):
+                with sqlite3.connect(path) as connection:
+                    connection.execute('PRAGMA journal_mode=DELETE')
+    return db_path
+
+
+def run_scenario(source_path, task_count, profile, roles, duration):
+    """Запустить клиентов roles над новой копией базы и собрать их результаты по ролям"""
+    work_dir = tempfile.mkdtemp(prefix='task-manager-bench-')
+    try:
+        db_path = prepare_database(source_path, work_dir, profile)
+        results = multiprocessing.Queue()
+        start_at = time.time() + START_DELAY
+        processes = [
+            multiprocessing.Process(
+                target=client_process,
+                args=(role, number, db_path, profile, task_count, start_at, duration, results)
+            )
+            for number, role in enumerate(role for role, count in roles.items() for _ in range(count))
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    by_role = {}
+    for role, latencies, errors in collected:
+        total = by_role.setdefault(role, {'latencies': [], 'errors': 0})
+        total['latencies'] += latencies
+        total['errors'] += errors
+    return by_role
+
+
+def percentile_ms(values, percent):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Параллельные чтения и записи для профилей SQLite')
+    parser.add_argument('--tasks', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--duration', type=float, default=8, help='секунд на сценарий')
+    parser.add_argument('--profiles', default='default,production')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    args = parser.parse_args()
+
+    source_path = ensure_database(args.tasks, args.seed)
+    header = (f"{'сценарий':<10}{'профиль':<12}{'чтений/с':>10}{'p50 чт., мс':>13}{'p99 чт., мс':>13}"
+              f"{'записей/с':>11}{'ошибок':>8}")
+    print(f'{args.tasks} задач, {args.duration:g} с на сценарий, CPU: {os.cpu_count()}')
+    print(header)
+    print('-' * len(header))
+    for scenario in args.scenarios.split(','):
+        for profile in args.profiles.split(','):
+            by_role = run_scenario(source_path, args.tasks, profile, SCENARIOS[scenario], args.duration)
+            reads = by_role.get('reader', {'latencies': [], 'errors': 0})
+            writes = [by_role[role] for role in ('writer', 'batch') if role in by_role]
+            # Пакет считается числом вставленных задач
+            write_count = sum(len(total['latencies']) * (BATCH_SIZE if role == 'batch' else 1)
+                              for role, total in by_role.items() if role != 'reader')
+            errors = reads['errors'] + sum(total['errors'] for total in writes)
+            print(f"{scenario:<10}{profile:<12}{len(reads['latencies']) / args.duration:>10.0f}"
+                  f"{percentile_ms(reads['latencies'], 50):>13.1f}{percentile_ms(reads['latencies'], 99):>13.1f}"
+                  f"{write_count / args.duration:>11.0f}{errors:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Прогон сценариев и отчет о задержках по каждому маршруту.
+
+    python -m benchmarks.run --tasks 10000 [--requests 200] [--scenarios stats,tasks_search]
+    python -m benchmarks.run --tasks 100000 --server --concurrency 8
+    python -m benchmarks.run --tasks 100000 --accept-encoding gzip
+
+Каждый прогон работает с копией кешированной базы (benchmarks.seed), поэтому
+изменяющие сценарии не влияют на следующие запуски. Для каждого сценария
+считаются p50/p95/p99, пропускная способность и пиковый RSS процесса, который
+обрабатывает запросы. Отчет в JSON сохраняется в benchmarks/results/ и
+сравнивается с отчетом другого коммита через benchmarks.compare.
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from .common import PROJECT_DIR, RESULTS_DIR, copy_database, git_revision, load_app, peak_rss_mb, reset_peak_rss
+from .scenarios import SCENARIOS, RunContext
+from .seed import DEFAULT_SEED, ensure_database
+
+SERVER_START_TIMEOUT = 30
+
+
+class TestClientTarget:
+    """Запросы через тестовый клиент Flask в текущем процессе"""
+
+    def __init__(self, db_path, headers):
+        _, app = load_app(db_path)
+        self.client = app.test_client()
+        self.headers = headers
+        self.pid = 'self'
+
+    def send(self, method, path, body):
+        response = self.client.open(path, method=method, json=body, headers=self.headers)
+        response.get_data()
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class ServerTarget:
+    """Запросы по HTTP к серверу из benchmarks.server в отдельном процессе"""
+
+    def __init__(self, db_path, port, threads, headers):
+        self.port = port
+        self.headers = headers
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.server', '--db', db_path,
+             '--port', str(port), '--threads', str(threads)],
+            cwd=PROJECT_DIR
+        )
+        self.pid = self.process.pid
+        self.local = threading.local()
+        self.wait_until_ready()
+
+    def wait_until_ready(self):
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('Сервер завершился при запуске')
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError('Сервер не запустился')
+
+    def send(self, method, path, body):
+        # Соединение keep-alive на поток
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port)
+
+        headers = dict(self.headers)
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        try:
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            self.local.connection = None
+            raise
+        return response.status
+
+    def close(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def percentile(sorted_values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+def to_ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+def build_requests(scenario, ctx, count):
+    """Заранее построить запросы сценария: пары (подготовительный запрос, (path, json))"""
+    requests = []
+    for _ in range(count):
+        request = scenario.build(ctx)
+        if request is None:
+            break
+        requests.append((scenario.prepare(ctx) if scenario.prepare else None, request))
+    return requests
+
+
+def run_scenario(target, scenario, requests, concurrency):
+    """Выполнить запросы сценария и вернуть строку отчета"""
+    latencies = []
+    errors = []
+
+    def worker(chunk):
+        for prepare, (path, body) in chunk:
+            if prepare:
+                target.send(*prepare)
+            started = time.perf_counter()
+            try:
+                status = target.send(scenario.method, path, body)
+            except Exception:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                errors.append(status)
+
+    reset_peak_rss(target.pid)
+    started = time.perf_counter()
+    if concurrency == 1:
+        worker(requests)
+    else:
+        threads = [threading.Thread(target=worker, args=(requests[number::concurrency],))
+                   for number in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    # Время всего сценария, включая подготовительные запросы
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    rss = peak_rss_mb(target.pid)
+    return {
+        'name': scenario.name,
+        'method': scenario.method,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'p50_ms': to_ms(percentile(latencies, 50)),
+        'p95_ms': to_ms(percentile(latencies, 95)),
+        'p99_ms': to_ms(percentile(latencies, 99)),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if latencies and elapsed else None,
+        'peak_rss_mb': None if rss is None else round(rss, 1)
+    }
+
+
+def print_report(results):
+    header = f"{'сценарий':<24}{'n':>6}{'ошибки':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}{'req/s':>10}{'RSS МБ':>9}"
+    print(header)
+    print('-' * len(header))
+    for row in results:
+        if not row['requests']:
+            print(f"{row['name']:<24}{0:>6}   (нет запросов)")
+            continue
+        print(f"{row['name']:<24}{row['requests']:>6}{row['errors']:>8}{row['p50_ms']:>10.2f}"
+              f"{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['throughput_rps']:>10.1f}"
+              f"{row['peak_rss_mb'] if row['peak_rss_mb'] is not None else '-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры HTTP API Task Manager')
+    parser.add_argument('--tasks', type=int, default=10_000, help='размер базы (10000, 100000, 1000000)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--requests', type=int, default=200, help='замеряемых запросов на сценарий')
+    parser.add_argument('--heavy-requests', type=int, default=5,
+                        help='запросов для сценариев, ответ которых растет с размером базы')
+    parser.add_argument('--warmup', type=int, default=5, help='незамеряемых запросов перед сценарием')
+    parser.add_argument('--scenarios', help='список сценариев через запятую (по умолчанию все)')
+    parser.add_argument('--server', action='store_true', help='запускать приложение на WSGI-сервере')
+    parser.add_argument('--concurrency', type=int, default=1, help='параллельных клиентов (только с --server)')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--accept-encoding', help='заголовок Accept-Encoding запросов (gzip, br), по умолчанию без сжатия')
+    parser.add_argument('--output', help='файл отчета (по умолчанию benchmarks/results/...)')
+    args = parser.parse_args()
+
+    if args.concurrency > 1 and not args.server:
+        parser.error('--concurrency больше 1 поддерживается только с --server')
+
+    scenarios = SCENARIOS
+    if args.scenarios:
+        names = set(args.scenarios.split(','))
+        unknown = names - {scenario.name for scenario in SCENARIOS}
+        if unknown:
+            parser.error(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+        scenarios = [scenario for scenario in SCENARIOS if scenario.name in names]
+
+    source_path = ensure_database(args.tasks, args.seed)
+    work_dir = tempfile.mkdtemp(prefix='task-manager-bench-')
+    db_path = os.path.join(work_dir, 'tasks.db')
+    copy_database(source_path, db_path)
+
+    ctx = RunContext(db_path, args.seed)
+    mode = f'server-c{args.concurrency}' if args.server else 'client'
+    headers = {}
+    if args.accept_encoding:
+        headers['Accept-Encoding'] = args.accept_encoding
+        mode += f'-{args.accept_encoding}'
+    if args.server:
+        target = ServerTarget(db_path, args.port, max(8, args.concurrency), headers)
+    else:
+        target = TestClientTarget(db_path, headers)
+
+    results = []
+    try:
+        for scenario in scenarios:
+            count = min(args.requests, args.heavy_requests) if scenario.heavy else args.requests
+            warmup = min(args.warmup, count)
+            for prepare, (path, body) in build_requests(scenario, ctx, warmup):
+                if prepare:
+                    target.send(*prepare)
+                target.send(scenario.method, path, body)
+            results.append(run_scenario(target, scenario, build_requests(scenario, ctx, count), args.concurrency))
+    finally:
+        target.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    revision = git_revision()
+    report = {
+        'meta': {
+            'revision': revision,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'tasks': args.tasks,
+            'seed': args.seed,
+            'mode': mode,
+            'concurrency': args.concurrency,
+            'accept_encoding': args.accept_encoding,
+            'requests': args.requests,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform()
+        },
+        'results': results
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f'{revision}-{args.tasks}-{mode}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{revision}, {args.tasks} задач, {mode}")
+    print_report(results)
+    print(f'Отчет: {output}')
+
+
+if __name__ == '__main__':
+    main()
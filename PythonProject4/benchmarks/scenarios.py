@@ -0,0 +1,144 @@
+"""Сценарии нагрузки: по одному или несколько на каждый маршрут app.py.
+
+Сценарий строит очередной запрос из состояния прогона (RunContext). Изменяющие
+сценарии берут id из пулов, поэтому удаления не попадают в уже удаленные задачи.
+Не замеряются: /api/events (бесконечный поток SSE), /api/email/test
+(синхронная отправка через настоящий SMTP-сервер) и /api/tasks/import (тело
+запроса - файл, а не JSON).
+"""
+import base64
+import random
+import sqlite3
+from collections import namedtuple
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from .seed import BASE_DATE, CATEGORIES, RECIPIENTS, WORDS
+
+BATCH_SIZE = 100
+
+# build(ctx) -> (path, json) или None, если сценарию больше нечего делать.
+# prepare(ctx) -> (method, path, json): незамеряемый запрос перед каждым замером.
+# heavy - ответ пропорционален размеру базы, число запросов ограничено --heavy-requests
+Scenario = namedtuple('Scenario', 'name method build prepare heavy')
+Scenario.__new__.__defaults__ = (None, False)
+
+
+class RunContext:
+    """Состояние прогона: генератор случайных чисел и пулы id для изменяющих сценариев"""
+
+    def __init__(self, db_path, seed):
+        self.rng = random.Random(seed)
+
+        connection = sqlite3.connect(db_path)
+        try:
+            self.max_task_id = connection.execute('SELECT COALESCE(MAX(id), 0) FROM task').fetchone()[0]
+            self.data_version = connection.execute(
+                "SELECT COALESCE(MAX(value), 0) FROM app_state WHERE key = 'data_version'"
+            ).fetchone()[0]
+            self.outbox_ids = [row[0] for row in connection.execute('SELECT id FROM email_outbox')]
+            self.dead_outbox_ids = [row[0] for row in connection.execute(
+                "SELECT id FROM email_outbox WHERE status = 'dead' ORDER BY id DESC"
+            )]
+        finally:
+            connection.close()
+
+        # Удаляем задачи с конца диапазона, обновляем - из начала, чтобы пулы не пересекались
+        self.next_delete_id = self.max_task_id
+        self.update_id_limit = max(1, self.max_task_id // 2)
+
+    def random_task_id(self):
+        return self.rng.randint(1, self.update_id_limit)
+
+    def take_task_ids(self, count):
+        """Забрать count id задач для удаления (каждый id выдается один раз)"""
+        low = max(self.update_id_limit + 1, self.next_delete_id - count + 1)
+        ids = list(range(low, self.next_delete_id + 1))
+        self.next_delete_id = low - 1
+        return ids
+
+    def random_date(self):
+        return (BASE_DATE + timedelta(days=self.rng.randint(0, 365))).strftime('%Y-%m-%d')
+
+    def random_cursor(self):
+        """Курсор /api/tasks из случайной точки ленты (формат encode_cursor)"""
+        created_at = BASE_DATE + timedelta(seconds=self.rng.randint(0, self.max_task_id * 30))
+        raw = f'{created_at.isoformat()}|{self.max_task_id + 1}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def new_task(self):
+        return {
+            'title': ' '.join(self.rng.choices(WORDS, k=3)),
+            'description': ' '.join(self.rng.choices(WORDS, k=12)),
+            'priority': self.rng.choice(('low', 'medium', 'high')),
+            'category': self.rng.choice(CATEGORIES),
+            'due_date': self.random_date()
+        }
+
+
+def one_id(ctx):
+    ids = ctx.take_task_ids(1)
+    return ids[0] if ids else None
+
+
+def take_dead_outbox_id(ctx):
+    return ctx.dead_outbox_ids.pop() if ctx.dead_outbox_ids else None
+
+
+SCENARIOS = [
+    # Чтение
+    Scenario('index', 'GET', lambda ctx: ('/', None)),
+    Scenario('tasks_full_list', 'GET', lambda ctx: ('/api/tasks', None), heavy=True),
+    Scenario('tasks_export_ndjson', 'GET', lambda ctx: ('/api/tasks/export?format=ndjson', None), heavy=True),
+    Scenario('tasks_export_csv', 'GET', lambda ctx: ('/api/tasks/export?format=csv', None), heavy=True),
+    Scenario('tasks_first_page', 'GET', lambda ctx: ('/api/tasks?limit=50', None)),
+    Scenario('tasks_deep_page', 'GET', lambda ctx: (f'/api/tasks?limit=50&after={ctx.random_cursor()}', None)),
+    Scenario('tasks_filtered_page', 'GET', lambda ctx: ('/api/tasks?' + urlencode({
+        'limit': 50,
+        'status': ctx.rng.choice(('pending', 'in_progress', 'completed')),
+        'priority': ctx.rng.choice(('low', 'medium', 'high')),
+        'category': ctx.rng.choice(CATEGORIES)
+    }), None)),
+    Scenario('tasks_due_range', 'GET', lambda ctx: ('/api/tasks?' + urlencode({
+        'limit': 50, 'sort': 'due_date', 'due_after': ctx.random_date(), 'due_before': ctx.random_date()
+    }), None)),
+    Scenario('tasks_by_priority', 'GET', lambda ctx: ('/api/tasks?limit=50&sort=priority', None)),
+    Scenario('tasks_overdue', 'GET', lambda ctx: ('/api/tasks/overdue?limit=50', None)),
+    Scenario('tasks_search', 'GET', lambda ctx: (
+        '/api/tasks/search?' + urlencode({'limit': 20, 'q': ctx.rng.choice(WORDS)}), None)),
+    Scenario('tasks_changes', 'GET', lambda ctx: (f'/api/tasks/changes?since={max(0, ctx.data_version - 5)}', None)),
+    Scenario('stats', 'GET', lambda ctx: ('/api/stats', None)),
+    Scenario('categories', 'GET', lambda ctx: ('/api/categories', None)),
+    Scenario('email_settings_get', 'GET', lambda ctx: ('/api/email/settings', None)),
+    Scenario('email_presets', 'GET', lambda ctx: ('/api/email/presets', None)),
+    Scenario('email_outbox_list', 'GET', lambda ctx: ('/api/email/outbox?status=sent', None)),
+    Scenario('email_outbox_get', 'GET', lambda ctx: (f'/api/email/outbox/{ctx.rng.choice(ctx.outbox_ids)}', None)
+             if ctx.outbox_ids else None),
+
+    # Изменение
+    Scenario('task_create', 'POST', lambda ctx: ('/api/tasks', ctx.new_task())),
+    Scenario('task_update', 'PUT', lambda ctx: (
+        f'/api/tasks/{ctx.random_task_id()}', {'status': ctx.rng.choice(('pending', 'in_progress', 'completed'))})),
+    Scenario('task_send_email', 'POST', lambda ctx: (
+        f'/api/tasks/{ctx.random_task_id()}/send-email', {'email': ctx.rng.choice(RECIPIENTS)})),
+    Scenario('tasks_batch_create', 'POST', lambda ctx: (
+        '/api/tasks/batch', {'tasks': [ctx.new_task() for _ in range(BATCH_SIZE)]})),
+    Scenario('tasks_batch_update', 'PUT', lambda ctx: ('/api/tasks/batch', {'tasks': [
+        {'id': ctx.random_task_id(), 'priority': ctx.rng.choice(('low', 'medium', 'high'))}
+        for _ in range(BATCH_SIZE)
+    ]})),
+    Scenario('email_settings_save', 'POST', lambda ctx: ('/api/email/settings', {
+        'smtp_server': 'localhost', 'smtp_port': 2525, 'use_tls': False,
+        'username': 'bench@example.com', 'password': 'secret'
+    })),
+    Scenario('email_settings_delete', 'DELETE', lambda ctx: ('/api/email/settings', None),
+             prepare=lambda ctx: ('POST', '/api/email/settings', {'smtp_server': 'localhost', 'smtp_port': 2525})),
+    Scenario('email_outbox_retry', 'POST', lambda ctx: (
+        None if not ctx.dead_outbox_ids else (f'/api/email/outbox/{take_dead_outbox_id(ctx)}/retry', None))),
+
+    # Удаление - последним, чтобы чтение шло по исходной базе
+    Scenario('task_delete', 'DELETE', lambda ctx: (
+        None if (task_id := one_id(ctx)) is None else (f'/api/tasks/{task_id}', None))),
+    Scenario('tasks_batch_delete', 'DELETE', lambda ctx: (
+        None if not (ids := ctx.take_task_ids(BATCH_SIZE)) else ('/api/tasks/batch', {'ids': ids}))),
+]
@@ -0,0 +1,189 @@
+"""Детерминированный генератор базы для бенчмарков.
+
+    python -m benchmarks.seed --tasks 100000 [--seed 42] [--output path]
+
+Одинаковые --tasks и --seed всегда дают одинаковую базу: даты отсчитываются
+от BASE_DATE, а не от текущего момента. Без --output база сохраняется в
+benchmarks/.data и переиспользуется следующими запусками.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from .common import DATA_DIR, PROJECT_DIR, database_files, load_app, move_database
+
+SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_SEED = 42
+BASE_DATE = datetime(2024, 1, 1)
+INSERT_CHUNK = 10_000
+TASKS_PER_VERSION = 100  # задачи "создаются" пакетами, каждый пакет - новая версия данных
+
+STATUSES = ('pending', 'in_progress', 'completed')
+STATUS_WEIGHTS = (45, 20, 35)
+PRIORITIES = ('low', 'medium', 'high')
+PRIORITY_WEIGHTS = (30, 50, 20)
+# Категории распределены неравномерно, как в реальных данных: первые встречаются чаще
+CATEGORIES = (
+    'Работа', 'Дом', 'Учеба', 'Здоровье', 'Финансы', 'Покупки',
+    'Проекты', 'Встречи', 'Путешествия', 'Спорт', 'Чтение', 'Разное'
+)
+CATEGORY_WEIGHTS = tuple(1 / (rank + 1) for rank in range(len(CATEGORIES)))
+NO_CATEGORY_SHARE = 0.1
+NO_DUE_DATE_SHARE = 0.3
+NO_DESCRIPTION_SHARE = 0.2
+ASSIGNED_SHARE = 0.15
+OUTBOX_PER_TASKS = 100  # одно письмо в очереди на столько задач
+
+WORDS = (
+    'отчет', 'встреча', 'договор', 'презентация', 'бюджет', 'клиент', 'проект',
+    'релиз', 'сервер', 'принтер', 'ремонт', 'покупка', 'оплата', 'документы',
+    'счет', 'план', 'анализ', 'тестирование', 'дизайн', 'звонок', 'письмо',
+    'квартал', 'команда', 'обучение', 'курс', 'экзамен', 'врач', 'тренировка',
+    'книга', 'поездка', 'билеты', 'гостиница', 'налоги', 'страховка', 'задача',
+    'report', 'release', 'deploy', 'review', 'backup', 'invoice', 'meeting'
+)
+RECIPIENTS = tuple(f'user{number}@example.com' for number in range(50))
+
+
+def database_path(count, seed=DEFAULT_SEED):
+    """Путь к кешированной базе для заданного размера и зерна"""
+    return os.path.join(DATA_DIR, f'tasks-{count}-seed{seed}.db')
+
+
+def generate_tasks(count, seed=DEFAULT_SEED):
+    """Генерирует count строк таблицы task (словари для INSERT)"""
+    rng = random.Random(seed)
+    for number in range(count):
+        created_at = BASE_DATE + timedelta(seconds=number * 30 + rng.randrange(30),
+                                           microseconds=rng.randrange(1_000_000))
+        due_date = None
+        if rng.random() >= NO_DUE_DATE_SHARE:
+            due_date = datetime.combine((created_at + timedelta(days=rng.randint(-5, 60))).date(),
+                                        datetime.min.time())
+        category = None
+        if rng.random() >= NO_CATEGORY_SHARE:
+            category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+        description = None
+        if rng.random() >= NO_DESCRIPTION_SHARE:
+            description = ' '.join(rng.choices(WORDS, k=rng.randint(5, 30)))
+
+        yield {
+            'title': ' '.join(rng.choices(WORDS, k=rng.randint(2, 5))).capitalize(),
+            'description': description,
+            'status': rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+            'priority': rng.choices(PRIORITIES, PRIORITY_WEIGHTS)[0],
+            'created_at': created_at,
+            'due_date': due_date,
+            'category': category,
+            'assigned_email': rng.choice(RECIPIENTS) if rng.random() < ASSIGNED_SHARE else None,
+            'version': number // TASKS_PER_VERSION + 1
+        }
+
+
+def generate_outbox(count, seed=DEFAULT_SEED):
+    """Генерирует строки очереди писем: в основном отправленные, часть - dead"""
+    rng = random.Random(seed + 1)
+    for number in range(count // OUTBOX_PER_TASKS):
+        created_at = BASE_DATE + timedelta(minutes=number)
+        status = rng.choices(('sent', 'dead', 'queued'), (80, 15, 5))[0]
+        yield {
+            'task_id': rng.randint(1, count),
+            'recipient': rng.choice(RECIPIENTS),
+            'payload': json.dumps({'title': rng.choice(WORDS)}, ensure_ascii=False),
+            'status': status,
+            'attempts': 5 if status == 'dead' else 1,
+            'last_error': 'Connection refused' if status == 'dead' else None,
+            'next_attempt_at': created_at,
+            'created_at': created_at,
+            'sent_at': created_at if status == 'sent' else None,
+            'digest': False
+        }
+
+
+def chunks(rows, size=INSERT_CHUNK):
+    """Разбить поток строк на списки по size"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed_database(path, count, seed=DEFAULT_SEED):
+    """Создать в path базу с count задачами. Файл не должен существовать"""
+    task_app, app = load_app(path)
+    db = task_app.db
+
+    with app.app_context():
+        category_ids = task_app.get_category_ids(CATEGORIES)
+        for chunk in chunks(generate_tasks(count, seed)):
+            for row in chunk:
+                row['category_id'] = category_ids.get(row.pop('category'))
+            db.session.execute(db.insert(task_app.Task), chunk)
+        for chunk in chunks(generate_outbox(count, seed)):
+            db.session.execute(db.insert(task_app.EmailOutbox), chunk)
+        db.session.execute(db.insert(task_app.AppState), [
+            {'key': 'data_version', 'value': (count - 1) // TASKS_PER_VERSION + 1 if count else 0}
+        ])
+        db.session.commit()
+        # Счетчики, индексы и статистика планировщика - как после migrate-db
+        task_app.migrate_database()
+        # Копия базы не должна тянуть за собой WAL-файлы
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+        db.engine.dispose()
+
+
+def ensure_database(count, seed=DEFAULT_SEED):
+    """Вернуть путь к кешированной базе, при необходимости создав ее в отдельном процессе.
+
+    Отдельный процесс нужен, чтобы память и соединения генерации не оставались
+    в процессе замеров.
+    """
+    path = database_path(count, seed)
+    if not os.path.exists(path):
+        subprocess.run(
+            [sys.executable, '-m', 'benchmarks.seed', '--tasks', str(count), '--seed', str(seed)],
+            cwd=PROJECT_DIR, check=True
+        )
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Создать базу для бенчмарков')
+    parser.add_argument('--tasks', type=int, default=SIZES[0], help=f'число задач, обычно одно из {SIZES}')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--output', help='путь к базе (по умолчанию кеш в benchmarks/.data)')
+    args = parser.parse_args()
+
+    path = args.output or database_path(args.tasks, args.seed)
+    if os.path.exists(path):
+        print(f'{path} уже существует')
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Пишем во временный файл, чтобы прерванный запуск не оставил неполную базу в кеше.
+    # Расширение то же: по имени базы приложение находит файл архива
+    root, ext = os.path.splitext(path)
+    temp_path = f'{root}.tmp{ext}'
+    for temp_file in database_files(temp_path):
+        for leftover in (temp_file, temp_file + '-wal', temp_file + '-shm'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    started = time.perf_counter()
+    seed_database(temp_path, args.tasks, args.seed)
+    move_database(temp_path, path)
+    print(f'{path}: {args.tasks} задач за {time.perf_counter() - started:.1f} с')
+
+
+if __name__ == '__main__':
+    main()
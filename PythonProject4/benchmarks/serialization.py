@@ -0,0 +1,100 @@
+"""Сериализация полного списка задач: ORM + to_dict() против колонок и orjson.
+
+    python -m benchmarks.serialization [--tasks 10000,100000] [--repeats 3]
+
+Каждый путь выполняется в контексте запроса над копией кешированной базы:
+запрос к базе, сборка словарей и кодирование JSON, как в GET /api/tasks без
+limit. Выводится лучшее время из --repeats запусков. Ответы путей с jsonify
+сравниваются побайтно, ответ orjson - после разбора JSON.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .common import copy_database, load_app
+from .seed import DEFAULT_SEED, ensure_database
+
+
+def orm_jsonify(task_app):
+    """Прежний путь: объекты Task и to_dict()"""
+    Task = task_app.Task
+    tasks = Task.query.order_by(Task.created_at.desc(), Task.id.desc()).all()
+    return task_app.jsonify([task.to_dict() for task in tasks]).get_data()
+
+
+def columns_jsonify(task_app):
+    """Колонки select_task_rows() и jsonify"""
+    Task, db = task_app.Task, task_app.db
+    rows = db.session.execute(task_app.select_task_rows().order_by(Task.created_at.desc(), Task.id.desc()))
+    return task_app.jsonify(task_app.task_rows_to_dicts(rows)).get_data()
+
+
+def columns_orjson(task_app):
+    """Колонки select_task_rows() и orjson (TASKS_JSON_ORJSON)"""
+    Task, db = task_app.Task, task_app.db
+    rows = db.session.execute(task_app.select_task_rows().order_by(Task.created_at.desc(), Task.id.desc()))
+    return task_app.tasks_json_response(task_app.task_rows_to_dicts(rows)).get_data()
+
+
+PATHS = (
+    ('to_dict+jsonify', orm_jsonify),
+    ('columns+jsonify', columns_jsonify),
+    ('columns+orjson', columns_orjson),
+)
+
+
+def measure(task_app, app, path, repeats):
+    """Лучшее время из repeats запусков path и тело последнего ответа"""
+    best = None
+    for _ in range(repeats):
+        with app.test_request_context('/api/tasks'):
+            started = time.perf_counter()
+            body = path(task_app)
+            elapsed = time.perf_counter() - started
+            # Следующий запуск не должен брать объекты из identity map сессии
+            task_app.db.session.remove()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры сериализации списка задач')
+    parser.add_argument('--tasks', default='10000,100000', help='размеры баз через запятую')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    header = f"{'задач':>8}{'путь':>18}{'время, с':>11}{'МБ':>8}  ответ"
+    print(header)
+    print('-' * len(header))
+    for count in (int(value) for value in args.tasks.split(',')):
+        work_dir = tempfile.mkdtemp(prefix='task-manager-bench-')
+        db_path = os.path.join(work_dir, 'tasks.db')
+        copy_database(ensure_database(count, args.seed), db_path)
+        try:
+            task_app, app = load_app(db_path)
+            app.config['TASKS_JSON_ORJSON'] = True
+            reference = None
+            for name, path in PATHS:
+                if path is columns_orjson and task_app.orjson is None:
+                    print(f'{count:>8}{name:>18}  orjson не установлен')
+                    continue
+                elapsed, body = measure(task_app, app, path, args.repeats)
+                if reference is None:
+                    reference, check = body, 'эталон'
+                elif path is columns_orjson:
+                    check = 'тот же JSON' if json.loads(body) == json.loads(reference) else 'ОТЛИЧАЕТСЯ'
+                else:
+                    check = 'побайтно совпадает' if body == reference else 'ОТЛИЧАЕТСЯ'
+                print(f'{count:>8}{name:>18}{elapsed:>11.3f}{len(body) / 2 ** 20:>8.1f}  {check}')
+            with app.app_context():
+                task_app.db.engine.dispose()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Запуск приложения на настоящем WSGI-сервере для бенчмарков.
+
+    python -m benchmarks.server --db path [--port 8765] [--threads 8]
+
+Используется waitress, если он установлен, иначе многопоточный сервер werkzeug.
+"""
+import argparse
+import logging
+
+from .common import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='WSGI-сервер для бенчмарков')
+    parser.add_argument('--db', required=True, help='путь к базе')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    _, app = load_app(args.db)
+
+    try:
+        import waitress
+    except ImportError:
+        waitress = None
+
+    if waitress is not None:
+        waitress.serve(app, host=args.host, port=args.port, threads=args.threads, _quiet=True)
+    else:
+        from werkzeug.serving import make_server
+        # Журнал запросов werkzeug заметно замедляет сервер и засоряет вывод
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
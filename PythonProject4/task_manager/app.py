@@ -1,20 +1,283 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Blueprint, Flask, Response, current_app, render_template, request, jsonify, redirect, url_for, session, g, has_request_context, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy import event
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.sql.util import ClauseAdapter
+from markupsafe import escape
+from datetime import datetime, timedelta
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+import codecs
+import csv
+import io
 import json
 import os
+import re
 import secrets
+import base64
+import click
+import hashlib
+import heapq
+import threading
+import queue
+import time
+import zlib
+from itertools import islice
+from collections import OrderedDict
+from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = secrets.token_hex(16)
+from smtp_pool import SMTPConnectionPool
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость, без нее используется стандартный json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость, без нее ответы сжимаются только gzip
+    brotli = None
+
+db = SQLAlchemy()
+
+# Маршруты и команды приложения; create_app() подключает их к экземпляру Flask
+bp = Blueprint('task_manager', __name__, cli_group=None)
+
+# Профили подключения к SQLite. production включает WAL (читатели не ждут писателя),
+# ожидание блокировки вместо мгновенной ошибки "database is locked" и пул побольше
+SQLITE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',        # в режиме WAL безопасно и намного быстрее FULL
+            'busy_timeout': 5000,           # мс ожидания занятой базы
+            'cache_size': -64000,           # отрицательное значение - в КиБ, т.е. ~64 МБ
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY'
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30
+        }
+    }
+}
+
+
+def create_app(config=None):
+    """Создать и настроить приложение.
+
+    config - словарь настроек поверх значений по умолчанию. Схему базы
+    фабрика не трогает: таблицы создает и обновляет `flask init-db`.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('TASK_MANAGER_DATABASE_URI', 'sqlite:///tasks.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Файл архива выполненных задач; по умолчанию рядом с базой: tasks.db -> tasks-archive.db
+    app.config['ARCHIVE_DATABASE'] = os.environ.get('TASK_MANAGER_ARCHIVE_DATABASE')
+
+    # Очередь исходящих писем
+    app.config['EMAIL_WORKER_THREADS'] = 2        # потоков-отправителей в каждом процессе
+    app.config['EMAIL_INPROCESS_WORKERS'] = True  # False, если очередь разбирает отдельный процесс `flask email-worker`
+    app.config['EMAIL_MAX_ATTEMPTS'] = 5
+    app.config['EMAIL_RETRY_BASE_DELAY'] = 30     # секунд, удваивается с каждой попыткой
+    app.config['EMAIL_SENDING_TIMEOUT'] = 300     # через сколько секунд зависшее письмо снова берется в работу
+    app.config['EMAIL_POLL_INTERVAL'] = 5
+    app.config['EMAIL_DIGEST_ENABLED'] = False    # уведомления о назначении собираются в дайджест на получателя
+    app.config['EMAIL_DIGEST_WINDOW'] = 300       # секунд, в течение которых копятся задачи для дайджеста
+    app.config['EMAIL_TEST_QUEUED'] = True        # тестовое письмо через очередь: запрос не ждет SMTP-сервер
+    app.config['EMAIL_SETTINGS_CACHE_TTL'] = 5    # секунд, через сколько процесс проверяет, не сменили ли настройки другие процессы
+
+    # Пул SMTP-соединений
+    app.config['SMTP_POOL_SIZE'] = 4
+    app.config['SMTP_POOL_IDLE_TIMEOUT'] = 60  # секунд простоя до закрытия соединения
+    app.config['SMTP_TIMEOUT'] = 30
+
+    # Письма
+    app.config['APP_URL'] = 'http://localhost:5000'  # ссылка на приложение в письмах
+    app.config['EMAIL_RENDER_CACHE_SIZE'] = 1024     # сколько отрендеренных писем держать в памяти
+
+    # Поток событий (SSE)
+    app.config['EVENTS_POLL_INTERVAL'] = 1    # секунд между проверками новых событий в базе
+    app.config['EVENTS_HEARTBEAT'] = 15       # секунд между keep-alive комментариями в потоке
+    app.config['EVENTS_RETENTION'] = 3600     # сколько секунд хранить события для переподключений
+    app.config['EVENTS_PRUNE_INTERVAL'] = 60  # секунд между очистками журнала в процессе
+    app.config['EVENTS_QUEUE_SIZE'] = 1000    # сколько событий копить для медленного клиента
+    # Каждый открытый поток занимает поток веб-сервера (у gunicorn - один из
+    # GUNICORN_THREADS воркера). Сверх EVENTS_MAX_STREAMS в процессе новые потоки
+    # получают 503, чтобы вкладки не заняли все потоки и API продолжал отвечать.
+    # Поток закрывается через EVENTS_STREAM_MAX_AGE секунд, браузер переподключается
+    # с Last-Event-ID и не теряет событий
+    app.config['EVENTS_MAX_STREAMS'] = 8
+    app.config['EVENTS_STREAM_MAX_AGE'] = 300
+
+    # Пакетные операции над задачами
+    app.config['BATCH_MAX_ITEMS'] = 10000
+
+    # Импорт задач из файла (/api/tasks/import): сколько строк вставлять в одной транзакции
+    app.config['IMPORT_CHUNK_SIZE'] = 5000
+
+    # Архивация (`flask archive-tasks`): через сколько дней после выполнения задача
+    # уходит в архив и сколько задач переносить в одной транзакции
+    app.config['ARCHIVE_AFTER_DAYS'] = 90
+    app.config['ARCHIVE_BATCH_SIZE'] = 1000
+
+    # Сериализация списков задач. orjson заметно быстрее, но выдает не-ASCII символы
+    # как UTF-8, а не \uXXXX, поэтому ответ перестает совпадать с jsonify побайтно
+    app.config['TASKS_JSON_ORJSON'] = False
+
+    # Сжатие ответов: gzip или br (если установлен brotli), по заголовку Accept-Encoding.
+    # Ответы целиком сжимаются от COMPRESS_MIN_SIZE байт, потоковые - всегда
+    app.config['COMPRESS_ENABLED'] = True
+    app.config['COMPRESS_MIMETYPES'] = ('application/json', 'application/x-ndjson', 'text/csv')
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_GZIP_LEVEL'] = 6       # 1-9
+    app.config['COMPRESS_BROTLI_QUALITY'] = 4   # 0-11
+
+    # Метрики запросов и SQL (/metrics, заголовок Server-Timing). Счетчики свои в каждом процессе
+    app.config['METRICS_ENABLED'] = True
+    app.config['METRICS_SERVER_TIMING'] = True
+
+    # Настройки SQLite: 'production' (см. SQLITE_PROFILES) или 'default' - как у драйвера
+    app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+
+    app.config.update(config or {})
+    if not app.config['SECRET_KEY']:
+        app.config['SECRET_KEY'] = load_secret_key(app)
+    app.config.setdefault(
+        'SQLALCHEMY_ENGINE_OPTIONS', SQLITE_PROFILES[app.config['SQLITE_PROFILE']]['engine_options']
+    )
+
+    db.init_app(app)
+    with app.app_context():
+        if not app.config['ARCHIVE_DATABASE']:
+            app.config['ARCHIVE_DATABASE'] = archive_database_path(db.engine.url.database)
+        event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+        event.listen(db.engine, 'before_cursor_execute', before_sql)
+        event.listen(db.engine, 'after_cursor_execute', after_sql)
+
+    # Пулы, кеши и фоновые потоки свои у каждого приложения: два приложения в
+    # одном процессе (например, на разных базах) не делят соединения, настройки
+    # и очереди. Код берет их через current_app.extensions
+    app.extensions['smtp_pool'] = SMTPConnectionPool(app.config['SMTP_POOL_SIZE'], app.config['SMTP_POOL_IDLE_TIMEOUT'])
+    app.extensions['email_settings_cache'] = EmailSettingsCache()
+    app.extensions['email_parts_cache'] = EmailPartsCache()
+    app.extensions['email_workers'] = EmailWorkers(app)
+    app.extensions['event_broker'] = EventBroker(app)
+    app.extensions['request_metrics'] = RequestMetrics()
+
+    app.register_blueprint(bp)
+    return app
+
+
+def load_secret_key(app):
+    """SECRET_KEY из TASK_MANAGER_SECRET_KEY или из файла instance/secret_key.
+
+    Файл создается при первом запуске и дальше только читается, поэтому ключ
+    общий для всех воркеров и не меняется при перезапуске: сессия, выданная
+    одним процессом, действительна в другом.
+    """
+    secret_key = os.environ.get('TASK_MANAGER_SECRET_KEY')
+    if secret_key:
+        return secret_key
+
+    path = os.path.join(app.instance_path, 'secret_key')
+    if not os.path.exists(path):
+        os.makedirs(app.instance_path, exist_ok=True)
+        # Ключ пишется во временный файл и появляется под своим именем атомарно:
+        # из воркеров, стартовавших одновременно, ключ создаст только один
+        temp_path = f'{path}.{os.getpid()}'
+        with open(temp_path, 'w') as f:
+            f.write(secrets.token_hex(32))
+        os.chmod(temp_path, 0o600)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    with open(path) as f:
+        return f.read().strip()
+
+
+def archive_database_path(database):
+    """Путь к файлу архива рядом с файлом базы database"""
+    if not database or database == ':memory:':
+        return ':memory:'
+    root, ext = os.path.splitext(database)
+    return f'{root}-archive{ext}'
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Подключает архив и выставляет PRAGMA выбранного профиля на каждом новом соединении"""
+    cursor = dbapi_connection.cursor()
+    # До PRAGMA: journal_mode без имени схемы применяется ко всем подключенным файлам
+    cursor.execute('ATTACH DATABASE ? AS archive', (current_app.config['ARCHIVE_DATABASE'],))
+    for name, value in SQLITE_PROFILES[current_app.config['SQLITE_PROFILE']]['pragmas'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    create_archive_schema(cursor)
+    cursor.close()
 
-db = SQLAlchemy(app)
+
+def create_archive_schema(cursor):
+    """Создать таблицу архива с индексами, если подключенный файл архива пуст.
+
+    ATTACH молча создает пустой файл на месте отсутствующего архива (его
+    удалили, перенесли или ARCHIVE_DATABASE указывает на новый путь), и запросы
+    с include_archived=true падали бы на отсутствующей таблице.
+    """
+    cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'archived_task'")
+    if cursor.fetchone():
+        return
+
+    dialect = db.engine.dialect
+    table = ArchivedTask.__table__
+    # IF NOT EXISTS: архив могут создавать одновременно несколько процессов
+    statements = [str(CreateTable(table, if_not_exists=True).compile(dialect=dialect))]
+    statements += [str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect)) for index in table.indexes]
+    for statement in [*statements, *ARCHIVE_SEARCH_DDL]:
+        cursor.execute(statement)
+
+
+# Статусы и приоритеты задач. В базе хранится номер значения в кортеже
+# (SQLite тратит на такие числа 0-1 байт вместо строки), в API - строка.
+# Приоритеты идут по возрастанию важности, поэтому ORDER BY priority DESC
+# ставит первыми важные задачи
+TASK_STATUSES = ('pending', 'in_progress', 'completed')
+TASK_PRIORITIES = ('low', 'medium', 'high')
+
+
+class CodedChoice(db.TypeDecorator):
+    """Строка из фиксированного набора values, которая хранится ее номером в наборе"""
+    impl = db.SmallInteger
+    cache_ok = True
+
+    def __init__(self, values):
+        super().__init__()
+        self.values = tuple(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.codes[value]
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.values[value]
+
+
+# Категории задач. Задача ссылается на категорию по id, а task_count
+# поддерживают триггеры (CATEGORY_COUNT_DDL) при любом изменении задач
+class Category(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
 
 
 # Модель задачи
@@ -22,12 +285,43 @@ class Task(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='pending')
-    priority = db.Column(db.String(10), default='medium')
+    status = db.Column(CodedChoice(TASK_STATUSES), nullable=False, default='pending')
+    priority = db.Column(CodedChoice(TASK_PRIORITIES), nullable=False, default='medium')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
-    category = db.Column(db.String(50), nullable=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     assigned_email = db.Column(db.String(100), nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # версия данных при последнем изменении
+    completed_at = db.Column(db.DateTime, nullable=True)        # когда задача стала выполненной, ставят триггеры COMPLETED_AT_DDL
+
+    category_ref = db.relationship(Category, lazy='joined')
+
+    # Индексы под реальные запросы: список задач фильтруется по status/priority/category_id
+    # и сортируется по (created_at, id), по сроку (due_date, id) или по приоритету и сроку;
+    # статистика считает по status и priority. Частичный индекс ix_task_overdue
+    # содержит только невыполненные задачи со сроком, ix_task_completed_at нужен архивации
+    __table_args__ = (
+        db.Index('ix_task_created_at_id', 'created_at', 'id'),
+        db.Index('ix_task_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_task_priority_created_at_id', 'priority', 'created_at', 'id'),
+        db.Index('ix_task_category_id_created_at_id', 'category_id', 'created_at', 'id'),
+        db.Index('ix_task_version_id', 'version', 'id'),
+        db.Index('ix_task_due_date_id', 'due_date', 'id'),
+        # due_date IS NULL в ключе вместо NULLS LAST: иначе SQLite досортировывает хвост ORDER BY
+        db.Index('ix_task_priority_due_date_id', db.text('priority DESC'), db.text('due_date IS NULL'), 'due_date', 'id'),
+        db.Index('ix_task_overdue', 'due_date', 'id',
+                 sqlite_where=db.text(f"status != {TASK_STATUSES.index('completed')} AND due_date IS NOT NULL")),
+        db.Index('ix_task_completed_at', 'completed_at'),
+    )
+
+    @property
+    def category(self):
+        """Название категории задачи"""
+        return self.category_ref.name if self.category_ref else None
+
+    @category.setter
+    def category(self, name):
+        self.category_ref = db.session.get(Category, get_category_ids([name])[name]) if name else None
 
     def to_dict(self):
         return {
@@ -39,10 +333,91 @@ class Task(db.Model):
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M'),
             'due_date': self.due_date.strftime('%Y-%m-%d') if self.due_date else None,
             'category': self.category,
-            'assigned_email': self.assigned_email
+            'assigned_email': self.assigned_email,
+            'version': self.version
         }
 
 
+# Архив выполненных задач. Лежит в отдельном файле SQLite (ARCHIVE_DATABASE), который
+# подключается к каждому соединению как схема archive, поэтому основная база
+# не растет от старых задач. Колонки те же, что у Task, задача сохраняет свой id.
+# Переносит задачи `flask archive-tasks`; в выдачу архив попадает с include_archived=true
+class ArchivedTask(db.Model):
+    __tablename__ = 'archived_task'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    status = db.Column(CodedChoice(TASK_STATUSES), nullable=False)
+    priority = db.Column(CodedChoice(TASK_PRIORITIES), nullable=False)
+    created_at = db.Column(db.DateTime)
+    due_date = db.Column(db.DateTime, nullable=True)
+    category_id = db.Column(db.Integer, nullable=True)  # без внешнего ключа: category в другом файле
+    assigned_email = db.Column(db.String(100), nullable=True)
+    version = db.Column(db.Integer, nullable=False)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+    # Версия данных, с которой задачи нет в task. Вместо отметки об удалении:
+    # /api/tasks/changes сообщает об архивации по этой колонке, а таблица
+    # task_tombstone не растет от архивации. NULL - перенос еще не закончен
+    archived_version = db.Column(db.Integer, nullable=True)
+
+    # Те же индексы, что у Task для выдачи задач
+    __table_args__ = (
+        db.Index('ix_archived_task_archived_version', 'archived_version'),
+        db.Index('ix_archived_task_created_at_id', 'created_at', 'id'),
+        db.Index('ix_archived_task_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_archived_task_priority_created_at_id', 'priority', 'created_at', 'id'),
+        db.Index('ix_archived_task_category_id_created_at_id', 'category_id', 'created_at', 'id'),
+        db.Index('ix_archived_task_due_date_id', 'due_date', 'id'),
+        db.Index('ix_archived_task_priority_due_date_id',
+                 db.text('priority DESC'), db.text('due_date IS NULL'), 'due_date', 'id'),
+        {'schema': 'archive'},
+    )
+
+
+def next_task_id():
+    """id для новой задачи: больше всех id и в task, и в архиве.
+
+    Сама SQLite выдает max(id) + 1 только по таблице task и могла бы отдать
+    новой задаче id архивной. Вызывать после bump_data_version(): тогда
+    транзакция держит блокировку записи и max(id) не изменится.
+    """
+    return max(
+        db.session.scalar(db.select(db.func.max(Task.id))) or 0,
+        db.session.scalar(db.select(db.func.max(ArchivedTask.id))) or 0
+    ) + 1
+
+
+# Название категории задачи для выборок колонками, без загрузки ORM-объектов
+task_category_name = db.select(Category.name).where(Category.id == Task.category_id).scalar_subquery()
+
+
+def get_category_ids(names):
+    """Словарь {название: id} для категорий names; недостающие создаются в текущей транзакции.
+
+    Пустые названия означают задачу без категории и пропускаются.
+    """
+    names = list({name for name in names if name})
+    if not names:
+        return {}
+    stmt = sqlite_insert(Category).on_conflict_do_nothing(index_elements=['name'])
+    db.session.execute(stmt, [{'name': name, 'task_count': 0} for name in names])
+    category_ids = {}
+    for chunk in chunked(names):
+        category_ids.update(db.session.execute(
+            db.select(Category.name, Category.id).where(Category.name.in_(chunk))
+        ).all())
+    return category_ids
+
+
+# Отметка об удаленной задаче для синхронизации изменений (/api/tasks/changes)
+class TaskTombstone(db.Model):
+    task_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 # Модель для хранения настроек email (новое)
 class EmailSettings(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -58,6 +433,10 @@ class EmailSettings(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_email_settings_user_id_is_active', 'user_id', 'is_active'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -73,16 +452,933 @@ class EmailSettings(db.Model):
         }
 
 
-# Создаем таблицы
-with app.app_context():
+# Очередь исходящих писем (outbox). Запись добавляется в той же транзакции,
+# что и задача, а доставкой занимаются фоновые обработчики
+class EmailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=True, index=True)
+    recipient = db.Column(db.String(200), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON с данными задачи на момент постановки в очередь
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    digest = db.Column(db.Boolean, nullable=False, default=False)  # отправлять в составе дайджеста
+    claim_token = db.Column(db.String(32), nullable=True, index=True)  # метка захвата для пакетной отправки
+    max_attempts = db.Column(db.Integer, nullable=True)  # None - EMAIL_MAX_ATTEMPTS
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_recipient_status', 'recipient', 'status'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'task_id': self.task_id,
+            'recipient': self.recipient,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'next_attempt_at': self.next_attempt_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'sent_at': self.sent_at.strftime('%Y-%m-%d %H:%M:%S') if self.sent_at else None,
+            'digest': self.digest
+        }
+
+
+# Журнал изменений задач для потока событий /api/events. Пишется в той же
+# транзакции, что и изменение, поэтому события видят все процессы приложения
+class TaskEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(30), nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    # AUTOINCREMENT: id не переиспользуются после очистки журнала,
+    # иначе клиенты с Last-Event-ID пропустили бы события
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+# Служебные значения приложения, общие для всех процессов
+class AppState(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Счетчики задач в разрезе статус × приоритет × категория.
+# Поддерживаются триггерами (TASK_COUNTER_DDL), поэтому /api/stats читает
+# несколько строк вместо подсчета по всей таблице Task
+class TaskCounter(db.Model):
+    status = db.Column(CodedChoice(TASK_STATUSES), primary_key=True)
+    priority = db.Column(CodedChoice(TASK_PRIORITIES), primary_key=True)
+    category = db.Column(db.String(50), primary_key=True, default='')
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+def rebuild_task_counters():
+    """Пересчитать все счетчики одним проходом GROUP BY по таблице Task"""
+    TaskCounter.query.delete()
+    db.session.execute(sqlite_insert(TaskCounter).from_select(
+        ['status', 'priority', 'category', 'count'],
+        db.select(
+            Task.status,
+            Task.priority,
+            db.func.coalesce(Category.name, ''),
+            db.func.count()
+        ).outerjoin(Category).group_by(Task.status, Task.priority, db.func.coalesce(Category.name, ''))
+    ))
+    db.session.commit()
+
+
+def add_missing_columns():
+    """Добавить в существующие таблицы колонки, появившиеся в моделях"""
+    inspector = db.inspect(db.engine)
+    dialect = db.engine.dialect
+    preparer = dialect.identifier_preparer
+
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name, schema=table.schema):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name, schema=table.schema)}
+
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.quote(column.name)} {column.type.compile(dialect=dialect)}'
+                # SQLite требует значение по умолчанию для NOT NULL колонок
+                if column.default is not None and column.default.is_scalar:
+                    default = db.literal(column.default.arg, column.type).compile(
+                        dialect=dialect, compile_kwargs={'literal_binds': True}
+                    )
+                    ddl += f' NOT NULL DEFAULT {default}' if not column.nullable else f' DEFAULT {default}'
+                connection.exec_driver_sql(ddl)
+
+
+def bump_data_version():
+    """Увеличить версию данных задач в текущей транзакции и вернуть новое значение.
+
+    Вызывается каждой операцией, меняющей задачи; по версии строятся ETag
+    списка задач, статистики и категорий, а измененные строки и отметки об
+    удалении получают ее в колонку version. SQLite пропускает писателей по
+    одному, поэтому версии растут в порядке фиксации транзакций.
+    """
+    increment_app_state('data_version')
+    return get_data_version()
+
+
+def increment_app_state(key):
+    """Увеличить счетчик key в AppState в текущей транзакции"""
+    stmt = sqlite_insert(AppState).values(key=key, value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['key'],
+        set_={'value': AppState.value + 1}
+    )
+    db.session.execute(stmt)
+
+
+def get_app_state(key):
+    """Значение счетчика key из AppState (0, если его еще нет)"""
+    return db.session.scalar(db.select(AppState.value).where(AppState.key == key)) or 0
+
+
+def add_tombstones(task_ids, version):
+    """Записать отметки об удалении задач"""
+    stmt = sqlite_insert(TaskTombstone)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['task_id'],
+        set_={'version': stmt.excluded.version, 'deleted_at': stmt.excluded.deleted_at}
+    )
+    now = datetime.utcnow()
+    db.session.execute(stmt, [{'task_id': task_id, 'version': version, 'deleted_at': now} for task_id in task_ids])
+
+
+def clear_tombstones(task_ids):
+    """Снять отметки об удалении: SQLite может выдать id удаленной задачи новой"""
+    for chunk in chunked(task_ids):
+        db.session.execute(db.delete(TaskTombstone).where(TaskTombstone.task_id.in_(chunk)))
+
+
+def get_data_version():
+    """Текущая версия данных задач"""
+    return get_app_state('data_version')
+
+
+# Полнотекстовый поиск (FTS5) по названию и описанию задач. Индекс хранит только
+# токены (external content над task) и обновляется триггерами, поэтому не зависит
+# от того, каким путем изменена задача - через ORM или пакетными запросами
+TASK_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS task_fts USING fts5("
+    "title, description, content='task', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_fts_update AFTER UPDATE OF title, description ON task BEGIN "
+    "INSERT INTO task_fts(task_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+)
+
+# Такой же индекс по архиву. Архивные задачи не меняются, только переносятся и удаляются
+ARCHIVE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS archive.archived_task_fts USING fts5("
+    "title, description, content='archived_task', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS archive.archived_task_fts_insert AFTER INSERT ON archived_task BEGIN "
+    "INSERT INTO archived_task_fts(rowid, title, description) VALUES (new.id, new.title, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS archive.archived_task_fts_delete AFTER DELETE ON archived_task BEGIN "
+    "INSERT INTO archived_task_fts(archived_task_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "END",
+)
+
+# Поисковые индексы: (схема, имя, DDL)
+TASK_SEARCH_INDEXES = (
+    ('main', 'task_fts', TASK_SEARCH_DDL),
+    ('archive', 'archived_task_fts', ARCHIVE_SEARCH_DDL),
+)
+
+
+def rebuild_task_search_index(indexes=TASK_SEARCH_INDEXES):
+    """Заново построить поисковые индексы по содержимому их таблиц"""
+    with db.engine.begin() as connection:
+        for schema, name, _ in indexes:
+            connection.exec_driver_sql(f"INSERT INTO {schema}.{name}({name}) VALUES ('rebuild')")
+
+
+def create_task_search_index():
+    """Создать поисковые индексы и триггеры, если их еще нет.
+
+    Индекс, появившийся в базе с уже существующими задачами, сразу заполняется.
+    """
+    created = []
+    with db.engine.begin() as connection:
+        for index in TASK_SEARCH_INDEXES:
+            schema, name, statements = index
+            exists = connection.exec_driver_sql(
+                f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (name,)
+            ).first() is not None
+            for ddl in statements:
+                connection.exec_driver_sql(ddl)
+            if not exists:
+                created.append(index)
+    if created:
+        rebuild_task_search_index(created)
+
+
+# Счетчики задач в категориях. Как и поисковый индекс, поддерживаются триггерами,
+# поэтому верны при любых изменениях задач, включая пакетные
+CATEGORY_COUNT_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS category_count_insert AFTER INSERT ON task "
+    "WHEN new.category_id IS NOT NULL BEGIN "
+    "UPDATE category SET task_count = task_count + 1 WHERE id = new.category_id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS category_count_delete AFTER DELETE ON task "
+    "WHEN old.category_id IS NOT NULL BEGIN "
+    "UPDATE category SET task_count = task_count - 1 WHERE id = old.category_id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS category_count_update AFTER UPDATE OF category_id ON task "
+    "WHEN old.category_id IS NOT new.category_id BEGIN "
+    "UPDATE category SET task_count = task_count - 1 WHERE id = old.category_id; "
+    "UPDATE category SET task_count = task_count + 1 WHERE id = new.category_id; "
+    "END",
+)
+
+
+def create_category_count_triggers():
+    """Создать триггеры счетчиков категорий, если их еще нет"""
+    with db.engine.begin() as connection:
+        for ddl in CATEGORY_COUNT_DDL:
+            connection.exec_driver_sql(ddl)
+
+
+# Счетчики TaskCounter. Триггер видит строку задачи такой, какой ее меняет сам
+# UPDATE/DELETE под блокировкой записи, поэтому параллельные запросы не
+# сдвигают счетчики на устаревшую разницу
+TASK_COUNTER_KEY = "{row}.status, {row}.priority, COALESCE((SELECT name FROM category WHERE id = {row}.category_id), '')"
+TASK_COUNTER_INCREMENT = (
+    "INSERT INTO task_counter (status, priority, category, count) "
+    f"VALUES ({TASK_COUNTER_KEY.format(row='new')}, 1) "
+    "ON CONFLICT (status, priority, category) DO UPDATE SET count = count + 1; "
+)
+TASK_COUNTER_DECREMENT = (
+    "UPDATE task_counter SET count = count - 1 "
+    f"WHERE (status, priority, category) = ({TASK_COUNTER_KEY.format(row='old')}); "
+)
+TASK_COUNTER_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS task_counter_insert AFTER INSERT ON task BEGIN "
+    f"{TASK_COUNTER_INCREMENT}"
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_counter_delete AFTER DELETE ON task BEGIN "
+    f"{TASK_COUNTER_DECREMENT}"
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_counter_update AFTER UPDATE OF status, priority, category_id ON task "
+    "WHEN old.status IS NOT new.status OR old.priority IS NOT new.priority "
+    "OR old.category_id IS NOT new.category_id BEGIN "
+    f"{TASK_COUNTER_DECREMENT}"
+    f"{TASK_COUNTER_INCREMENT}"
+    "END",
+)
+
+
+def create_task_counter_triggers():
+    """Создать триггеры счетчиков задач, если их еще нет"""
+    with db.engine.begin() as connection:
+        for ddl in TASK_COUNTER_DDL:
+            connection.exec_driver_sql(ddl)
+
+
+# Время выполнения задачи: ставится, когда задача становится выполненной, и
+# снимается, если ее открыли снова. По нему архивация выбирает старые задачи
+COMPLETED_AT_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS task_completed_at_insert AFTER INSERT ON task "
+    f"WHEN new.status = {TASK_STATUSES.index('completed')} AND new.completed_at IS NULL BEGIN "
+    "UPDATE task SET completed_at = strftime('%Y-%m-%d %H:%M:%S', 'now') WHERE id = new.id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS task_completed_at_update AFTER UPDATE OF status ON task "
+    "WHEN old.status IS NOT new.status BEGIN "
+    "UPDATE task SET completed_at = CASE WHEN new.status = "
+    f"{TASK_STATUSES.index('completed')} THEN strftime('%Y-%m-%d %H:%M:%S', 'now') END WHERE id = new.id; "
+    "END",
+)
+
+
+def create_completed_at_triggers():
+    """Создать триггеры времени выполнения, если их еще нет"""
+    with db.engine.begin() as connection:
+        for ddl in COMPLETED_AT_DDL:
+            connection.exec_driver_sql(ddl)
+
+
+def backfill_completed_at():
+    """Проставить время выполнения задачам, выполненным до появления триггеров.
+
+    Настоящее время неизвестно, берется момент миграции: такие задачи уйдут
+    в архив не раньше, чем через ARCHIVE_AFTER_DAYS после обновления.
+    """
+    with db.engine.begin() as connection:
+        connection.execute(
+            db.update(Task).where(Task.status == 'completed', Task.completed_at.is_(None))
+            .values(completed_at=datetime.utcnow())
+        )
+
+
+def vacuum_database(incremental=False):
+    """Полный VACUUM основной базы: файл переписывается без свободных страниц и
+    пустот внутри страниц. Запись в базу на это время блокируется.
+
+    incremental=True заодно включает auto_vacuum=INCREMENTAL.
+    """
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        if incremental:
+            connection.exec_driver_sql('PRAGMA main.auto_vacuum = INCREMENTAL')
+        connection.exec_driver_sql('VACUUM main')
+        # В режиме WAL VACUUM пишет в журнал копию всей базы, журнал обрезаем
+        connection.exec_driver_sql('PRAGMA main.wal_checkpoint(TRUNCATE)')
+
+
+def release_free_pages():
+    """Вернуть файловой системе свободные страницы основной базы (при auto_vacuum=INCREMENTAL).
+
+    PRAGMA incremental_vacuum освобождает по странице за шаг, а execute()
+    драйвера делает один шаг, поэтому прагма идет через executescript(),
+    который выполняет инструкцию до конца.
+    """
+    with db.engine.connect() as connection:
+        connection.connection.driver_connection.executescript('PRAGMA main.incremental_vacuum')
+
+
+def enable_incremental_vacuum():
+    """Включить auto_vacuum=INCREMENTAL, если он еще не включен.
+
+    Без него страницы, освобожденные архивацией, остаются в файле базы и
+    только переиспользуются. Для существующей базы режим меняется лишь
+    полным VACUUM: файл переписывается целиком, поэтому один раз это долго.
+    """
+    with db.engine.connect() as connection:
+        if connection.exec_driver_sql('PRAGMA main.auto_vacuum').scalar() == 2:
+            return
+    vacuum_database(incremental=True)
+
+
+def rebuild_category_counts():
+    """Пересчитать task_count всех категорий по таблице task"""
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "UPDATE category SET task_count = "
+            "(SELECT count(*) FROM task WHERE task.category_id = category.id)"
+        )
+
+
+def migrate_task_categories():
+    """Перенести категории из старой текстовой колонки task.category в таблицу category.
+
+    Каждое различное название становится строкой category, задачи получают
+    category_id, а старая колонка и ее индекс заменяются индексом по category_id. Пустые названия
+    превращаются в задачи без категории. Для уже перенесенной базы ничего не делает.
+    """
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('task')}
+    if 'category' not in columns:
+        return
+
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT OR IGNORE INTO category (name, task_count) "
+            "SELECT DISTINCT category, 0 FROM task WHERE category IS NOT NULL AND category != ''"
+        )
+        connection.exec_driver_sql(
+            "UPDATE task SET category_id = (SELECT id FROM category WHERE name = task.category) "
+            "WHERE category IS NOT NULL AND category != ''"
+        )
+        connection.exec_driver_sql('DROP INDEX IF EXISTS ix_task_category_created_at_id')
+        connection.exec_driver_sql('ALTER TABLE task DROP COLUMN category')
+        # Замена удаленного индекса, иначе фильтр по категории до migrate-db сканировал бы таблицу
+        connection.exec_driver_sql(
+            'CREATE INDEX IF NOT EXISTS ix_task_category_id_created_at_id ON task (category_id, created_at, id)'
+        )
+    rebuild_category_counts()
+
+
+def choice_code_sql(column, default):
+    """SQL-выражение CASE, переводящее строковое значение колонки в код CodedChoice"""
+    values = column.type.values
+    whens = ' '.join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+    return f'CASE {column.name} {whens} ELSE {values.index(default)} END'
+
+
+def migrate_task_codes():
+    """Перевести status и priority задач из строк в коды CodedChoice.
+
+    SQLite не меняет тип существующей колонки, а число в колонке VARCHAR
+    снова превратилось бы в строку, поэтому таблица task пересоздается по
+    текущей модели с переносом строк, индексов и триггеров. Незнакомые и
+    пустые значения становятся 'pending' и 'medium'. Счетчики TaskCounter с
+    такими же колонками пересоздаются. Для уже перенесенной базы ничего не делает.
+    """
+    columns = {column['name']: column['type'] for column in db.inspect(db.engine).get_columns('task')}
+    if not isinstance(columns['status'], db.String):
+        return
+
+    table = Task.__table__
+    create_sql = str(CreateTable(table).compile(db.engine)).replace(
+        f'CREATE TABLE {table.name} (', f'CREATE TABLE {table.name}_new (', 1
+    )
+    names = ', '.join(column.name for column in table.columns)
+    values = ', '.join(
+        choice_code_sql(column, column.default.arg) if isinstance(column.type, CodedChoice) else column.name
+        for column in table.columns
+    )
+
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {table.name}_new')
+        connection.exec_driver_sql(create_sql)
+        connection.exec_driver_sql(f'INSERT INTO {table.name}_new ({names}) SELECT {values} FROM {table.name}')
+        # Вместе со старой таблицей удаляются ее индексы и триггеры
+        connection.exec_driver_sql(f'DROP TABLE {table.name}')
+        connection.exec_driver_sql(f'ALTER TABLE {table.name}_new RENAME TO {table.name}')
+        for index in table.indexes:
+            index.create(connection)
+        TaskCounter.__table__.drop(connection, checkfirst=True)
+        TaskCounter.__table__.create(connection)
+        connection.exec_driver_sql(f'ANALYZE {table.name}')
+
+    create_category_count_triggers()
+    create_task_counter_triggers()
+    create_completed_at_triggers()
+    create_task_search_index()
+    rebuild_task_counters()
+
+
+def ensure_schema():
+    """Создать недостающие таблицы, колонки, индексы и триггеры.
+
+    Общая часть `flask init-db` и `flask migrate-db`: обе команды приводят
+    любую базу, новую или старую, к одной и той же схеме. db.create_all()
+    создает только отсутствующие таблицы и не трогает уже существующие,
+    поэтому новые колонки и индексы для старого tasks.db добавляем отдельно.
+    """
     db.create_all()
+    add_missing_columns()
+    migrate_task_categories()
+    migrate_task_codes()
+    migrate_archive_tombstones()
+    # IF NOT EXISTS вместо checkfirst: индексы по выражениям SQLAlchemy не видит при рефлексии
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    create_category_count_triggers()
+    create_task_counter_triggers()
+    create_completed_at_triggers()
+    backfill_completed_at()
+    create_task_search_index()
+    enable_incremental_vacuum()
+    # Таблица счетчиков могла только что появиться в старой базе
+    if TaskCounter.query.first() is None and Task.query.first() is not None:
+        rebuild_task_counters()
+
+
+def init_database():
+    """Создать таблицы и довести схему существующей базы до текущей.
+
+    Выполняется один раз перед запуском воркеров (`flask init-db`), а не при
+    импорте: иначе каждый воркер при старте повторял бы DDL и миграции
+    параллельно с остальными.
+    """
+    ensure_schema()
+
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Создать таблицы и привести схему базы к текущей"""
+    init_database()
+    click.echo('База данных готова')
+
+
+def migrate_database():
+    """Доводит существующую базу до текущей схемы (как init-db) и пересчитывает
+    производные данные: счетчики задач, счетчики категорий и статистику планировщика.
+    """
+    ensure_schema()
+    rebuild_task_counters()
+    rebuild_category_counts()
+    # Обновляем статистику для планировщика запросов SQLite
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+
+@bp.cli.command('migrate-db')
+def migrate_db_command():
+    """Применить миграции схемы к существующей базе"""
+    migrate_database()
+    click.echo('База данных обновлена')
+
+
+@bp.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Перестроить полнотекстовые индексы задач и архива"""
+    create_task_search_index()
+    rebuild_task_search_index()
+    click.echo('Поисковый индекс перестроен')
+
+
+# Размер страницы для постраничной выдачи задач
+TASKS_PAGE_SIZE = 50
+TASKS_MAX_PAGE_SIZE = 200
+
+
+# Сортировки выдачи задач: ORDER BY и колонки, значения которых вместе с id попадают в курсор
+TASK_SORTS = {
+    'created_at': ((Task.created_at.desc(), Task.id.desc()), (Task.created_at,)),
+    'due_date': ((Task.due_date.asc().nulls_last(), Task.id), (Task.due_date,)),
+    'priority': ((Task.priority.desc(), Task.due_date.is_(None), Task.due_date, Task.id), (Task.priority, Task.due_date)),
+}
+
+# Те же сортировки в Python для слияния выдачи task и архива: ключ строки по
+# значениям колонок курсора и id и признак обратного порядка
+TASK_SORT_KEYS = {
+    'created_at': (lambda values, task_id: (values[0], task_id), True),
+    'due_date': (lambda values, task_id: (values[0] is None, values[0] or '', task_id), False),
+    'priority': (lambda values, task_id: (-values[0], values[1] is None, values[1] or '', task_id), False),
+}
+
+
+def encode_cursor(values, task_id):
+    """Кодирует позицию задачи (значения колонок сортировки, id) в непрозрачный курсор.
+
+    values - значения в том виде, в каком они хранятся в SQLite, None или datetime
+    """
+    parts = [value.isoformat() if isinstance(value, datetime) else '' if value is None else str(value)
+             for value in values]
+    raw = '|'.join([*parts, str(task_id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирует курсор в пару (список значений, id). Бросает ValueError для некорректного курсора"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    *values, task_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return values, int(task_id)
+
+
+def after_due_date_condition(value, task_id):
+    """Условие "задача идет после (value, task_id)" по возрастанию срока, задачи без срока в конце"""
+    if value is None:
+        return db.and_(Task.due_date.is_(None), Task.id > task_id)
+    return db.or_(
+        Task.due_date > value,
+        db.and_(Task.due_date == value, Task.id > task_id),
+        Task.due_date.is_(None)
+    )
 
 
-# Функция получения активных настроек email
-def get_active_email_settings():
-    """Получить активные настройки email"""
+def after_cursor_condition(sort, values, task_id):
+    """Условие "задача идет в выдаче после курсора" для сортировки sort.
+
+    Бросает ValueError, если курсор не подходит к сортировке
+    """
+    if sort == 'priority':
+        # Сравниваем коды приоритета, а не строки
+        code, value = values
+        code = int(code)
+        priority = db.type_coerce(Task.priority, db.Integer)
+        return db.or_(
+            priority < code,
+            db.and_(priority == code, after_due_date_condition(datetime.fromisoformat(value) if value else None, task_id))
+        )
+
+    (value,) = values
+    value = datetime.fromisoformat(value) if value else None
+    if sort == 'due_date':
+        return after_due_date_condition(value, task_id)
+    # Новые задачи первыми
+    return db.or_(Task.created_at < value, db.and_(Task.created_at == value, Task.id < task_id))
+
+
+# Быстрая сериализация списков задач: вместо ORM-объектов и to_dict() выбираем
+# кортежи колонок, а даты форматирует сама SQLite. Результат совпадает с to_dict()
+TASK_LIST_KEYS = (
+    'id', 'title', 'description', 'status', 'priority',
+    'created_at', 'due_date', 'category', 'assigned_email', 'version'
+)
+TASK_LIST_COLUMNS = (
+    Task.id, Task.title, Task.description, Task.status, Task.priority,
+    db.func.strftime('%Y-%m-%d %H:%M', Task.created_at).label('created_at'),
+    db.func.strftime('%Y-%m-%d', Task.due_date).label('due_date'),
+    task_category_name.label('category'), Task.assigned_email, Task.version
+)
+
+
+def select_task_rows(*extra_columns):
+    """SELECT колонок задачи для task_rows_to_dicts()"""
+    return db.select(*TASK_LIST_COLUMNS, *extra_columns)
+
+
+def task_rows_to_dicts(rows):
+    """Превращает строки select_task_rows() в словари того же вида, что и Task.to_dict()"""
+    # zip останавливается на TASK_LIST_KEYS, дополнительные колонки отбрасываются
+    return [dict(zip(TASK_LIST_KEYS, row)) for row in rows]
+
+
+def include_archived():
+    """Параметр include_archived=true: выдача вместе с архивом выполненных задач"""
+    return request.args.get('include_archived') in ('1', 'true')
+
+
+def archived_tasks_query(query):
+    """Тот же запрос, но по архиву: колонки Task заменяются одноименными колонками ArchivedTask"""
+    adapter = ClauseAdapter(
+        ArchivedTask.__table__,
+        include_fn=lambda column: getattr(column, 'table', None) is Task.__table__,
+        adapt_on_names=True
+    )
+    # Копии, перенос которых не закончен, еще выдаются из task
+    return adapter.traverse(query).where(ArchivedTask.archived_version.is_not(None))
+
+
+def merge_archived_rows(rows, archived_rows, key, reverse=False):
+    """Слить две выдачи, уже упорядоченные по key, в одну в том же порядке"""
+    return heapq.merge(rows, archived_rows, key=key, reverse=reverse)
+
+
+def start_of_today():
+    """Начало текущего дня: сроки хранятся как даты без времени"""
+    return datetime.combine(datetime.now().date(), datetime.min.time())
+
+
+def overdue_condition():
+    """Условие "задача просрочена": не выполнена, а срок раньше сегодняшнего дня.
+
+    Код статуса подставляется литералом, а не параметром: только так SQLite
+    может сопоставить запрос с условием частичного индекса ix_task_overdue.
+    """
+    return db.and_(
+        Task.status != db.literal_column(str(TASK_STATUSES.index('completed'))),
+        Task.due_date.isnot(None),
+        Task.due_date < start_of_today()
+    )
+
+
+def filter_tasks(query):
+    """Применить к запросу фильтры из параметров запроса.
+
+    status/priority/category - точное совпадение, due_after/due_before - срок
+    в интервале дат включительно (YYYY-MM-DD), overdue=true - только просроченные.
+    Бросает ValueError с текстом ошибки для некорректного значения.
+    """
+    for column in (Task.status, Task.priority):
+        value = request.args.get(column.key)
+        if value and value != 'all':
+            if value not in column.type.codes:
+                raise ValueError(f'Некорректный параметр {column.key}')
+            query = query.where(column == value)
+    category = request.args.get('category')
+    if category and category != 'all':
+        # Подзапрос по уникальному названию выполняется один раз, дальше работает индекс по category_id
+        query = query.where(Task.category_id == db.select(Category.id).where(Category.name == category).scalar_subquery())
+
+    try:
+        due_after = parse_due_date(request.args.get('due_after'))
+        due_before = parse_due_date(request.args.get('due_before'))
+    except ValueError:
+        raise ValueError('Некорректная дата, ожидается YYYY-MM-DD') from None
+    if due_after:
+        query = query.where(Task.due_date >= due_after)
+    if due_before:
+        query = query.where(Task.due_date < due_before + timedelta(days=1))
+    if request.args.get('overdue') in ('1', 'true'):
+        query = query.where(overdue_condition())
+    return query
+
+
+def invalid_task_choice(data):
+    """Текст ошибки, если status или priority в data не из допустимых значений, иначе None"""
+    for column in (Task.status, Task.priority):
+        if column.key in data and data[column.key] not in column.type.values:
+            return f'Некорректное значение {column.key}'
+    return None
+
+
+# Текстовые поля задачи, которые можно передать как null
+TASK_TEXT_FIELDS = ('description', 'category', 'assigned_email')
+
+
+def invalid_task_fields(data, title_required=False):
+    """Текст ошибки, если поля задачи в data некорректны, иначе None.
+
+    Типы проверяются до записи: значение другого типа дошло бы до базы и
+    вместо ошибки по одному элементу уронило бы весь запрос. Тело запроса -
+    любой JSON, поэтому сначала проверяется, что это объект.
+    """
+    if not isinstance(data, dict):
+        return 'Ожидается объект задачи'
+    if title_required or 'title' in data:
+        if not isinstance(data.get('title'), str) or not data['title']:
+            return 'Не указано название задачи'
+    for field in TASK_TEXT_FIELDS:
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return f'Некорректное значение {field}'
+    return invalid_task_choice(data)
+
+
+def is_task_id(value):
+    """Похоже ли значение из JSON на id задачи (bool в Python тоже int)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def tasks_json_response(payload):
+    """JSON-ответ со списком задач: jsonify или orjson, если он включен и установлен"""
+    if current_app.config['TASKS_JSON_ORJSON'] and orjson is not None:
+        body = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return current_app.response_class(body, mimetype='application/json')
+    return jsonify(payload)
+
+
+def get_smtp_pool():
+    """Пул SMTP-соединений текущего приложения"""
+    return current_app.extensions['smtp_pool']
+
+
+def email_settings_key(settings):
+    """Ключ пула: соединение годится только для тех же настроек"""
+    return (settings.id, settings.smtp_server, settings.smtp_port, settings.use_ssl,
+            settings.use_tls, settings.username, settings.password)
+
+
+def open_smtp_connection(settings):
+    """Открыть и авторизовать новое SMTP-соединение"""
+    if settings.use_ssl:
+        server = smtplib.SMTP_SSL(settings.smtp_server, settings.smtp_port, timeout=current_app.config['SMTP_TIMEOUT'])
+    else:
+        server = smtplib.SMTP(settings.smtp_server, settings.smtp_port, timeout=current_app.config['SMTP_TIMEOUT'])
+
+    try:
+        if settings.use_tls:
+            server.starttls()
+        server.login(settings.username, settings.password)
+    except Exception:
+        server.close()
+        raise
+
+    return server
+
+
+class EmailSettingsCache:
+    """Активные настройки email в памяти процесса.
+
+    Сохранение и удаление настроек увеличивают email_settings_version в AppState.
+    Процесс, изменивший настройки, обновляет кеш сразу, остальные замечают новую
+    версию не позже чем через EMAIL_SETTINGS_CACHE_TTL секунд. Между проверками
+    отправка писем не обращается к базе за настройками.
+
+    В кеше лежит копия строки, не привязанная к сессии: ее можно читать из
+    фоновых потоков, но нельзя изменять или удалять через db.session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings = None
+        self._version = None
+        self._checked_at = 0
+
+    def get(self):
+        with self._lock:
+            if self._version is not None and \
+                    time.monotonic() - self._checked_at < current_app.config['EMAIL_SETTINGS_CACHE_TTL']:
+                return self._settings
+
+        # Версию читаем раньше настроек: прочитанные настройки не старше версии
+        version = get_app_state('email_settings_version')
+        with self._lock:
+            if version == self._version:
+                self._checked_at = time.monotonic()
+                return self._settings
+
+        settings = load_active_email_settings()
+        self.set(settings, version)
+        return settings
+
+    def set(self, settings, version):
+        with self._lock:
+            self._settings = settings
+            self._version = version
+            self._checked_at = time.monotonic()
+
+
+def load_active_email_settings():
+    """Прочитать активные настройки из базы и вернуть их копию вне сессии"""
     settings = EmailSettings.query.filter_by(is_active=True, user_id='default').first()
-    return settings
+    if settings is None:
+        return None
+    return EmailSettings(**{column.key: getattr(settings, column.key) for column in EmailSettings.__table__.columns})
+
+
+def get_active_email_settings():
+    """Получить активные настройки email (из кеша процесса)"""
+    return current_app.extensions['email_settings_cache'].get()
+
+
+def email_settings_changed():
+    """Сообщить всем процессам, что настройки email изменились.
+
+    Вызывается в транзакции, которая меняет настройки; после commit нужно
+    вызвать refresh_email_settings().
+    """
+    increment_app_state('email_settings_version')
+
+
+def refresh_email_settings():
+    """Перечитать настройки после изменения и сбросить SMTP-соединения со старыми"""
+    current_app.extensions['email_settings_cache'].set(
+        load_active_email_settings(), get_app_state('email_settings_version')
+    )
+    get_smtp_pool().invalidate()
+
+
+# ========== Шаблоны писем ==========
+
+# Статусы на русском
+STATUS_LABELS = {
+    'pending': '⏳ Ожидает',
+    'in_progress': '🚀 В работе',
+    'completed': '✅ Выполнено'
+}
+
+# Приоритеты на русском
+PRIORITY_LABELS = {
+    'low': '🔵 Низкий',
+    'medium': '🟡 Средний',
+    'high': '🔴 Высокий'
+}
+
+class EmailPartsCache:
+    """LRU-кеш готовых MIME-частей писем"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            parts = self._parts.get(key)
+            if parts is not None:
+                self._parts.move_to_end(key)
+            return parts
+
+    def put(self, key, parts, max_size):
+        with self._lock:
+            self._parts[key] = parts
+            while len(self._parts) > max_size:
+                self._parts.popitem(last=False)
+
+
+def task_data_version(task_data):
+    """Версия данных задачи: меняется при любом изменении полей, попадающих в письмо"""
+    return hashlib.sha1(json.dumps(task_data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def render_email_parts(template_name, context, cache_key=None):
+    """Отрендерить текстовую и HTML-части письма.
+
+    Готовые MIME-части кешируются по cache_key (LRU на EMAIL_RENDER_CACHE_SIZE
+    записей), поэтому повторная отправка той же версии задачи не рендерит шаблон.
+    """
+    cache = current_app.extensions['email_parts_cache']
+    if cache_key is not None:
+        parts = cache.get(cache_key)
+        if parts is not None:
+            return parts
+
+    # Jinja компилирует шаблон один раз и дальше берет его из своего кеша
+    jinja_env = current_app.jinja_env
+    templates = {
+        'plain': jinja_env.get_template(f'email/{template_name}.txt'),
+        'html': jinja_env.get_template(f'email/{template_name}.html')
+    }
+    context = dict(context, status_labels=STATUS_LABELS, priority_labels=PRIORITY_LABELS,
+                   app_url=current_app.config['APP_URL'])
+    parts = (
+        MIMEText(templates['plain'].render(context), 'plain', 'utf-8'),
+        MIMEText(templates['html'].render(context), 'html', 'utf-8')
+    )
+
+    if cache_key is not None:
+        cache.put(cache_key, parts, current_app.config['EMAIL_RENDER_CACHE_SIZE'])
+
+    return parts
+
+
+def build_message(subject, parts, sender_email, recipient_email):
+    """Собрать multipart-письмо из готовых частей"""
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
+    for part in parts:
+        msg.attach(part)
+    return msg
+
+
+# Письмо с одной задачей
+def build_task_message(task_data, sender_email, recipient_email):
+    """Собрать письмо с задачей"""
+    cache_key = ('task', task_data['id'], task_data_version(task_data))
+    parts = render_email_parts('task', {'task': task_data}, cache_key=cache_key)
+    return build_message(f"Новая задача: {task_data['title']}", parts, sender_email, recipient_email)
+
+
+# Письмо-дайджест со списком задач для одного получателя
+def build_digest_message(tasks_data, sender_email, recipient_email):
+    """Собрать одно письмо со всеми задачами, назначенными получателю"""
+    parts = render_email_parts('digest', {'tasks': tasks_data})
+    return build_message(f"Новые задачи: {len(tasks_data)}", parts, sender_email, recipient_email)
 
 
 # Функция отправки email
@@ -99,170 +1395,919 @@ def send_task_email(task_data, recipient_email):
         if not all([settings.username, settings.password, recipient_email]):
             return False, "Не все обязательные поля настроек email заполнены"
 
-        # Создаем сообщение
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"Новая задача: {task_data['title']}"
-        msg['From'] = settings.sender_email
-        msg['To'] = recipient_email
-
-        # Статусы на русском
-        status_labels = {
-            'pending': '⏳ Ожидает',
-            'in_progress': '🚀 В работе',
-            'completed': '✅ Выполнено'
-        }
+        msg = build_task_message(task_data, settings.sender_email, recipient_email)
 
-        # Приоритеты на русском
-        priority_labels = {
-            'low': '🔵 Низкий',
-            'medium': '🟡 Средний',
-            'high': '🔴 Высокий'
-        }
+        # Берем соединение из пула (или открываем новое)
+        with get_smtp_pool().connection(email_settings_key(settings), lambda: open_smtp_connection(settings)) as server:
+            server.send_message(msg)
 
-        # HTML версия письма
-        html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <style>
-                body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
-                .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background-color: #4f46e5; color: white; padding: 20px; border-radius: 8px 8px 0 0; }}
-                .content {{ background-color: #f9fafb; padding: 30px; border-radius: 0 0 8px 8px; border: 1px solid #e5e7eb; }}
-                .task-card {{ background: white; padding: 20px; border-radius: 8px; margin: 20px 0; border-left: 4px solid #4f46e5; }}
-                .badge {{ display: inline-block; padding: 4px 12px; border-radius: 20px; font-size: 14px; font-weight: 500; }}
-                .badge-pending {{ background: #fef3c7; color: #92400e; }}
-                .badge-in_progress {{ background: #dbeafe; color: #1e40af; }}
-                .badge-completed {{ background: #d1fae5; color: #065f46; }}
-                .badge-low {{ background: #dbeafe; color: #1e40af; }}
-                .badge-medium {{ background: #fef3c7; color: #92400e; }}
-                .badge-high {{ background: #fee2e2; color: #991b1b; }}
-                .info-row {{ margin: 10px 0; }}
-                .label {{ font-weight: 600; color: #6b7280; }}
-                .footer {{ margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb; color: #6b7280; font-size: 14px; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>📋 Новая задача назначена</h1>
-                </div>
-                <div class="content">
-                    <div class="task-card">
-                        <h2 style="margin-top: 0;">{task_data['title']}</h2>
-
-                        {f'<p><strong>Описание:</strong> {task_data["description"]}</p>' if task_data.get('description') else ''}
-
-                        <div class="info-row">
-                            <span class="label">Статус:</span>
-                            <span class="badge badge-{task_data['status']}">
-                                {status_labels.get(task_data['status'], task_data['status'])}
-                            </span>
-                        </div>
-
-                        <div class="info-row">
-                            <span class="label">Приоритет:</span>
-                            <span class="badge badge-{task_data['priority']}">
-                                {priority_labels.get(task_data['priority'], task_data['priority'])}
-                            </span>
-                        </div>
-
-                        {f'<div class="info-row"><span class="label">Категория:</span> {task_data["category"]}</div>' if task_data.get('category') else ''}
-
-                        {f'<div class="info-row"><span class="label">Срок выполнения:</span> {task_data["due_date"]}</div>' if task_data.get('due_date') else ''}
-
-                        <div class="info-row">
-                            <span class="label">Дата создания:</span>
-                            {task_data['created_at']}
-                        </div>
-                    </div>
-
-                    <div class="footer">
-                        <p>Это письмо отправлено из Task Manager. Задача #{task_data['id']}</p>
-                        <p><a href="http://localhost:5000" style="color: #4f46e5;">Перейти в приложение →</a></p>
-                    </div>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        return True, "Письмо успешно отправлено"
+
+    except smtplib.SMTPAuthenticationError:
+        return False, "Ошибка аутентификации. Проверьте логин и пароль."
+    except smtplib.SMTPException as e:
+        return False, f"Ошибка SMTP: {str(e)}"
+    except Exception as e:
+        return False, f"Ошибка отправки: {str(e)}"
+
+
+# ========== Очередь писем ==========
+
+def enqueue_task_email(task_data, recipient_email, digest=False, max_attempts=None):
+    """Поставить письмо с задачей в очередь. Сохраняется вместе с текущей транзакцией.
+
+    Письма-дайджесты одному получателю копятся EMAIL_DIGEST_WINDOW секунд и
+    уходят одним сообщением вместе с уже ожидающими дайджестами.
+    max_attempts ограничивает число попыток отправки вместо EMAIL_MAX_ATTEMPTS.
+    """
+    message = EmailOutbox(
+        task_id=task_data.get('id') or None,
+        recipient=recipient_email,
+        payload=json.dumps(task_data, ensure_ascii=False),
+        digest=digest,
+        max_attempts=max_attempts
+    )
 
-        # Простая текстовая версия
-        text = f"""
-        Новая задача: {task_data['title']}
+    if digest:
+        pending = EmailOutbox.query.filter_by(
+            recipient=recipient_email, status='queued', digest=True
+        ).order_by(EmailOutbox.next_attempt_at).first()
+        if pending is not None:
+            message.next_attempt_at = pending.next_attempt_at
+        else:
+            message.next_attempt_at = datetime.utcnow() + timedelta(seconds=current_app.config['EMAIL_DIGEST_WINDOW'])
+
+    db.session.add(message)
+    return message
+
+
+def ready_emails_filter(digest, now):
+    """Условие для писем, готовых к отправке: в очереди и пора, или зависшие в sending"""
+    stale_before = now - timedelta(seconds=current_app.config['EMAIL_SENDING_TIMEOUT'])
+    return db.and_(EmailOutbox.digest.is_(digest), db.or_(
+        db.and_(EmailOutbox.status == 'queued', EmailOutbox.next_attempt_at <= now),
+        db.and_(EmailOutbox.status == 'sending', EmailOutbox.locked_at < stale_before)
+    ))
+
+
+def claim_next_email():
+    """Захватить следующее готовое к отправке письмо. Возвращает id или None"""
+    while True:
+        now = datetime.utcnow()
+        candidate = EmailOutbox.query.filter(
+            ready_emails_filter(False, now)
+        ).order_by(EmailOutbox.next_attempt_at).first()
+
+        if candidate is None:
+            return None
+
+        # Условный UPDATE: письмо достанется только одному обработчику,
+        # даже если его одновременно выбрали несколько потоков или процессов
+        claimed = EmailOutbox.query.filter_by(
+            id=candidate.id, status=candidate.status, locked_at=candidate.locked_at
+        ).update({
+            'status': 'sending',
+            'locked_at': now,
+            'attempts': EmailOutbox.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+
+        if claimed:
+            return candidate.id
+
+
+def record_delivery_result(message, success, error=None):
+    """Отметить письмо отправленным или вернуть в очередь с задержкой / в dead"""
+    now = datetime.utcnow()
+
+    if success:
+        message.status = 'sent'
+        message.sent_at = now
+        message.last_error = None
+    elif message.attempts >= (message.max_attempts or current_app.config['EMAIL_MAX_ATTEMPTS']):
+        message.status = 'dead'
+        message.last_error = error
+    else:
+        delay = current_app.config['EMAIL_RETRY_BASE_DELAY'] * 2 ** (message.attempts - 1)
+        message.status = 'queued'
+        message.next_attempt_at = now + timedelta(seconds=delay)
+        message.last_error = error
+
+    message.locked_at = None
+    message.claim_token = None
+
+
+def deliver_email(message_id):
+    """Отправить захваченное письмо и записать результат"""
+    message = db.session.get(EmailOutbox, message_id)
+    success, result = send_task_email(json.loads(message.payload), message.recipient)
+    record_delivery_result(message, success, None if success else result)
+    db.session.commit()
+
+
+def run_email_digests():
+    """Отправить все готовые дайджесты за одну SMTP-сессию.
+
+    Захватывает разом все готовые письма-дайджесты, группирует их по
+    получателю и отправляет по одному сообщению на получателя через одно
+    соединение. Возвращает число обработанных записей очереди.
+    """
+    now = datetime.utcnow()
+    ready = ready_emails_filter(True, now)
+
+    # Сначала чтение: пустая очередь не берет блокировку записи SQLite на
+    # каждом опросе и не мешает записям запросов
+    if EmailOutbox.query.with_entities(EmailOutbox.id).filter(ready).first() is None:
+        return 0
+
+    # Один UPDATE захватывает весь пакет: параллельный обработчик его уже не получит
+    token = secrets.token_hex(16)
+    claimed = EmailOutbox.query.filter(ready).update({
+        'status': 'sending',
+        'locked_at': now,
+        'claim_token': token,
+        'attempts': EmailOutbox.attempts + 1
+    }, synchronize_session=False)
+    db.session.commit()
 
-        {'Описание: ' + task_data['description'] if task_data.get('description') else ''}
+    if not claimed:
+        return 0
 
-        Статус: {status_labels.get(task_data['status'], task_data['status'])}
-        Приоритет: {priority_labels.get(task_data['priority'], task_data['priority'])}
-        {'Категория: ' + task_data['category'] if task_data.get('category') else ''}
-        {'Срок выполнения: ' + task_data['due_date'] if task_data.get('due_date') else ''}
-        Дата создания: {task_data['created_at']}
+    messages = EmailOutbox.query.filter_by(claim_token=token).order_by(EmailOutbox.id).all()
+    groups = {}
+    for message in messages:
+        groups.setdefault(message.recipient, []).append(message)
 
-        Задача #{task_data['id']}
+    settings = get_active_email_settings()
+    if not settings or not all([settings.username, settings.password]):
+        for message in messages:
+            record_delivery_result(message, False, 'Настройки email не найдены')
+        db.session.commit()
+        return len(messages)
+
+    try:
+        with get_smtp_pool().connection(email_settings_key(settings), lambda: open_smtp_connection(settings)) as server:
+            for recipient, group in groups.items():
+                msg = build_digest_message(
+                    [json.loads(message.payload) for message in group], settings.sender_email, recipient
+                )
+                # Отказ по конкретному получателю не рвет сессию для остальных
+                try:
+                    server.send_message(msg)
+                    error = None
+                except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                    error = f"Ошибка SMTP: {str(e)}"
+                for message in group:
+                    record_delivery_result(message, error is None, error)
+    except Exception as e:
+        # Соединение потеряно: неотправленные письма возвращаются в очередь
+        for message in messages:
+            if message.status == 'sending':
+                record_delivery_result(message, False, f"Ошибка отправки: {str(e)}")
+
+    db.session.commit()
+    return len(messages)
+
+
+def process_email_outbox(app, stop_event=None):
+    """Цикл обработчика очереди приложения app: отправляет письма, пока есть готовые, затем ждет"""
+    while stop_event is None or not stop_event.is_set():
+        try:
+            with app.app_context():
+                if run_email_digests():
+                    continue
+                message_id = claim_next_email()
+                if message_id is not None:
+                    deliver_email(message_id)
+                    continue
+        except Exception:
+            app.logger.exception('Ошибка обработки очереди писем')
+
+        wakeup = app.extensions['email_workers'].wakeup
+        wakeup.wait(app.config['EMAIL_POLL_INTERVAL'])
+        wakeup.clear()
+
+
+class EmailWorkers:
+    """Фоновые потоки-отправители приложения app в текущем процессе"""
+
+    def __init__(self, app):
+        self.app = app
+        self.wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        """Запустить потоки (один раз)"""
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for number in range(self.app.config['EMAIL_WORKER_THREADS']):
+                worker = threading.Thread(
+                    target=process_email_outbox, args=(self.app,),
+                    name=f'email-worker-{number}', daemon=True
+                )
+                worker.start()
+                self._threads.append(worker)
+
+    def notify(self):
+        self.wakeup.set()
+
+
+def start_inprocess_email_workers(app):
+    """Запустить отправителей app в текущем процессе, если очередь не разбирает `flask email-worker`.
+
+    Не вызывается из create_app(): gunicorn с preload_app создает приложение в
+    мастере, и потоки не пережили бы fork. Воркеры gunicorn запускают
+    отправителей в post_fork, остальные серверы - при первом запросе.
+    """
+    if app.config['EMAIL_INPROCESS_WORKERS']:
+        app.extensions['email_workers'].start()
+
+
+@bp.before_app_request
+def start_email_workers():
+    """Запустить отправителей до первого запроса процесса.
+
+    Иначе письма, оставшиеся в очереди после перезапуска (повторы, дайджесты),
+    ждали бы, пока кто-нибудь поставит в очередь новое.
+    """
+    start_inprocess_email_workers(current_app._get_current_object())
+
+
+def notify_email_workers():
+    """Разбудить обработчики после постановки письма в очередь"""
+    current_app.extensions['email_workers'].notify()
+
+
+@bp.cli.command('email-worker')
+def email_worker_command():
+    """Разбирать очередь писем в отдельном процессе"""
+    click.echo('Обработчик очереди писем запущен')
+    process_email_outbox(current_app._get_current_object())
+
+
+# ========== Поток событий ==========
+
+def record_event(event_type, data):
+    """Записать событие в журнал в текущей транзакции.
+
+    Журнал растет только от записей, поэтому старые события удаляются здесь же
+    (см. EventBroker.prune_if_due), даже если к процессу не подключен ни один
+    клиент SSE.
+    """
+    db.session.add(TaskEvent(event_type=event_type, data=json.dumps(data, ensure_ascii=False)))
+    get_event_broker().prune_if_due()
+
+
+class EventBroker:
+    """Раздает события из журнала TaskEvent подписчикам SSE приложения app в этом процессе.
+
+    Журнал опрашивает один поток на приложение, поэтому нагрузка на базу не
+    зависит от числа открытых вкладок. После записи в этом же процессе
+    поток будится сразу через notify().
+    """
+
+    def __init__(self, app):
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._subscribers = set()
+        self._thread = None
+        self._app = app
+        self._last_id = 0
+        self._last_prune = None
+
+    def subscribe(self, last_event_id=None, max_subscribers=None):
+        """Подписаться на события; при переподключении досылает пропущенные.
+
+        Возвращает None, если подписчиков уже max_subscribers.
+        """
+        subscriber = queue.Queue(maxsize=current_app.config['EVENTS_QUEUE_SIZE'])
+
+        with self._lock:
+            if max_subscribers is not None and len(self._subscribers) >= max_subscribers:
+                return None
+            if self._thread is None:
+                self._last_id = db.session.scalar(db.select(db.func.max(TaskEvent.id))) or 0
+                self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+                self._thread.start()
+
+            if last_event_id is not None and last_event_id < self._last_id:
+                missed = TaskEvent.query.filter(
+                    TaskEvent.id > last_event_id, TaskEvent.id <= self._last_id
+                ).order_by(TaskEvent.id).limit(current_app.config['EVENTS_QUEUE_SIZE'] - 1).all()
+                # Часть событий уже удалена из журнала или их слишком много:
+                # клиенту проще перечитать данные
+                if not missed or missed[0].id != last_event_id + 1 or len(missed) == current_app.config['EVENTS_QUEUE_SIZE'] - 1:
+                    subscriber.put((self._last_id, 'resync', '{}'))
+                else:
+                    for change in missed:
+                        subscriber.put((change.id, change.event_type, change.data))
+
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def prune_if_due(self):
+        """Удалить в текущей транзакции события старше EVENTS_RETENTION.
+
+        Не чаще раза в EVENTS_PRUNE_INTERVAL секунд; первая запись после
+        запуска процесса чистит журнал сразу.
         """
+        now = time.monotonic()
+        with self._lock:
+            if self._last_prune is not None and now - self._last_prune < current_app.config['EVENTS_PRUNE_INTERVAL']:
+                return
+            self._last_prune = now
+        cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['EVENTS_RETENTION'])
+        TaskEvent.query.filter(TaskEvent.created_at < cutoff).delete(synchronize_session=False)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self._app.config['EVENTS_POLL_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                with self._app.app_context():
+                    self._dispatch_new_events()
+            except Exception:
+                self._app.logger.exception('Ошибка рассылки событий')
+
+    def _dispatch_new_events(self):
+        events = TaskEvent.query.filter(TaskEvent.id > self._last_id).order_by(TaskEvent.id).limit(500).all()
+        if not events:
+            return
+
+        with self._lock:
+            for change in events:
+                self._last_id = change.id
+                for subscriber in self._subscribers:
+                    try:
+                        subscriber.put_nowait((change.id, change.event_type, change.data))
+                    except queue.Full:
+                        # Клиент не успевает читать: сбрасываем очередь и просим перечитать данные
+                        with subscriber.mutex:
+                            subscriber.queue.clear()
+                        subscriber.put_nowait((change.id, 'resync', '{}'))
+        if len(events) == 500:
+            self._wakeup.set()
+
+
+def get_event_broker():
+    """Рассыльщик событий текущего приложения"""
+    return current_app.extensions['event_broker']
+
+
+@bp.route('/api/events')
+def stream_events():
+    """Поток изменений задач (Server-Sent Events)"""
+    broker = get_event_broker()
+    subscriber = broker.subscribe(
+        request.headers.get('Last-Event-ID', type=int), current_app.config['EVENTS_MAX_STREAMS']
+    )
+    if subscriber is None:
+        response = jsonify({'error': 'Слишком много открытых потоков событий'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    heartbeat = current_app.config['EVENTS_HEARTBEAT']
+    deadline = time.monotonic() + current_app.config['EVENTS_STREAM_MAX_AGE']
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    # Освобождаем поток сервера; браузер переподключится с Last-Event-ID
+                    return
+                try:
+                    event_id, event_type, data = subscriber.get(timeout=min(heartbeat, remaining))
+                except queue.Empty:
+                    if remaining > heartbeat:
+                        yield ': ping\n\n'
+                    continue
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+# ========== Метрики ==========
+
+METRICS_PREFIX = 'task_manager'
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
 
-        # Прикрепляем обе версии
-        part1 = MIMEText(text, 'plain')
-        part2 = MIMEText(html, 'html')
 
-        msg.attach(part1)
-        msg.attach(part2)
+class Histogram:
+    """Гистограмма Prometheus: число наблюдений по корзинам, сумма и количество"""
 
-        # Подключаемся к SMTP серверу
-        if settings.use_ssl:
-            server = smtplib.SMTP_SSL(settings.smtp_server, settings.smtp_port)
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя корзина - +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
         else:
-            server = smtplib.SMTP(settings.smtp_server, settings.smtp_port)
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {self.sum}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+class RequestMetrics:
+    """Метрики HTTP-запросов приложения в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}        # (method, route, status) -> число запросов
+        self._latency = {}         # (method, route) -> Histogram длительности
+        self._queries = {}         # (method, route) -> Histogram числа SQL-запросов
+        self._query_seconds = {}   # (method, route) -> суммарное время SQL
+
+    def observe(self, method, route, status, seconds, query_count, query_seconds):
+        key = (method, route)
+        with self._lock:
+            self._requests[key + (status,)] = self._requests.get(key + (status,), 0) + 1
+            if key not in self._latency:
+                self._latency[key] = Histogram(METRICS_LATENCY_BUCKETS)
+                self._queries[key] = Histogram(METRICS_QUERY_BUCKETS)
+                self._query_seconds[key] = 0
+            self._latency[key].observe(seconds)
+            self._queries[key].observe(query_count)
+            self._query_seconds[key] += query_seconds
+
+    def render(self):
+        def labels(method, route):
+            return f'method="{method}",route="{escape_label(route)}"'
+
+        name = METRICS_PREFIX
+        lines = [
+            f'# HELP {name}_http_requests_total Число обработанных HTTP-запросов',
+            f'# TYPE {name}_http_requests_total counter'
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f'{name}_http_requests_total{{{labels(method, route)},status="{status}"}} {count}')
+
+            lines += [
+                f'# HELP {name}_http_request_duration_seconds Длительность обработки запроса',
+                f'# TYPE {name}_http_request_duration_seconds histogram'
+            ]
+            for key, histogram in sorted(self._latency.items()):
+                lines += histogram.render(f'{name}_http_request_duration_seconds', labels(*key))
+
+            lines += [
+                f'# HELP {name}_db_queries_per_request SQL-запросов на один HTTP-запрос',
+                f'# TYPE {name}_db_queries_per_request histogram'
+            ]
+            for key, histogram in sorted(self._queries.items()):
+                lines += histogram.render(f'{name}_db_queries_per_request', labels(*key))
+
+            lines += [
+                f'# HELP {name}_db_query_duration_seconds_total Суммарное время SQL-запросов',
+                f'# TYPE {name}_db_query_duration_seconds_total counter'
+            ]
+            for key, seconds in sorted(self._query_seconds.items()):
+                lines.append(f'{name}_db_query_duration_seconds_total{{{labels(*key)}}} {seconds}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape_label(value):
+    """Экранирование значения метки Prometheus"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def before_sql(connection, cursor, statement, parameters, context, executemany):
+    """Засечь начало SQL-запроса, выполняемого при обработке HTTP-запроса"""
+    if has_request_context() and current_app.config['METRICS_ENABLED']:
+        connection.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def after_sql(connection, cursor, statement, parameters, context, executemany):
+    """Добавить SQL-запрос к счетчикам текущего HTTP-запроса"""
+    starts = connection.info.get('metrics_query_start')
+    if starts and has_request_context():
+        elapsed = time.perf_counter() - starts.pop()
+        g.metrics_query_count = g.get('metrics_query_count', 0) + 1
+        g.metrics_query_seconds = g.get('metrics_query_seconds', 0) + elapsed
+
+
+@bp.before_app_request
+def start_request_timer():
+    """Засечь начало обработки запроса"""
+    if current_app.config['METRICS_ENABLED']:
+        g.metrics_started = time.perf_counter()
+
+
+def record_request_metrics(status):
+    """Записать метрики текущего запроса (один раз). Возвращает (время, SQL-запросов, время SQL)"""
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return None
+
+    elapsed = time.perf_counter() - started
+    query_count = g.get('metrics_query_count', 0)
+    query_seconds = g.get('metrics_query_seconds', 0)
+    # Шаблон маршрута, а не путь: иначе каждый id задачи стал бы отдельной меткой
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    current_app.extensions['request_metrics'].observe(request.method, route, status, elapsed, query_count, query_seconds)
+    return elapsed, query_count, query_seconds
+
+
+@bp.after_app_request
+def finish_request_timer(response):
+    """Записать метрики запроса и добавить заголовок Server-Timing"""
+    measured = record_request_metrics(response.status_code)
+    if measured and current_app.config['METRICS_SERVER_TIMING']:
+        elapsed, query_count, query_seconds = measured
+        # Для потоковых ответов (SSE) время - до начала передачи тела
+        response.headers.add(
+            'Server-Timing',
+            f'db;desc="SQL x{query_count}";dur={query_seconds * 1000:.2f}, app;dur={elapsed * 1000:.2f}'
+        )
+    return response
+
+
+@bp.teardown_app_request
+def finish_failed_request_timer(error):
+    """Учесть запрос, завершившийся исключением до after_request"""
+    if error is not None:
+        record_request_metrics(500)
 
-        if settings.use_tls:
-            server.starttls()
 
-        server.login(settings.username, settings.password)
-        server.send_message(msg)
-        server.quit()
+@bp.route('/metrics')
+def metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Метрики отключены'}), 404
+    return Response(current_app.extensions['request_metrics'].render(), mimetype='text/plain; version=0.0.4')
 
-        return True, "Письмо успешно отправлено"
 
-    except smtplib.SMTPAuthenticationError:
-        return False, "Ошибка аутентификации. Проверьте логин и пароль."
-    except smtplib.SMTPException as e:
-        return False, f"Ошибка SMTP: {str(e)}"
-    except Exception as e:
-        return False, f"Ошибка отправки: {str(e)}"
+# ========== Сжатие ответов ==========
 
+class GzipCompressor:
+    """Потоковое сжатие gzip с тем же интерфейсом, что у brotli.Compressor"""
 
-@app.route('/')
+    def __init__(self, level):
+        self._zlib = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def process(self, data):
+        return self._zlib.compress(data)
+
+    def flush(self):
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+def accepted_encoding():
+    """Сжатие, которое принимает клиент: br (если установлен brotli) или gzip, None - без сжатия"""
+    encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+    # При равном q из Accept-Encoding выбирается br: он сжимает лучше
+    encoding = max(encodings, key=lambda name: request.accept_encodings[name])
+    return encoding if request.accept_encodings[encoding] > 0 else None
+
+
+def create_compressor(encoding):
+    """Компрессор для encoding с уровнем сжатия из настроек"""
+    if encoding == 'br':
+        return brotli.Compressor(quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    return GzipCompressor(current_app.config['COMPRESS_GZIP_LEVEL'])
+
+
+def compress_stream(chunks, compressor):
+    """Сжатый поток: каждая часть ответа сжимается и сразу отправляется клиенту"""
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    finally:
+        # Закрываем исходный поток: у выгрузки в finally закрывается курсор
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+@bp.after_app_request
+def compress_response(response):
+    """Сжать ответ, если его тип в COMPRESS_MIMETYPES и клиент принимает сжатие.
+
+    Потоковые ответы (выгрузка задач) сжимаются по частям и остаются
+    потоковыми. Поток событий SSE не сжимается: сжатие копило бы события в буфере.
+    """
+    config = current_app.config
+    if not config['COMPRESS_ENABLED'] or response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return response
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    compressor = create_compressor(encoding)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, compressor)
+        response.content_length = None
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compressor.process(data) + compressor.finish())
+    response.content_encoding = encoding
+    return response
+
+
+# ========== Условные GET-запросы ==========
+
+def conditional_on_data_version(view):
+    """Отвечать 304 Not Modified, если данные задач не менялись.
+
+    ETag строится из версии данных и параметров запроса, поэтому проверка
+    стоит один запрос по первичному ключу вместо выборки и сериализации.
+    Текущая дата тоже входит в ETag: просроченность задач меняется и без
+    изменения данных. ETag слабый: сжатый и несжатый ответ - одни и те же данные.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        params = '&'.join(f'{key}={value}' for key, value in sorted(request.args.items(multi=True)))
+        data_version = get_data_version()
+        etag = hashlib.sha1(
+            f'{data_version}|{datetime.now().date()}|{request.path}?{params}'.encode()
+        ).hexdigest()
+
+        if request.if_none_match.contains_weak(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        response.headers['X-Data-Version'] = str(data_version)
+        # Кешировать можно, но перед использованием нужно перепроверить
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
+
+
+@bp.route('/')
 def index():
     """Главная страница"""
     return render_template('index.html')
 
 
 # API для задач (остается без изменений)
-@app.route('/api/tasks', methods=['GET'])
+@bp.route('/api/tasks', methods=['GET'])
+@conditional_on_data_version
 def get_tasks():
-    """Получить все задачи с фильтрацией"""
-    status_filter = request.args.get('status')
-    priority_filter = request.args.get('priority')
-    category_filter = request.args.get('category')
+    """Получить все задачи с фильтрацией.
 
-    query = Task.query
+    По умолчанию новые задачи идут первыми; sort=due_date сортирует по сроку
+    выполнения, задачи без срока - в конце; sort=priority - сначала по
+    приоритету (high, medium, low), внутри приоритета по сроку.
+    """
+    return list_tasks(request.args.get('sort', 'created_at'))
 
-    if status_filter and status_filter != 'all':
-        query = query.filter_by(status=status_filter)
-    if priority_filter and priority_filter != 'all':
-        query = query.filter_by(priority=priority_filter)
-    if category_filter and category_filter != 'all':
-        query = query.filter_by(category=category_filter)
 
-    tasks = query.order_by(Task.created_at.desc()).all()
-    return jsonify([task.to_dict() for task in tasks])
+@bp.route('/api/tasks/overdue', methods=['GET'])
+@conditional_on_data_version
+def get_overdue_tasks():
+    """Просроченные невыполненные задачи, начиная с самого раннего срока"""
+    return list_tasks('due_date', overdue_condition())
+
 
+def list_tasks(sort, *conditions):
+    """Выдача задач для /api/tasks и /api/tasks/overdue: фильтры, сортировка, страницы"""
+    if sort not in TASK_SORTS:
+        return jsonify({'error': 'Некорректный параметр sort'}), 400
+
+    try:
+        query = filter_tasks(select_task_rows()).where(*conditions)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    order_by, sort_columns = TASK_SORTS[sort]
+    # Значения колонок сортировки в том виде, как хранятся в базе, - для курсора и слияния с архивом
+    cursor_columns = [db.type_coerce(column, db.String).label(f'cursor_{index}') for index, column in enumerate(sort_columns)]
+    query = query.add_columns(*cursor_columns).order_by(*order_by)
+
+    def execute(query):
+        # С include_archived тот же запрос выполняется по архиву, и две
+        # упорядоченные выдачи сливаются по колонкам курсора
+        rows = db.session.execute(query)
+        if not include_archived():
+            return rows
+        sort_key, reverse = TASK_SORT_KEYS[sort]
+        return merge_archived_rows(
+            rows, db.session.execute(archived_tasks_query(query)),
+            key=lambda row: sort_key(row[-len(cursor_columns):], row.id), reverse=reverse
+        )
+
+    # Без limit/after возвращаем весь список, как раньше
+    if 'limit' not in request.args and 'after' not in request.args:
+        return tasks_json_response(task_rows_to_dicts(execute(query)))
 
-@app.route('/api/tasks', methods=['POST'])
+    try:
+        limit = int(request.args.get('limit', TASKS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Некорректный параметр limit'}), 400
+    limit = max(1, min(limit, TASKS_MAX_PAGE_SIZE))
+
+    after = request.args.get('after')
+    if after:
+        try:
+            after_values, after_id = decode_cursor(after)
+            query = query.where(after_cursor_condition(sort, after_values, after_id))
+        except ValueError:
+            return jsonify({'error': 'Некорректный курсор'}), 400
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    rows = list(islice(execute(query.limit(limit + 1)), limit + 1))
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last[-len(cursor_columns):], last.id)
+
+    return tasks_json_response({
+        'tasks': task_rows_to_dicts(rows[:limit]),
+        'next_cursor': next_cursor
+    })
+
+
+# Поиск задач
+TASK_SEARCH_MARKS = ('\x02', '\x03')  # границы совпадений от FTS5, после экранирования HTML заменяются на <mark>
+TASK_SEARCH_SNIPPET_TOKENS = 16
+TASK_SEARCH_WEIGHTS = (10.0, 1.0)     # вес совпадений в title и description для bm25
+task_fts = db.table('task_fts', db.column('rowid'))
+archived_task_fts = db.table('archived_task_fts', db.column('rowid'), schema='archive')
+
+
+def build_search_query(text):
+    """Превращает строку поиска в запрос FTS5: каждое слово ищется как префикс,
+    найдены должны быть все слова. Операторы FTS5 из пользовательского ввода не работают
+    """
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def mark_search_matches(text):
+    """Экранировать HTML во фрагменте и подсветить совпадения тегом <mark>"""
+    start, end = TASK_SEARCH_MARKS
+    return str(escape(text)).replace(start, '<mark>').replace(end, '</mark>')
+
+
+def search_select(fts, search_query):
+    """SELECT задач, найденных в поисковом индексе fts, с рангом и подсветкой совпадений"""
+    fts_column = db.literal_column(fts.name)
+    start, end = TASK_SEARCH_MARKS
+    return select_task_rows(
+        db.func.bm25(fts_column, *TASK_SEARCH_WEIGHTS).label('search_rank'),
+        db.func.highlight(fts_column, 0, start, end).label('title_html'),
+        db.func.snippet(fts_column, 1, start, end, '…', TASK_SEARCH_SNIPPET_TOKENS).label('snippet')
+    ).where(fts.c.rowid == Task.id, fts_column.op('MATCH')(search_query))
+
+
+@bp.route('/api/tasks/search', methods=['GET'])
+@conditional_on_data_version
+def search_tasks():
+    """Полнотекстовый поиск по названию и описанию задач.
+
+    Фильтры те же, что в /api/tasks, include_archived=true ищет и в архиве.
+    Задачи идут по релевантности (rank из bm25, меньше - лучше); title_html
+    и snippet содержат экранированный текст с подсветкой совпадений.
+    """
+    search_query = build_search_query(request.args.get('q', ''))
+    if not search_query:
+        return jsonify({'error': 'Пустой поисковый запрос'}), 400
+
+    try:
+        limit = int(request.args.get('limit', TASKS_PAGE_SIZE))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'error': 'Некорректный параметр limit или offset'}), 400
+    limit = max(1, min(limit, TASKS_MAX_PAGE_SIZE))
+
+    order_by = (db.literal_column('search_rank'), Task.id.desc())
+    try:
+        query = filter_tasks(search_select(task_fts, search_query)).order_by(*order_by)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    if include_archived():
+        # Из каждой выдачи берем все строки до конца страницы и сливаем их по рангу
+        archived_query = archived_tasks_query(
+            filter_tasks(search_select(archived_task_fts, search_query)).order_by(*order_by)
+        )
+        rows = merge_archived_rows(
+            db.session.execute(query.limit(offset + limit + 1)),
+            db.session.execute(archived_query.limit(offset + limit + 1)),
+            key=lambda row: (row.search_rank, -row.id)
+        )
+        rows = list(islice(rows, offset, offset + limit + 1))
+    else:
+        rows = db.session.execute(query.limit(limit + 1).offset(offset)).all()
+
+    tasks = task_rows_to_dicts(rows[:limit])
+    for task, row in zip(tasks, rows):
+        task['rank'] = row.search_rank
+        task['title_html'] = mark_search_matches(row.title_html)
+        task['snippet'] = mark_search_matches(row.snippet) if row.description else None
+
+    return tasks_json_response({
+        'tasks': tasks,
+        'next_offset': offset + limit if len(rows) > limit else None
+    })
+
+
+@bp.route('/api/tasks/changes', methods=['GET'])
+def get_task_changes():
+    """Получить задачи, измененные и удаленные после версии since.
+
+    Без since возвращается полный снимок. Если изменений больше limit,
+    в ответе есть next с параметрами следующего запроса; когда next нет,
+    значение version нужно передать как since при следующей синхронизации.
+    """
+    since = request.args.get('since', -1, type=int)
+    after_id = request.args.get('after_id', type=int)
+    limit = max(1, min(request.args.get('limit', TASKS_MAX_PAGE_SIZE, type=int), TASKS_MAX_PAGE_SIZE))
+
+    # Версию читаем до выборки: изменения, зафиксированные позже, попадут в следующую синхронизацию
+    current_version = get_data_version()
+
+    query = select_task_rows().where(Task.version <= current_version)
+    if after_id is None:
+        query = query.where(Task.version > since)
+    else:
+        # Продолжение страницы внутри одной версии (например, большого пакета)
+        query = query.where(db.or_(Task.version > since, db.and_(Task.version == since, Task.id > after_id)))
+    rows = db.session.execute(query.order_by(Task.version, Task.id).limit(limit + 1)).all()
+
+    # Полному снимку удаления не нужны. Перенесенные в архив задачи пропадают
+    # из выдачи так же, как удаленные
+    deleted = []
+    if since >= 0:
+        deleted = db.session.scalars(
+            db.select(TaskTombstone.task_id).where(
+                TaskTombstone.version > since, TaskTombstone.version <= current_version
+            )
+        ).all()
+        deleted += db.session.scalars(
+            db.select(ArchivedTask.id).where(
+                ArchivedTask.archived_version > since, ArchivedTask.archived_version <= current_version
+            )
+        ).all()
+
+    response = {
+        'version': current_version,
+        'changed': task_rows_to_dicts(rows[:limit]),
+        'deleted': deleted
+    }
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response['next'] = {'since': last.version, 'after_id': last.id}
+
+    return tasks_json_response(response)
+
+
+@bp.route('/api/tasks', methods=['POST'])
 def create_task():
     """Создать новую задачу"""
     data = request.json
+    error = invalid_task_fields(data, title_required=True)
+    if error:
+        return jsonify({'error': error}), 400
 
     due_date = None
     if data.get('due_date'):
@@ -271,65 +2316,80 @@ def create_task():
         except:
             pass
 
+    version = bump_data_version()
     task = Task(
+        id=next_task_id(),
         title=data['title'],
         description=data.get('description', ''),
         priority=data.get('priority', 'medium'),
         category=data.get('category', 'general'),
         due_date=due_date,
-        assigned_email=data.get('assigned_email')
+        assigned_email=data.get('assigned_email'),
+        version=version
     )
 
     db.session.add(task)
-    db.session.commit()
+    db.session.flush()
+    clear_tombstones([task.id])
 
-    # Отправляем email если указан
+    # Письмо ставим в очередь в той же транзакции, отправка идет в фоне
+    outbox_message = None
     if data.get('assigned_email') and data.get('send_email', False):
-        task_data = task.to_dict()
-        success, message = send_task_email(task_data, data['assigned_email'])
+        outbox_message = enqueue_task_email(
+            task.to_dict(), data['assigned_email'], digest=current_app.config['EMAIL_DIGEST_ENABLED']
+        )
+
+    record_event('task_created', task.to_dict())
+    db.session.commit()
+    get_event_broker().notify()
 
+    if outbox_message is not None:
+        notify_email_workers()
         return jsonify({
             'task': task.to_dict(),
-            'email_sent': success,
-            'email_message': message
+            'email_queued': True,
+            'email_id': outbox_message.id,
+            'email_message': 'Письмо поставлено в очередь на отправку'
         }), 201
 
     return jsonify(task.to_dict()), 201
 
 
-@app.route('/api/tasks/<int:task_id>/send-email', methods=['POST'])
+@bp.route('/api/tasks/<int:task_id>/send-email', methods=['POST'])
 def send_task_email_endpoint(task_id):
     """Отправить задачу по email"""
     task = Task.query.get_or_404(task_id)
 
     data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Ожидается объект'}), 400
     recipient_email = data.get('email', task.assigned_email)
 
     if not recipient_email:
         return jsonify({'error': 'Не указан email получателя'}), 400
 
-    success, message = send_task_email(task.to_dict(), recipient_email)
+    outbox_message = enqueue_task_email(task.to_dict(), recipient_email)
+    db.session.commit()
+    notify_email_workers()
 
-    if success:
-        return jsonify({
-            'success': True,
-            'message': message,
-            'task_id': task.id,
-            'email': recipient_email
-        })
-    else:
-        return jsonify({
-            'success': False,
-            'error': message
-        }), 500
+    return jsonify({
+        'success': True,
+        'message': 'Письмо поставлено в очередь на отправку',
+        'task_id': task.id,
+        'email': recipient_email,
+        'email_id': outbox_message.id
+    }), 202
 
 
 # Остальные endpoints для задач (без изменений)
-@app.route('/api/tasks/<int:task_id>', methods=['PUT'])
+@bp.route('/api/tasks/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
     """Обновить задачу"""
     task = Task.query.get_or_404(task_id)
     data = request.json
+    error = invalid_task_fields(data)
+    if error:
+        return jsonify({'error': error}), 400
 
     if 'title' in data:
         task.title = data['title']
@@ -349,51 +2409,646 @@ def update_task(task_id):
         except:
             pass
 
+    task.version = bump_data_version()
+    record_event('task_updated', task.to_dict())
     db.session.commit()
+    get_event_broker().notify()
     return jsonify(task.to_dict())
 
 
-@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@bp.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
     """Удалить задачу"""
     task = Task.query.get_or_404(task_id)
     db.session.delete(task)
+    version = bump_data_version()
+    add_tombstones([task_id], version)
+    record_event('task_deleted', {'id': task_id, 'version': version})
     db.session.commit()
+    get_event_broker().notify()
     return jsonify({'message': 'Task deleted successfully'})
 
 
-@app.route('/api/stats')
+# ========== Пакетные операции ==========
+
+# Поля задачи, которые можно менять пакетным обновлением
+BATCH_UPDATE_FIELDS = ('title', 'description', 'status', 'priority', 'category', 'assigned_email', 'due_date')
+
+# Ограничение на число параметров в одном IN (...) для SQLite
+SQL_IN_CHUNK_SIZE = 500
+
+
+def parse_due_date(value):
+    """Разобрать срок выполнения 'YYYY-MM-DD'. Бросает ValueError для некорректной даты"""
+    return datetime.strptime(value, '%Y-%m-%d') if value else None
+
+
+def chunked(items, size=SQL_IN_CHUNK_SIZE):
+    """Разбить список на части не длиннее size"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def load_existing_task_ids(task_ids):
+    """Выбрать существующие id задач одним запросом на каждые SQL_IN_CHUNK_SIZE id"""
+    existing = set()
+    for chunk in chunked(task_ids):
+        existing.update(db.session.scalars(db.select(Task.id).where(Task.id.in_(chunk))))
+    return existing
+
+
+def get_batch_items(key):
+    """Достать список элементов пакета из тела запроса или вернуть ответ с ошибкой"""
+    data = request.get_json(silent=True)
+    items = data.get(key) if isinstance(data, dict) else None
+
+    if not isinstance(items, list):
+        return None, (jsonify({'error': f'Ожидается список в поле {key}'}), 400)
+    if len(items) > current_app.config['BATCH_MAX_ITEMS']:
+        return None, (jsonify({'error': f'Не больше {current_app.config["BATCH_MAX_ITEMS"]} элементов за раз'}), 400)
+    return items, None
+
+
+def task_row_from_item(item, created_at):
+    """Строка для INSERT в task из элемента пакета: пара (строка, None) или (None, текст ошибки)"""
+    field_error = invalid_task_fields(item, title_required=True)
+    if field_error:
+        return None, field_error
+    try:
+        due_date = parse_due_date(item.get('due_date'))
+    except (TypeError, ValueError):
+        return None, 'Некорректный срок выполнения'
+
+    return {
+        'title': item['title'],
+        'description': item.get('description', ''),
+        'status': item.get('status', 'pending'),
+        'priority': item.get('priority', 'medium'),
+        'category': item.get('category', 'general'),
+        'created_at': created_at,
+        'due_date': due_date,
+        'assigned_email': item.get('assigned_email')
+    }, None
+
+
+def insert_task_rows(rows):
+    """Вставить строки task_row_from_item() в текущей транзакции.
+
+    Выдает новую версию данных и создает недостающие категории, счетчики
+    обновляют триггеры. Поле category в строках заменяется на category_id; возвращает
+    пару (id новых задач, названия категорий) в порядке rows.
+    """
+    version = bump_data_version()
+    categories = [row.pop('category') for row in rows]
+    category_ids = get_category_ids(categories)
+
+    # id назначаем сами, подряд начиная с next_task_id(). Так вставка идет одним
+    # executemany, а INSERT ... RETURNING с сохранением порядка строк SQLAlchemy
+    # выполнил бы для SQLite по одной строке
+    first_id = next_task_id()
+    task_ids = list(range(first_id, first_id + len(rows)))
+
+    for row, task_id, category in zip(rows, task_ids, categories):
+        row['id'] = task_id
+        row['version'] = version
+        row['category_id'] = category_ids.get(category)
+
+    # Вставка в таблицу, а не в модель: ORM делит строки на группы по тому, какие
+    # колонки в них NULL, и отправляет каждую группу отдельным executemany
+    db.session.execute(db.insert(Task.__table__), rows)
+    # Новые id идут подряд, отметки об удалении снимаем одним запросом
+    db.session.execute(db.delete(TaskTombstone).where(TaskTombstone.task_id >= first_id))
+    return task_ids, categories
+
+
+@bp.route('/api/tasks/batch', methods=['POST'])
+def create_tasks_batch():
+    """Создать несколько задач в одной транзакции"""
+    items, error = get_batch_items('tasks')
+    if error:
+        return error
+
+    now = datetime.utcnow()
+    results = [None] * len(items)
+    rows = []
+    row_indexes = []
+
+    for index, item in enumerate(items):
+        row, row_error = task_row_from_item(item, now)
+        if row_error:
+            results[index] = {'index': index, 'status': 'error', 'error': row_error}
+            continue
+        rows.append(row)
+        row_indexes.append(index)
+
+    outbox_messages = 0
+    if rows:
+        task_ids, categories = insert_task_rows(rows)
+
+        for index, task_id, row, category in zip(row_indexes, task_ids, rows, categories):
+            results[index] = {'index': index, 'status': 'created', 'id': task_id}
+
+            if row['assigned_email'] and items[index].get('send_email', False):
+                enqueue_task_email(
+                    {**Task(**row).to_dict(), 'category': category or None}, row['assigned_email'],
+                    digest=current_app.config['EMAIL_DIGEST_ENABLED']
+                )
+                outbox_messages += 1
+
+        # На пакет одно событие: клиенты перечитывают список целиком
+        record_event('tasks_changed', {'created': len(rows)})
+
+    db.session.commit()
+    get_event_broker().notify()
+    if outbox_messages:
+        notify_email_workers()
+
+    return jsonify({'created': len(rows), 'results': results})
+
+
+@bp.route('/api/tasks/batch', methods=['PUT'])
+def update_tasks_batch():
+    """Частично обновить несколько задач в одной транзакции"""
+    items, error = get_batch_items('tasks')
+    if error:
+        return error
+
+    requested_ids = [item['id'] for item in items if isinstance(item, dict) and is_task_id(item.get('id'))]
+    existing = load_existing_task_ids(requested_ids)
+
+    results = []
+    rows = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            results.append({'index': index, 'id': None, 'status': 'error', 'error': 'Ожидается объект задачи'})
+            continue
+        task_id = item.get('id')
+        if not is_task_id(task_id):
+            results.append({'index': index, 'id': task_id, 'status': 'error', 'error': 'Некорректный id задачи'})
+            continue
+        if task_id not in existing:
+            results.append({'index': index, 'id': task_id, 'status': 'error', 'error': 'Задача не найдена'})
+            continue
+
+        changes = {field: item[field] for field in BATCH_UPDATE_FIELDS if field in item}
+        field_error = invalid_task_fields(changes)
+        if field_error:
+            results.append({'index': index, 'id': task_id, 'status': 'error', 'error': field_error})
+            continue
+        if 'due_date' in changes:
+            try:
+                changes['due_date'] = parse_due_date(changes['due_date'])
+            except (TypeError, ValueError):
+                results.append({'index': index, 'id': task_id, 'status': 'error', 'error': 'Некорректный срок выполнения'})
+                continue
+
+        if changes:
+            rows.append({'id': task_id, **changes})
+
+        results.append({'index': index, 'id': task_id, 'status': 'updated'})
+
+    if rows:
+        version = bump_data_version()
+        category_ids = get_category_ids(row['category'] for row in rows if 'category' in row)
+        for row in rows:
+            row['version'] = version
+            if 'category' in row:
+                row['category_id'] = category_ids.get(row.pop('category'))
+
+        # ORM bulk UPDATE по первичному ключу: строки с одинаковым набором
+        # полей отправляются одним executemany
+        db.session.execute(db.update(Task), rows)
+        record_event('tasks_changed', {'updated': len(rows)})
+
+    db.session.commit()
+    get_event_broker().notify()
+    return jsonify({'updated': sum(1 for result in results if result['status'] == 'updated'), 'results': results})
+
+
+@bp.route('/api/tasks/batch', methods=['DELETE'])
+def delete_tasks_batch():
+    """Удалить несколько задач в одной транзакции"""
+    task_ids, error = get_batch_items('ids')
+    if error:
+        return error
+
+    existing = load_existing_task_ids([task_id for task_id in task_ids if is_task_id(task_id)])
+
+    for chunk in chunked(list(existing)):
+        db.session.execute(db.delete(Task).where(Task.id.in_(chunk)))
+    if existing:
+        add_tombstones(list(existing), bump_data_version())
+        record_event('tasks_changed', {'deleted': len(existing)})
+    db.session.commit()
+    get_event_broker().notify()
+
+    results = []
+    for index, task_id in enumerate(task_ids):
+        if not is_task_id(task_id):
+            results.append({'index': index, 'id': task_id, 'status': 'error', 'error': 'Некорректный id задачи'})
+        elif task_id in existing:
+            results.append({'index': index, 'id': task_id, 'status': 'deleted'})
+        else:
+            results.append({'index': index, 'id': task_id, 'status': 'error', 'error': 'Задача не найдена'})
+
+    return jsonify({'deleted': len(existing), 'results': results})
+
+
+# ========== Экспорт и импорт задач ==========
+
+TASK_FILE_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# Сколько строк выгрузки читается из курсора и отправляется клиенту за раз
+EXPORT_CHUNK_SIZE = 1000
+
+# Сколько ошибок по строкам импорта возвращать в ответе
+IMPORT_MAX_ERRORS = 100
+
+# Пустая ячейка CSV в этих колонках означает "нет значения", в остальных - значение по умолчанию
+CSV_NULLABLE_FIELDS = ('description', 'category', 'due_date', 'assigned_email')
+
+
+# Один кодировщик на все строки: json.dumps() на каждый вызов заново разбирает параметры
+ndjson_encoder = json.JSONEncoder(ensure_ascii=False)
+
+
+def encode_ndjson_rows(rows):
+    """Порция выгрузки NDJSON: по объекту задачи на строку"""
+    if current_app.config['TASKS_JSON_ORJSON'] and orjson is not None:
+        return b''.join(orjson.dumps(task, option=orjson.OPT_APPEND_NEWLINE) for task in task_rows_to_dicts(rows))
+    encode = ndjson_encoder.encode
+    return ''.join([encode(task) + '\n' for task in task_rows_to_dicts(rows)])
+
+
+def encode_csv_rows(rows):
+    """Порция выгрузки CSV; колонки в порядке TASK_LIST_KEYS"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+@bp.route('/api/tasks/export', methods=['GET'])
+def export_tasks():
+    """Выгрузить задачи файлом NDJSON или CSV (format=ndjson|csv).
+
+    Строки идут в порядке id и уходят клиенту порциями по мере чтения из
+    курсора, поэтому память процесса не зависит от числа задач. Фильтры те же,
+    что у /api/tasks, с include_archived=true выгружается и архив. Вся выгрузка
+    читается в одной транзакции и видит базу на момент начала запроса.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in TASK_FILE_FORMATS:
+        return jsonify({'error': 'Некорректный параметр format'}), 400
+
+    try:
+        query = filter_tasks(select_task_rows()).order_by(Task.id)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    # Выполняем через Core-соединение сессии: строки не проходят через слой ORM
+    connection = db.session.connection().execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    results = [connection.execute(query)]
+    partitions = results[0].partitions()
+    if include_archived():
+        results.append(connection.execute(archived_tasks_query(query)))
+        rows = merge_archived_rows(*results, key=lambda row: row.id)
+        partitions = iter(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)), [])
+    encode_rows = encode_csv_rows if export_format == 'csv' else encode_ndjson_rows
+
+    def generate():
+        try:
+            if export_format == 'csv':
+                yield encode_csv_rows([TASK_LIST_KEYS])
+            for rows in partitions:
+                yield encode_rows(rows)
+        finally:
+            for result in results:
+                result.close()
+
+    return Response(stream_with_context(generate()), mimetype=TASK_FILE_FORMATS[export_format], headers={
+        'Content-Disposition': f'attachment; filename=tasks.{export_format}'
+    })
+
+
+def read_lines(stream, size=64 * 1024):
+    """Строки потока байтов вместе с переводом строки; поток читается блоками по size.
+
+    readline() у входного потока WSGI-сервера может читать по байту, а read()
+    есть у любого потока.
+    """
+    pending = b''
+    while True:
+        block = stream.read(size)
+        if not block:
+            break
+        lines = (pending + block).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+    if pending:
+        yield pending
+
+
+def read_import_items(stream, import_format):
+    """Разбирать загружаемый файл по строкам: тройки (номер строки, элемент, ошибка).
+
+    Для строки, которую не удалось разобрать, элемент None, а ошибка - текст;
+    типы полей разобранного элемента проверяет task_row_from_item(). Файл
+    читается потоком, целиком в памяти не держится.
+    """
+    if import_format == 'csv':
+        # Переводы строк сохраняются: csv сам склеивает строки внутри кавычек
+        reader = csv.DictReader(codecs.iterdecode(read_lines(stream), 'utf-8-sig'))
+        for row in reader:
+            item = {}
+            for key, value in row.items():
+                if not isinstance(key, str):
+                    continue  # ячейки сверх заголовка
+                if value == '' or value is None:
+                    if key not in CSV_NULLABLE_FIELDS:
+                        continue
+                    value = '' if key == 'description' else None
+                item[key] = value
+            yield reader.line_num, item, None
+        return
+
+    for number, line in enumerate(read_lines(stream), 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError:
+            yield number, None, 'Строка не разобрана'
+
+
+def parse_import_created_at(item, default):
+    """Дата создания из элемента импорта ('YYYY-MM-DD HH:MM' как в выгрузке или ISO 8601)"""
+    value = item.get('created_at')
+    if not value:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(value)
+    return datetime.fromisoformat(value)
+
+
+@bp.route('/api/tasks/import', methods=['POST'])
+def import_tasks():
+    """Загрузить задачи из файла NDJSON или CSV (format=ndjson|csv).
+
+    Файл передается телом запроса или полем file формы. Строки разбираются по
+    мере чтения и вставляются транзакциями по IMPORT_CHUNK_SIZE задач; id и
+    version из файла игнорируются, задачи получают новые. Уже вставленные
+    порции остаются в базе, даже если дальше файл оказался поврежден.
+    """
+    import_format = request.args.get('format', 'ndjson')
+    if import_format not in TASK_FILE_FORMATS:
+        return jsonify({'error': 'Некорректный параметр format'}), 400
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    chunk_size = current_app.config['IMPORT_CHUNK_SIZE']
+    now = datetime.utcnow()
+    imported = 0
+    failed = 0
+    errors = []
+    rows = []
+
+    def flush():
+        task_ids, _ = insert_task_rows(rows)
+        record_event('tasks_changed', {'created': len(task_ids)})
+        db.session.commit()
+        get_event_broker().notify()
+        rows.clear()
+        return len(task_ids)
+
+    try:
+        for line, item, row_error in read_import_items(stream, import_format):
+            # Элемент проверяется целиком до вставки: строка с неподходящими
+            # типами полей попадает в errors, а не обрывает импорт посреди файла
+            row = None
+            if not row_error:
+                row, row_error = task_row_from_item(item, now)
+            if row:
+                try:
+                    row['created_at'] = parse_import_created_at(item, now)
+                except ValueError:
+                    row, row_error = None, 'Некорректная дата создания'
+
+            if row_error:
+                failed += 1
+                if len(errors) < IMPORT_MAX_ERRORS:
+                    errors.append({'line': line, 'error': row_error})
+                continue
+
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                imported += flush()
+
+        if rows:
+            imported += flush()
+    except (csv.Error, UnicodeDecodeError):
+        db.session.rollback()
+        return jsonify({
+            'error': 'Файл поврежден или не в кодировке UTF-8',
+            'imported': imported, 'failed': failed, 'errors': errors
+        }), 400
+
+    return jsonify({'imported': imported, 'failed': failed, 'errors': errors})
+
+
+# ========== Архив выполненных задач ==========
+
+def migrate_archive_tombstones():
+    """Перенести версии архивации из отметок об удалении в archived_task.
+
+    Раньше архивация оставляла отметку об удалении на каждую перенесенную
+    задачу, и task_tombstone росла без ограничений.
+    """
+    hot = db.select(Task.id).where(Task.id == ArchivedTask.id).exists()
+    tombstone_version = db.select(TaskTombstone.version).where(TaskTombstone.task_id == ArchivedTask.id).scalar_subquery()
+    archived = db.select(ArchivedTask.id).where(ArchivedTask.archived_version.is_not(None))
+    with db.engine.begin() as connection:
+        for index in ArchivedTask.__table__.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+        connection.execute(
+            db.update(ArchivedTask).where(ArchivedTask.archived_version.is_(None), ~hot)
+            .values(archived_version=tombstone_version)
+        )
+        connection.execute(db.delete(TaskTombstone).where(TaskTombstone.task_id.in_(archived)))
+
+
+def repair_interrupted_archive():
+    """Довести до конца перенос, прерванный между транзакциями или файлами.
+
+    База и архив фиксируются по отдельности, поэтому после сбоя возможны:
+    - копия без archived_version, задача осталась в task (или ее удалили,
+      пока шел перенос) - копия лишняя;
+    - копия без archived_version, задачи в task нет и она не удалялась -
+      задача перенесена, но клиенты об этом не знают: выдаем версию;
+    - копия с archived_version, а задача осталась в task - клиенты уже
+      убрали задачу из списка: копию удаляем, задаче выдаем новую версию,
+      и /api/tasks/changes вернет ее.
+    """
+    hot = db.select(Task.id).where(Task.id == ArchivedTask.id).exists()
+    deleted = db.select(TaskTombstone.task_id).where(TaskTombstone.task_id == ArchivedTask.id).exists()
+    unfinished = ArchivedTask.archived_version.is_(None)
+
+    reported = db.session.scalars(db.select(ArchivedTask.id).where(~unfinished, hot)).all()
+    db.session.execute(db.delete(ArchivedTask).where(unfinished, db.or_(hot, deleted)))
+    lost = db.session.scalars(db.select(ArchivedTask.id).where(unfinished)).all()
+    if reported or lost:
+        version = bump_data_version()
+        for chunk in chunked(reported):
+            db.session.execute(db.delete(ArchivedTask).where(ArchivedTask.id.in_(chunk)))
+            db.session.execute(db.update(Task).where(Task.id.in_(chunk)).values(version=version))
+        for chunk in chunked(lost):
+            db.session.execute(db.update(ArchivedTask).where(ArchivedTask.id.in_(chunk)).values(archived_version=version))
+        record_event('tasks_changed', {'archived': len(lost)})
+    db.session.commit()
+
+
+def archive_completed_tasks(days, batch_size):
+    """Перенести в архив задачи, выполненные больше days дней назад; вернуть их число.
+
+    Задачи переносятся пачками по batch_size, поэтому запросы приложения ждут
+    блокировку записи не дольше одной пачки. База и архив - разные файлы, и в
+    режиме WAL общая транзакция не атомарна, поэтому сначала фиксируется копия
+    в архиве и только потом задачи удаляются из task: при сбое задача окажется
+    в обоих местах, но не пропадет. Задачи, измененные после копирования,
+    остаются в task. Последствия прерванного переноса исправляет
+    repair_interrupted_archive(). После каждой пачки освободившиеся страницы
+    возвращаются файловой системе.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    names = [column.name for column in Task.__table__.columns]
+    repair_interrupted_archive()
+
+    total = 0
+    while True:
+        task_ids = db.session.scalars(
+            db.select(Task.id).where(Task.status == 'completed', Task.completed_at < cutoff)
+            .order_by(Task.completed_at).limit(batch_size)
+        ).all()
+        if not task_ids:
+            break
+
+        archived_at = datetime.utcnow()
+        for chunk in chunked(task_ids):
+            # Копия от прерванного запуска заменяется через DELETE: INSERT OR REPLACE
+            # не вызвал бы триггер, убирающий старую строку из поискового индекса
+            db.session.execute(db.delete(ArchivedTask).where(ArchivedTask.id.in_(chunk)))
+            db.session.execute(db.insert(ArchivedTask).from_select(
+                [*names, 'archived_at'],
+                db.select(*Task.__table__.columns, db.literal(archived_at, db.DateTime)).where(Task.id.in_(chunk))
+            ))
+        db.session.commit()
+
+        # Удаляем только задачи, не изменившиеся после копирования: любое изменение меняет version
+        version = bump_data_version()
+        archived_version = db.select(ArchivedTask.version).where(ArchivedTask.id == Task.id).scalar_subquery()
+        moved = []
+        for chunk in chunked(task_ids):
+            moved += db.session.scalars(
+                db.select(Task.id).where(Task.id.in_(chunk), Task.version == archived_version)
+            ).all()
+
+        for chunk in chunked(moved):
+            db.session.execute(
+                db.update(ArchivedTask).where(ArchivedTask.id.in_(chunk)).values(archived_version=version)
+            )
+            db.session.execute(db.delete(Task).where(Task.id.in_(chunk)))
+        record_event('tasks_changed', {'archived': len(moved)})
+        db.session.commit()
+        get_event_broker().notify()
+
+        # Копии задач, измененных или удаленных во время переноса
+        if len(moved) < len(task_ids):
+            for chunk in chunked(task_ids):
+                db.session.execute(
+                    db.delete(ArchivedTask).where(ArchivedTask.id.in_(chunk), ArchivedTask.archived_version.is_(None))
+                )
+            db.session.commit()
+        release_free_pages()
+        total += len(moved)
+
+    # Журнал WAL вырос на все перенесенные страницы, сбрасываем его в базу и обрезаем
+    db.session.execute(db.text('PRAGMA main.wal_checkpoint(TRUNCATE)'))
+    db.session.commit()
+    return total
+
+
+@bp.cli.command('archive-tasks')
+@click.option('--days', type=int, default=None, help='Сколько дней после выполнения задача остается в базе (по умолчанию ARCHIVE_AFTER_DAYS)')
+@click.option('--batch-size', type=int, default=None, help='Сколько задач переносить в одной транзакции (по умолчанию ARCHIVE_BATCH_SIZE)')
+@click.option('--every', type=int, default=None, help='Повторять каждые N секунд вместо однократного запуска')
+@click.option('--vacuum', is_flag=True, help='После переноса переписать базу полным VACUUM')
+def archive_tasks_command(days, batch_size, every, vacuum):
+    """Перенести старые выполненные задачи в архив.
+
+    Инкрементальный VACUUM возвращает только целиком освободившиеся страницы.
+    Если перенесенные задачи были перемешаны с оставшимися, место внутри
+    страниц освобождает только --vacuum.
+    """
+    days = current_app.config['ARCHIVE_AFTER_DAYS'] if days is None else days
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    while True:
+        started = time.monotonic()
+        count = archive_completed_tasks(days, batch_size)
+        if vacuum and count:
+            vacuum_database()
+        click.echo(f'Перенесено в архив: {count} ({time.monotonic() - started:.1f} с)')
+        if every is None:
+            break
+        time.sleep(every)
+
+
+@bp.route('/api/stats')
+@conditional_on_data_version
 def get_stats():
     """Получить статистику по задачам"""
-    total = Task.query.count()
-    completed = Task.query.filter_by(status='completed').count()
-    pending = Task.query.filter_by(status='pending').count()
-    in_progress = Task.query.filter_by(status='in_progress').count()
-
-    high_priority = Task.query.filter_by(priority='high').count()
-    medium_priority = Task.query.filter_by(priority='medium').count()
-    low_priority = Task.query.filter_by(priority='low').count()
+    by_status = {}
+    by_priority = {}
+    by_category = {}
+    by_status_priority = {}
+
+    # Счетчиков не больше, чем статусов × приоритетов × категорий,
+    # поэтому сводка не зависит от количества задач
+    for counter in TaskCounter.query.filter(TaskCounter.count > 0):
+        by_status[counter.status] = by_status.get(counter.status, 0) + counter.count
+        by_priority[counter.priority] = by_priority.get(counter.priority, 0) + counter.count
+        by_category[counter.category] = by_category.get(counter.category, 0) + counter.count
+        cell = by_status_priority.setdefault(counter.status, {})
+        cell[counter.priority] = cell.get(counter.priority, 0) + counter.count
 
     return jsonify({
-        'total': total,
-        'completed': completed,
-        'pending': pending,
-        'in_progress': in_progress,
-        'high_priority': high_priority,
-        'medium_priority': medium_priority,
-        'low_priority': low_priority
+        'total': sum(by_status.values()),
+        'completed': by_status.get('completed', 0),
+        'pending': by_status.get('pending', 0),
+        'in_progress': by_status.get('in_progress', 0),
+        'high_priority': by_priority.get('high', 0),
+        'medium_priority': by_priority.get('medium', 0),
+        'low_priority': by_priority.get('low', 0),
+        'by_status_priority': by_status_priority,
+        'by_category': by_category
     })
 
 
-@app.route('/api/categories')
+@bp.route('/api/categories')
+@conditional_on_data_version
 def get_categories():
-    """Получить список всех категорий"""
-    categories = db.session.query(Task.category).distinct().filter(Task.category.isnot(None)).all()
-    return jsonify([cat[0] for cat in categories if cat[0]])
+    """Получить список категорий, в которых есть задачи, с числом задач"""
+    categories = db.session.execute(
+        db.select(Category.name, Category.task_count).where(Category.task_count > 0).order_by(Category.name)
+    )
+    return jsonify([{'name': name, 'count': count} for name, count in categories])
 
 
 # API для настроек email (новое)
-@app.route('/api/email/settings', methods=['GET'])
+@bp.route('/api/email/settings', methods=['GET'])
 def get_email_settings():
     """Получить настройки email"""
     settings = get_active_email_settings()
@@ -403,7 +3058,7 @@ def get_email_settings():
         return jsonify({'configured': False})
 
 
-@app.route('/api/email/settings', methods=['POST'])
+@bp.route('/api/email/settings', methods=['POST'])
 def save_email_settings():
     """Сохранить настройки email"""
     data = request.json
@@ -425,7 +3080,9 @@ def save_email_settings():
     )
 
     db.session.add(settings)
+    email_settings_changed()
     db.session.commit()
+    refresh_email_settings()
 
     return jsonify({
         'success': True,
@@ -434,21 +3091,31 @@ def save_email_settings():
     })
 
 
-@app.route('/api/email/settings', methods=['DELETE'])
+@bp.route('/api/email/settings', methods=['DELETE'])
 def delete_email_settings():
     """Удалить настройки email"""
-    settings = get_active_email_settings()
-    if settings:
-        db.session.delete(settings)
-        db.session.commit()
+    # Удаляем одним запросом: параллельный запрос мог уже удалить ту же строку
+    deleted = EmailSettings.query.filter_by(is_active=True, user_id='default').delete()
+    if deleted:
+        email_settings_changed()
+    db.session.commit()
+
+    if deleted:
+        refresh_email_settings()
         return jsonify({'success': True, 'message': 'Настройки email удалены'})
     else:
         return jsonify({'success': False, 'error': 'Настройки не найдены'}), 404
 
 
-@app.route('/api/email/test', methods=['POST'])
+@bp.route('/api/email/test', methods=['POST'])
 def test_email():
-    """Тестовая отправка email"""
+    """Тестовая отправка email.
+
+    При EMAIL_TEST_QUEUED письмо ставится в очередь с одной попыткой и сразу
+    возвращается 202 с email_id: запрос не занимает поток на время SMTP-диалога,
+    результат виден в /api/email/outbox/<email_id>. Иначе письмо отправляется
+    прямо в запросе.
+    """
     data = request.json
     recipient_email = data.get('email')
 
@@ -471,6 +3138,17 @@ def test_email():
         'due_date': None
     }
 
+    if current_app.config['EMAIL_TEST_QUEUED']:
+        outbox_message = enqueue_task_email(test_task, recipient_email, max_attempts=1)
+        db.session.commit()
+        notify_email_workers()
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'email_id': outbox_message.id,
+            'message': 'Тестовое письмо поставлено в очередь на отправку'
+        }), 202
+
     success, message = send_task_email(test_task, recipient_email)
 
     if success:
@@ -485,8 +3163,49 @@ def test_email():
         }), 500
 
 
+# API очереди писем
+@bp.route('/api/email/outbox', methods=['GET'])
+def get_email_outbox():
+    """Получить последние письма из очереди с фильтрацией"""
+    query = EmailOutbox.query
+
+    status_filter = request.args.get('status')
+    if status_filter and status_filter != 'all':
+        query = query.filter_by(status=status_filter)
+    task_filter = request.args.get('task_id', type=int)
+    if task_filter:
+        query = query.filter_by(task_id=task_filter)
+
+    messages = query.order_by(EmailOutbox.id.desc()).limit(100).all()
+    return jsonify([message.to_dict() for message in messages])
+
+
+@bp.route('/api/email/outbox/<int:message_id>', methods=['GET'])
+def get_email_outbox_message(message_id):
+    """Получить статус доставки письма"""
+    message = EmailOutbox.query.get_or_404(message_id)
+    return jsonify(message.to_dict())
+
+
+@bp.route('/api/email/outbox/<int:message_id>/retry', methods=['POST'])
+def retry_email_outbox_message(message_id):
+    """Повторно поставить в очередь письмо, исчерпавшее попытки"""
+    message = EmailOutbox.query.get_or_404(message_id)
+
+    if message.status != 'dead':
+        return jsonify({'success': False, 'error': 'Письмо не находится в статусе dead'}), 400
+
+    message.status = 'queued'
+    message.attempts = 0
+    message.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+    notify_email_workers()
+
+    return jsonify({'success': True, 'message': message.to_dict()})
+
+
 # Presets для популярных почтовых сервисов
-@app.route('/api/email/presets')
+@bp.route('/api/email/presets')
 def get_email_presets():
     """Получить пресеты для популярных почтовых сервисов"""
     presets = {
@@ -527,4 +3246,7 @@ def get_email_presets():
 
 
 if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        init_database()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,42 @@
+"""Настройки gunicorn для Task Manager.
+
+Запуск из каталога task_manager: gunicorn -c gunicorn.conf.py wsgi:app
+Число процессов и потоков меняется переменными окружения
+GUNICORN_WORKERS и GUNICORN_THREADS.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Приложение импортируется один раз в мастере, воркеры получают его через fork:
+# запуск быстрее и память под код делится между процессами
+preload_app = True
+
+# Потоковые воркеры: медленный клиент занимает один поток, а не весь процесс.
+# Каждый открытый поток /api/events тоже держит поток воркера все время, пока
+# открыт, поэтому приложение ограничивает их число (EVENTS_MAX_STREAMS, 503
+# сверх лимита) и время жизни (EVENTS_STREAM_MAX_AGE). При смене GUNICORN_THREADS
+# оставляйте EVENTS_MAX_STREAMS заметно меньше threads, иначе вкладки займут
+# все потоки и API перестанет отвечать
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# SSE-соединения держатся долго, поэтому таймаут считается по пульсу воркера,
+# а не по длительности запроса
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    """Не делить с мастером соединения SQLite, открытые до fork, и запустить отправителей писем"""
+    from app import db, start_inprocess_email_workers
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Потоки мастера не переживают fork: каждый воркер запускает своих сразу,
+    # не дожидаясь первого запроса
+    start_inprocess_email_workers(app)
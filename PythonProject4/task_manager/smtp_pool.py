@@ -0,0 +1,85 @@
+"""Пул SMTP-соединений.
+
+Общий для PythonProject4 и PythonProject5: PythonProject5 импортирует этот
+модуль из каталога PythonProject4/task_manager, второй копии пула нет.
+"""
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Пул SMTP-соединений: держит авторизованные соединения открытыми между
+# отправками, чтобы не повторять TCP/TLS-рукопожатие и login() на каждое письмо
+class SMTPConnectionPool:
+    def __init__(self, max_size=4, idle_timeout=60):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._key = None
+        self._idle = []  # [(server, время последнего использования)]
+
+    @contextmanager
+    def connection(self, key, connect):
+        """Выдать соединение для настроек key; connect() открывает новое.
+
+        Смена key (другие настройки) закрывает все старые соединения.
+        Соединение, на котором возникла ошибка, в пул не возвращается.
+        """
+        server = self._acquire(key) or connect()
+        try:
+            yield server
+        except Exception:
+            self._close(server)
+            raise
+        self._release(key, server)
+
+    def invalidate(self):
+        """Закрыть все свободные соединения (например, после смены настроек)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._key = None
+        for server, _ in idle:
+            self._close(server)
+
+    def _acquire(self, key):
+        """Взять живое свободное соединение для key или None"""
+        with self._lock:
+            if self._key != key:
+                stale, self._idle = self._idle, []
+                self._key = key
+            else:
+                stale = []
+        for server, _ in stale:
+            self._close(server)
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                server, last_used = self._idle.pop()
+            # Просроченные и оборванные сервером соединения закрываем
+            if time.monotonic() - last_used <= self.idle_timeout and self._is_alive(server):
+                return server
+            self._close(server)
+
+    def _release(self, key, server):
+        with self._lock:
+            if key == self._key and len(self._idle) < self.max_size:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+
+    @staticmethod
+    def _is_alive(server):
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
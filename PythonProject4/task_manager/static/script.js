@@ -25,6 +25,57 @@ document.addEventListener('DOMContentLoaded', function() {
     // Текущие настройки email
     let emailConfigured = false;
 
+    // Ответы с ETag: при повторном запросе отправляем If-None-Match
+    // и на 304 используем сохраненные данные
+    const ETAG_CACHE_SIZE = 100;
+    const etagCache = new Map();
+
+    // Версия данных, до которой отображаемый список актуален (для /api/tasks/changes)
+    let lastDataVersion = null;
+    let syncVersion = null;
+
+    function fetchJSONWithETag(url) {
+        const cached = etagCache.get(url);
+        const headers = cached ? { 'If-None-Match': cached.etag } : {};
+
+        return fetch(url, { headers })
+            .then(response => {
+                const dataVersion = response.headers.get('X-Data-Version');
+                if (dataVersion !== null) {
+                    lastDataVersion = parseInt(dataVersion, 10);
+                }
+                if (response.status === 304 && cached) {
+                    return cached.data;
+                }
+                return response.json().then(data => {
+                    const etag = response.headers.get('ETag');
+                    if (etag) {
+                        etagCache.delete(url);
+                        etagCache.set(url, { etag: etag, data: data });
+                        if (etagCache.size > ETAG_CACHE_SIZE) {
+                            etagCache.delete(etagCache.keys().next().value);
+                        }
+                    }
+                    return data;
+                });
+            });
+    }
+
+    // Постраничная загрузка задач (бесконечная прокрутка)
+    const TASKS_PAGE_SIZE = 50;
+    let nextCursor = null;
+    let loadingMoreTasks = false;
+    let tasksRequestId = 0;
+
+    const tasksSentinel = document.createElement('div');
+    tasksSentinel.className = 'tasks-sentinel';
+
+    const sentinelObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreTasks();
+        }
+    }, { rootMargin: '200px' });
+
     // Инициализация
     loadTasks();
     loadEmailSettings();
@@ -32,16 +83,21 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // ========== ФУНКЦИИ ДЛЯ ЗАДАЧ ==========
 
-    // Загрузить задачи
+    // Загрузить задачи (первая страница)
     function loadTasks() {
         tasksContainer.innerHTML = '<div class="loading"><i class="fas fa-spinner fa-spin"></i> Загрузка задач...</div>';
 
-        const params = new URLSearchParams(currentFilters);
+        const requestId = ++tasksRequestId;
+        nextCursor = null;
 
-        fetch(`/api/tasks?${params}`)
-            .then(response => response.json())
-            .then(tasks => {
-                displayTasks(tasks);
+        fetchTasksPage(null)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                syncVersion = lastDataVersion;
+                nextCursor = page.next_cursor;
+                displayTasks(page.tasks);
                 updateStats();
                 loadCategories();
             })
@@ -51,6 +107,53 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Запросить одну страницу задач начиная с курсора.
+    // При поиске курсор - смещение в выдаче, отсортированной по релевантности
+    function fetchTasksPage(cursor) {
+        const params = new URLSearchParams(currentFilters);
+        params.set('limit', TASKS_PAGE_SIZE);
+
+        const searchTerm = searchInput.value.trim();
+        if (searchTerm) {
+            params.set('q', searchTerm);
+            if (cursor) {
+                params.set('offset', cursor);
+            }
+            return fetchJSONWithETag(`/api/tasks/search?${params}`)
+                .then(page => ({ tasks: page.tasks, next_cursor: page.next_offset }));
+        }
+
+        if (cursor) {
+            params.set('after', cursor);
+        }
+        return fetchJSONWithETag(`/api/tasks?${params}`);
+    }
+
+    // Догрузить следующую страницу при прокрутке
+    function loadMoreTasks() {
+        if (!nextCursor || loadingMoreTasks) {
+            return;
+        }
+
+        const requestId = tasksRequestId;
+        loadingMoreTasks = true;
+
+        fetchTasksPage(nextCursor)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                nextCursor = page.next_cursor;
+                appendTasks(page.tasks);
+            })
+            .catch(error => {
+                console.error('Ошибка загрузки задач:', error);
+            })
+            .finally(() => {
+                loadingMoreTasks = false;
+            });
+    }
+
     // Отобразить задачи
     function displayTasks(tasks) {
         if (tasks.length === 0) {
@@ -65,25 +168,30 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         tasksContainer.innerHTML = '';
+        tasksContainer.appendChild(tasksSentinel);
+        appendTasks(tasks);
+    }
 
-        const searchTerm = searchInput.value.toLowerCase();
-
+    // Добавить задачи в конец списка
+    function appendTasks(tasks) {
         tasks.forEach(task => {
-            // Фильтр поиска
-            if (searchTerm && !task.title.toLowerCase().includes(searchTerm) &&
-                !task.description.toLowerCase().includes(searchTerm)) {
-                return;
-            }
-
             const taskElement = createTaskElement(task);
-            tasksContainer.appendChild(taskElement);
+            tasksContainer.insertBefore(taskElement, tasksSentinel);
         });
+
+        // Повторно наблюдаем за маркером: если он все еще виден, догружаем дальше
+        sentinelObserver.unobserve(tasksSentinel);
+        if (nextCursor) {
+            sentinelObserver.observe(tasksSentinel);
+        }
     }
 
     // Создать элемент задачи
     function createTaskElement(task) {
         const taskElement = document.createElement('div');
         taskElement.className = `task-card priority-${task.priority} ${task.status}`;
+        taskElement.dataset.id = task.id;
+        taskElement.dataset.createdAt = task.created_at;
 
         const dueDate = task.due_date ? new Date(task.due_date).toLocaleDateString('ru-RU') : 'Без срока';
         const createdDate = new Date(task.created_at).toLocaleDateString('ru-RU');
@@ -108,7 +216,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         taskElement.innerHTML = `
             <div class="task-header">
-                <h3 class="task-title">${task.title}</h3>
+                <h3 class="task-title">${task.title_html || task.title}</h3>
                 <div class="task-actions">
                     ${emailIcon}
                     <button class="action-btn edit-btn" data-id="${task.id}" title="Редактировать">
@@ -119,7 +227,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     </button>
                 </div>
             </div>
-            <p class="task-description">${task.description || 'Нет описания'}</p>
+            <p class="task-description">${task.snippet || task.description || 'Нет описания'}</p>
             <div class="task-meta">
                 <div>
                     <span class="task-status status-${task.status}">${statusLabels[task.status]}</span>
@@ -156,8 +264,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Обновить статистику
     function updateStats() {
-        fetch('/api/stats')
-            .then(response => response.json())
+        fetchJSONWithETag('/api/stats')
             .then(stats => {
                 document.getElementById('total-tasks').textContent = stats.total;
                 document.getElementById('completed-tasks').textContent = stats.completed;
@@ -167,8 +274,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Загрузить категории
     function loadCategories() {
-        fetch('/api/categories')
-            .then(response => response.json())
+        fetchJSONWithETag('/api/categories')
             .then(categories => {
                 const categorySelect = filterCategory;
                 const categoriesList = document.getElementById('categories-list');
@@ -180,16 +286,16 @@ document.addEventListener('DOMContentLoaded', function() {
 
                 categories.forEach(category => {
                     const option = document.createElement('option');
-                    option.value = category;
-                    option.textContent = category;
+                    option.value = category.name;
+                    option.textContent = `${category.name} (${category.count})`;
                     categorySelect.appendChild(option);
 
                     const datalistOption = document.createElement('option');
-                    datalistOption.value = category;
+                    datalistOption.value = category.name;
                     categoriesList.appendChild(datalistOption);
 
                     const editDatalistOption = document.createElement('option');
-                    editDatalistOption.value = category;
+                    editDatalistOption.value = category.name;
                     editCategoriesList.appendChild(editDatalistOption);
                 });
             });
@@ -242,20 +348,15 @@ document.addEventListener('DOMContentLoaded', function() {
             document.getElementById('priority').value = 'medium';
             document.getElementById('send-email').checked = false;
 
-            // Перезагрузить задачи
-            loadTasks();
+            // Перезагрузить задачи, если изменения не придут через поток событий
+            reloadUnlessLive();
 
             // Показать уведомление
             let message = 'Задача успешно создана!';
             let type = 'success';
 
-            if (data.email_sent !== undefined) {
-                if (data.email_sent) {
-                    message += ' Email отправлен.';
-                } else {
-                    message += ' Ошибка отправки email: ' + data.email_message;
-                    type = 'warning';
-                }
+            if (data.email_queued) {
+                message += ' Email поставлен в очередь на отправку.';
             }
 
             showNotification(message, type);
@@ -327,7 +428,7 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(updatedTask => {
             closeEditModal();
-            loadTasks();
+            reloadUnlessLive();
             showNotification('Задача обновлена!', 'success');
         })
         .catch(error => {
@@ -356,7 +457,7 @@ document.addEventListener('DOMContentLoaded', function() {
         })
         .then(response => response.json())
         .then(() => {
-            loadTasks();
+            reloadUnlessLive();
             showNotification('Задача удалена!', 'success');
         })
         .catch(error => {
@@ -376,9 +477,13 @@ document.addEventListener('DOMContentLoaded', function() {
         loadTasks();
     });
 
-    // Поиск
+    // Поиск выполняется на сервере, запрос уходит после паузы в наборе
+    const SEARCH_DELAY = 300;
+    let searchTimer = null;
+
     searchInput.addEventListener('input', function() {
-        loadTasks();
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadTasks, SEARCH_DELAY);
     });
 
     // ========== ФУНКЦИИ ДЛЯ EMAIL ==========
@@ -555,6 +660,27 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
+    // Дождаться результата отправки письма из очереди: sent, dead или null по таймауту
+    function waitForEmail(emailId, attempts = 60) {
+        return new Promise(resolve => {
+            const poll = (left) => {
+                fetch(`/api/email/outbox/${emailId}`)
+                    .then(response => response.json())
+                    .then(message => {
+                        if (message.status === 'sent' || message.status === 'dead') {
+                            resolve(message);
+                        } else if (left > 0) {
+                            setTimeout(() => poll(left - 1), 1000);
+                        } else {
+                            resolve(null);
+                        }
+                    })
+                    .catch(() => resolve(null));
+            };
+            poll(attempts);
+        });
+    }
+
     // Тестовая отправка email
     testEmailForm.addEventListener('submit', function(e) {
         e.preventDefault();
@@ -581,6 +707,21 @@ document.addEventListener('DOMContentLoaded', function() {
             body: JSON.stringify({ email: email })
         })
         .then(response => response.json())
+        .then(data => {
+            // Письмо поставлено в очередь: ждем, пока обработчик его отправит
+            if (!data.queued) {
+                return data;
+            }
+            return waitForEmail(data.email_id).then(message => {
+                if (!message) {
+                    return { success: false, error: 'Письмо еще в очереди, проверьте результат позже' };
+                }
+                if (message.status === 'dead') {
+                    return { success: false, error: message.last_error };
+                }
+                return { success: true, message: 'Тестовое письмо отправлено успешно' };
+            });
+        })
         .then(data => {
             // Восстановить кнопку
             submitBtn.innerHTML = originalText;
@@ -656,7 +797,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     Swal.fire({
                         icon: 'success',
                         title: 'Успешно!',
-                        text: 'Задача отправлена на email',
+                        text: 'Задача поставлена в очередь на отправку',
                         timer: 2000
                     });
                 } else {
@@ -792,6 +933,190 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Обновлять статистику каждые 30 секунд
-    setInterval(updateStats, 30000);
+    // ========== ПОТОК СОБЫТИЙ ==========
+
+    // Изменения задач приходят с сервера (SSE) и применяются к списку точечно,
+    // вместо периодического опроса и полной перезагрузки после каждой правки
+    let eventSource = null;
+    let statsRefreshTimer = null;
+    // Через сколько мс переподключаться, если сервер отказал в потоке (503)
+    const EVENTS_RETRY_DELAY = 30000;
+
+    function isLive() {
+        return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+    }
+
+    function reloadUnlessLive() {
+        if (!isLive()) {
+            loadTasks();
+        }
+    }
+
+    // Подходит ли задача под текущие фильтры и поиск
+    function matchesCurrentView(task) {
+        if (currentFilters.status !== 'all' && task.status !== currentFilters.status) {
+            return false;
+        }
+        if (currentFilters.priority !== 'all' && task.priority !== currentFilters.priority) {
+            return false;
+        }
+        if (currentFilters.category !== 'all' && task.category !== currentFilters.category) {
+            return false;
+        }
+
+        const searchTerm = searchInput.value.toLowerCase();
+        return !searchTerm || task.title.toLowerCase().includes(searchTerm) ||
+            (task.description || '').toLowerCase().includes(searchTerm);
+    }
+
+    function findTaskElement(taskId) {
+        return tasksContainer.querySelector(`.task-card[data-id="${taskId}"]`);
+    }
+
+    function applyTaskCreated(task) {
+        if (!matchesCurrentView(task) || findTaskElement(task.id)) {
+            return;
+        }
+        if (!tasksContainer.contains(tasksSentinel)) {
+            // Список был пуст: убираем заглушку
+            tasksContainer.innerHTML = '';
+            tasksContainer.appendChild(tasksSentinel);
+        }
+        // Новые задачи идут первыми
+        tasksContainer.insertBefore(createTaskElement(task), tasksContainer.firstChild);
+    }
+
+    function applyTaskUpdated(task) {
+        const existing = findTaskElement(task.id);
+        if (!existing) {
+            return;
+        }
+        if (matchesCurrentView(task)) {
+            existing.replaceWith(createTaskElement(task));
+        } else {
+            existing.remove();
+        }
+    }
+
+    function applyTaskDeleted(taskId) {
+        const existing = findTaskElement(taskId);
+        if (existing) {
+            existing.remove();
+        }
+    }
+
+    // Изменение из /api/tasks/changes: неизвестно, создана задача или обновлена
+    function applyTaskChanged(task) {
+        if (findTaskElement(task.id)) {
+            applyTaskUpdated(task);
+            return;
+        }
+        // Показываем только задачи новее верхней в списке, старые появятся при прокрутке
+        const first = tasksContainer.querySelector('.task-card');
+        if (!first || task.created_at >= first.dataset.createdAt) {
+            applyTaskCreated(task);
+        }
+    }
+
+    function rememberVersion(version) {
+        if (syncVersion !== null && version > syncVersion) {
+            syncVersion = version;
+        }
+    }
+
+    // Догнать изменения после обрыва соединения, не перезагружая весь список
+    function syncChanges(since = syncVersion, afterId = null) {
+        if (since === null) {
+            loadTasks();
+            return;
+        }
+
+        const requestId = tasksRequestId;
+        const params = new URLSearchParams({ since: since });
+        if (afterId !== null) {
+            params.set('after_id', afterId);
+        }
+
+        fetch(`/api/tasks/changes?${params}`)
+            .then(response => response.json())
+            .then(changes => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                changes.deleted.forEach(applyTaskDeleted);
+                changes.changed.forEach(applyTaskChanged);
+
+                if (changes.next) {
+                    syncChanges(changes.next.since, changes.next.after_id);
+                } else {
+                    syncVersion = changes.version;
+                    scheduleStatsRefresh();
+                }
+            })
+            .catch(error => {
+                console.error('Ошибка синхронизации задач:', error);
+                loadTasks();
+            });
+    }
+
+    // Несколько изменений подряд дают одно обновление статистики
+    function scheduleStatsRefresh() {
+        clearTimeout(statsRefreshTimer);
+        statsRefreshTimer = setTimeout(() => {
+            updateStats();
+            loadCategories();
+        }, 300);
+    }
+
+    function connectEvents(reconnecting = false) {
+        if (!window.EventSource) {
+            // Без SSE обновляем статистику по таймеру, как раньше
+            setInterval(updateStats, 30000);
+            return;
+        }
+
+        const source = new EventSource('/api/events');
+        eventSource = source;
+        let disconnected = reconnecting;
+
+        source.addEventListener('open', () => {
+            if (disconnected) {
+                disconnected = false;
+                syncChanges();
+            }
+        });
+        source.addEventListener('error', () => {
+            disconnected = true;
+            // Закрытый сервером поток браузер переоткрывает сам, а после ответа
+            // с ошибкой (503 при лимите потоков) - нет: пробуем снова позже,
+            // вразброс, чтобы вкладки не вернулись одновременно
+            if (source.readyState === EventSource.CLOSED) {
+                setTimeout(() => connectEvents(true), EVENTS_RETRY_DELAY * (1 + Math.random()));
+            }
+        });
+
+        source.addEventListener('task_created', e => {
+            const task = JSON.parse(e.data);
+            applyTaskCreated(task);
+            rememberVersion(task.version);
+            scheduleStatsRefresh();
+        });
+        source.addEventListener('task_updated', e => {
+            const task = JSON.parse(e.data);
+            applyTaskUpdated(task);
+            rememberVersion(task.version);
+            scheduleStatsRefresh();
+        });
+        source.addEventListener('task_deleted', e => {
+            const data = JSON.parse(e.data);
+            applyTaskDeleted(data.id);
+            rememberVersion(data.version);
+            scheduleStatsRefresh();
+        });
+        // tasks_changed и resync обновляют статистику после синхронизации
+        source.addEventListener('tasks_changed', () => syncChanges());
+        source.addEventListener('resync', () => syncChanges());
+    }
+
+    connectEvents();
 });
\ No newline at end of file
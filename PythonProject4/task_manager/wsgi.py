@@ -0,0 +1,8 @@
+"""Точка входа WSGI для продакшен-сервера: gunicorn -c gunicorn.conf.py wsgi:app
+
+Схема базы здесь не создается: перед первым запуском выполните
+`flask --app app init-db` (и после обновлений приложения - `migrate-db`).
+"""
+from app import create_app
+
+app = create_app()
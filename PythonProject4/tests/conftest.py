@@ -0,0 +1,50 @@
+"""Общие фикстуры тестов: приложение над временной базой"""
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'task_manager')
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+import app as task_app  # noqa: E402
+
+
+def make_app(db_path, **config):
+    """Приложение над базой db_path со схемой, как после `flask init-db`"""
+    app = task_app.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SECRET_KEY': 'test',
+        'EMAIL_INPROCESS_WORKERS': False,
+        'TESTING': True,
+        **config
+    })
+    with app.app_context():
+        task_app.init_database()
+    return app
+
+
+def archive_tasks(app, task_ids):
+    """Перенести в архив выполненные задачи из task_ids, как `flask archive-tasks`; вернуть их число"""
+    days = app.config['ARCHIVE_AFTER_DAYS']
+    with app.app_context():
+        task_app.Task.query.filter(task_app.Task.id.in_(task_ids)).update(
+            {'completed_at': datetime.utcnow() - timedelta(days=days + 1)}, synchronize_session=False
+        )
+        task_app.db.session.commit()
+        return task_app.archive_completed_tasks(days, app.config['ARCHIVE_BATCH_SIZE'])
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = make_app(tmp_path / 'tasks.db')
+    yield app
+    with app.app_context():
+        task_app.db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,55 @@
+"""/api/tasks/changes: удаленные и перенесенные в архив задачи приходят в deleted"""
+from conftest import archive_tasks
+
+
+def changes(client, since=None):
+    query = {} if since is None else {'since': since}
+    response = client.get('/api/tasks/changes', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def create_tasks(client, count):
+    response = client.post('/api/tasks/batch', json={'tasks': [{'title': f'Задача {n}'} for n in range(count)]})
+    return [result['id'] for result in response.get_json()['results']]
+
+
+def test_deleted_tasks_reported(client):
+    kept, single, *batch = create_tasks(client, 4)
+    version = changes(client)['version']
+
+    client.delete(f'/api/tasks/{single}')
+    client.delete('/api/tasks/batch', json={'ids': batch})
+
+    result = changes(client, version)
+    assert sorted(result['deleted']) == sorted([single, *batch])
+    assert result['changed'] == []
+    assert [task['id'] for task in changes(client)['changed']] == [kept]
+
+
+def test_archived_tasks_reported(app, client):
+    kept, archived = create_tasks(client, 2)
+    client.put(f'/api/tasks/{archived}', json={'status': 'completed'})
+    version = changes(client)['version']
+
+    assert archive_tasks(app, [archived]) == 1
+
+    result = changes(client, version)
+    assert result['deleted'] == [archived]
+    assert result['changed'] == []
+    assert result['version'] > version
+    # Полный снимок не содержит задачу, а следующая синхронизация ее уже не повторяет
+    assert [task['id'] for task in changes(client)['changed']] == [kept]
+    assert changes(client, result['version'])['deleted'] == []
+
+
+def test_changed_and_deleted_since_same_version(client):
+    updated, deleted = create_tasks(client, 2)
+    version = changes(client)['version']
+
+    client.put(f'/api/tasks/{updated}', json={'title': 'Новое название'})
+    client.delete(f'/api/tasks/{deleted}')
+
+    result = changes(client, version)
+    assert [task['title'] for task in result['changed']] == ['Новое название']
+    assert result['deleted'] == [deleted]
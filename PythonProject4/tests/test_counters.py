@@ -0,0 +1,75 @@
+"""Счетчики TaskCounter и category.task_count, которые ведут триггеры, совпадают с пересчетом"""
+import random
+
+from conftest import archive_tasks, task_app
+
+CATEGORIES = ['work', 'home', 'study', None]
+
+
+def counters(app):
+    """Ненулевые счетчики задач и категорий"""
+    with app.app_context():
+        task_counts = sorted(
+            (counter.status, counter.priority, counter.category, counter.count)
+            for counter in task_app.TaskCounter.query.filter(task_app.TaskCounter.count > 0)
+        )
+        category_counts = sorted(task_app.db.session.execute(
+            task_app.db.select(task_app.Category.name, task_app.Category.task_count)
+            .where(task_app.Category.task_count > 0)
+        ).all())
+    return task_counts, category_counts
+
+
+def assert_counters_match_rebuild(app):
+    maintained = counters(app)
+    with app.app_context():
+        task_app.rebuild_task_counters()
+        task_app.rebuild_category_counts()
+    assert maintained == counters(app)
+    return maintained
+
+
+def random_fields(rnd):
+    return {
+        'status': rnd.choice(task_app.TASK_STATUSES),
+        'priority': rnd.choice(task_app.TASK_PRIORITIES),
+        'category': rnd.choice(CATEGORIES)
+    }
+
+
+def test_counters_follow_batch_changes(app, client):
+    rnd = random.Random(3)
+
+    response = client.post('/api/tasks/batch', json={
+        'tasks': [{'title': f'Задача {number}', **random_fields(rnd)} for number in range(200)]
+    })
+    assert response.get_json()['created'] == 200
+    task_ids = [task['id'] for task in client.get('/api/tasks').get_json()]
+    task_counts, _ = assert_counters_match_rebuild(app)
+    assert sum(count for *_, count in task_counts) == 200
+
+    updates = [{'id': task_id, **random_fields(rnd)} for task_id in rnd.sample(task_ids, 120)]
+    response = client.put('/api/tasks/batch', json={'tasks': updates})
+    assert response.get_json()['updated'] == 120
+    assert_counters_match_rebuild(app)
+
+    deleted = rnd.sample(task_ids, 70)
+    response = client.delete('/api/tasks/batch', json={'ids': deleted})
+    assert response.status_code == 200
+    task_counts, _ = assert_counters_match_rebuild(app)
+    assert sum(count for *_, count in task_counts) == 130
+
+
+def test_counters_follow_single_changes_and_archive(app, client):
+    first = client.post('/api/tasks', json={'title': 'Первая', 'category': 'work'}).get_json()['id']
+    second = client.post('/api/tasks', json={'title': 'Вторая', 'category': 'home'}).get_json()['id']
+    assert_counters_match_rebuild(app)
+
+    client.put(f'/api/tasks/{first}', json={'status': 'completed', 'priority': 'high', 'category': 'home'})
+    assert_counters_match_rebuild(app)
+
+    client.delete(f'/api/tasks/{second}')
+    assert_counters_match_rebuild(app)
+
+    assert archive_tasks(app, [first]) == 1
+    assert assert_counters_match_rebuild(app) == ([], [])
@@ -0,0 +1,50 @@
+"""Опрос очереди писем: пустая очередь не пишет в базу, готовые дайджесты захватываются"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from conftest import task_app
+
+
+@contextmanager
+def recorded_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip().split(None, 1)[0].upper())
+
+    with app.app_context():
+        engine = task_app.db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def test_idle_poll_does_not_write(app):
+    with app.app_context():
+        # Дайджест еще копится: он в очереди, но отправлять его рано
+        task_app.enqueue_task_email({'id': 1, 'title': 'Задача'}, 'user@example.com', digest=True)
+        task_app.db.session.commit()
+
+    with recorded_statements(app) as statements, app.app_context():
+        assert task_app.run_email_digests() == 0
+        assert task_app.claim_next_email() is None
+
+    assert statements and set(statements) == {'SELECT'}
+
+
+def test_ready_digest_is_claimed(app):
+    with app.app_context():
+        message = task_app.enqueue_task_email({'id': 1, 'title': 'Задача'}, 'user@example.com', digest=True)
+        message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        task_app.db.session.commit()
+
+        # Настроек email нет: письмо захвачено, попытка засчитана и отложена
+        assert task_app.run_email_digests() == 1
+        message = task_app.db.session.get(task_app.EmailOutbox, message.id)
+        assert message.attempts == 1
+        assert message.status == 'queued'
+        assert message.last_error == 'Настройки email не найдены'
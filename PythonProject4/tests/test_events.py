@@ -0,0 +1,32 @@
+"""Журнал событий TaskEvent: одна запись на изменение и очистка без подписчиков SSE"""
+from datetime import datetime, timedelta
+
+from conftest import make_app, task_app
+
+
+def event_types(app):
+    with app.app_context():
+        return [event.event_type for event in task_app.TaskEvent.query.order_by(task_app.TaskEvent.id)]
+
+
+def test_one_event_per_change(app, client):
+    task_id = client.post('/api/tasks', json={'title': 'Задача'}).get_json()['id']
+    client.put(f'/api/tasks/{task_id}', json={'status': 'completed'})
+    client.delete(f'/api/tasks/{task_id}')
+
+    assert event_types(app) == ['task_created', 'task_updated', 'task_deleted']
+
+
+def test_old_events_pruned_on_write_without_subscribers(tmp_path):
+    app = make_app(tmp_path / 'tasks.db', EVENTS_RETENTION=3600, EVENTS_PRUNE_INTERVAL=0)
+    client = app.test_client()
+    client.post('/api/tasks', json={'title': 'Старая'})
+    with app.app_context():
+        task_app.TaskEvent.query.update({'created_at': datetime.utcnow() - timedelta(hours=2)})
+        task_app.db.session.commit()
+
+    client.post('/api/tasks', json={'title': 'Новая'})
+
+    assert event_types(app) == ['task_created']
+    with app.app_context():
+        task_app.db.engine.dispose()
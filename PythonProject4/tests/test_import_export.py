@@ -0,0 +1,66 @@
+"""Выгрузка и загрузка задач (NDJSON и CSV) сохраняют данные"""
+import csv
+import io
+import json
+
+import pytest
+
+from conftest import make_app, task_app
+
+TASKS = [
+    {'title': 'Обычная задача', 'description': 'Описание', 'status': 'pending', 'priority': 'medium',
+     'category': 'work', 'due_date': '2025-01-31', 'assigned_email': 'user@example.com'},
+    {'title': 'Кавычки "и", запятые', 'description': 'Две\nстроки; "цитата", запятая', 'status': 'completed',
+     'priority': 'high', 'category': 'home', 'due_date': None, 'assigned_email': None},
+    {'title': 'Без описания', 'description': '', 'status': 'in_progress', 'priority': 'low',
+     'category': None, 'due_date': '2099-12-01', 'assigned_email': None},
+    {'title': 'Emoji 🚀 и юникод ёЁ', 'description': '\tтаб и пробелы  ', 'status': 'pending',
+     'priority': 'high', 'category': 'study', 'due_date': None, 'assigned_email': 'другой@example.com'},
+]
+
+# id и version при загрузке назначаются заново
+IGNORED_KEYS = ('id', 'version')
+
+
+def exported(client, export_format):
+    response = client.get(f'/api/tasks/export?format={export_format}')
+    assert response.status_code == 200
+    return response.get_data()
+
+
+def parsed(data, export_format):
+    """Строки выгрузки словарями без id и version"""
+    if export_format == 'csv':
+        rows = csv.DictReader(io.StringIO(data.decode('utf-8-sig'), newline=''))
+    else:
+        rows = (json.loads(line) for line in data.splitlines())
+    return [{key: value for key, value in row.items() if key not in IGNORED_KEYS} for row in rows]
+
+
+def listed(client):
+    tasks = client.get('/api/tasks?sort=due_date').get_json()
+    return sorted(
+        ({key: value for key, value in task.items() if key not in IGNORED_KEYS} for task in tasks),
+        key=lambda task: task['title']
+    )
+
+
+@pytest.mark.parametrize('export_format', sorted(task_app.TASK_FILE_FORMATS))
+def test_round_trip(client, tmp_path, export_format):
+    response = client.post('/api/tasks/batch', json={'tasks': TASKS})
+    assert response.get_json()['created'] == len(TASKS)
+    data = exported(client, export_format)
+
+    target = make_app(tmp_path / 'target.db')
+    target_client = target.test_client()
+    response = target_client.post(
+        f'/api/tasks/import?format={export_format}', data=data,
+        content_type=task_app.TASK_FILE_FORMATS[export_format]
+    )
+    assert response.get_json() == {'imported': len(TASKS), 'failed': 0, 'errors': []}
+
+    assert listed(target_client) == listed(client)
+    # Повторная выгрузка совпадает с исходной с точностью до id и version
+    assert parsed(exported(target_client, export_format), export_format) == parsed(data, export_format)
+    with target.app_context():
+        task_app.db.engine.dispose()
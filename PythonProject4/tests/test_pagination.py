@@ -0,0 +1,75 @@
+"""Постраничная выдача по курсору совпадает с выдачей целиком, в том числе вместе с архивом"""
+import json
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import archive_tasks, make_app, task_app
+
+TASK_COUNT = 150
+PAGE_SIZE = 7
+
+
+@pytest.fixture(scope='module')
+def paging_client(tmp_path_factory):
+    """Задачи с совпадающими датами создания и сроками; часть выполненных - в архиве"""
+    app = make_app(tmp_path_factory.mktemp('paging') / 'tasks.db')
+    client = app.test_client()
+    rnd = random.Random(7)
+    start = datetime(2024, 1, 1)
+    lines = [json.dumps({
+        'title': f'Задача {number}',
+        'status': rnd.choice(task_app.TASK_STATUSES),
+        'priority': rnd.choice(task_app.TASK_PRIORITIES),
+        'created_at': (start + timedelta(hours=rnd.randrange(40))).isoformat(),
+        'due_date': rnd.choice([None, '2024-02-01', '2024-03-15', '2099-01-01'])
+    }) for number in range(TASK_COUNT)]
+    response = client.post('/api/tasks/import', data='\n'.join(lines), content_type='application/x-ndjson')
+    assert response.get_json()['imported'] == TASK_COUNT
+
+    completed = [task['id'] for task in client.get('/api/tasks?status=completed').get_json()]
+    assert archive_tasks(app, completed[::2]) == len(completed[::2])
+
+    yield client
+    with app.app_context():
+        task_app.db.engine.dispose()
+
+
+def fetch_pages(client, params):
+    """id задач со всех страниц по порядку"""
+    ids, after = [], None
+    while True:
+        query = dict(params, limit=PAGE_SIZE)
+        if after:
+            query['after'] = after
+        response = client.get('/api/tasks', query_string=query)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert len(body['tasks']) <= PAGE_SIZE
+        ids += [task['id'] for task in body['tasks']]
+        after = body['next_cursor']
+        if after is None:
+            return ids
+
+
+@pytest.mark.parametrize('include_archived', ['false', 'true'])
+@pytest.mark.parametrize('sort', sorted(task_app.TASK_SORTS))
+@pytest.mark.parametrize('status', ['all', 'completed'])
+def test_pages_match_full_list(paging_client, sort, include_archived, status):
+    params = {'sort': sort, 'include_archived': include_archived, 'status': status}
+    full = [task['id'] for task in paging_client.get('/api/tasks', query_string=params).get_json()]
+
+    assert fetch_pages(paging_client, params) == full
+    assert len(set(full)) == len(full)
+
+
+def test_archived_tasks_only_with_include_archived(paging_client):
+    hot = paging_client.get('/api/tasks').get_json()
+    merged = paging_client.get('/api/tasks?include_archived=true').get_json()
+
+    assert len(hot) < TASK_COUNT
+    assert len(merged) == TASK_COUNT
+    # Слияние с архивом сохраняет порядок: новые первыми, при равной дате - больший id
+    keys = [(task['created_at'], task['id']) for task in merged]
+    assert keys == sorted(keys, reverse=True)
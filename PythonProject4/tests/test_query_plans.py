@@ -0,0 +1,103 @@
+"""Запросы списка, фильтров и сортировок идут по индексам (EXPLAIN QUERY PLAN)"""
+import random
+import re
+
+import pytest
+from sqlalchemy import event
+
+from conftest import make_app, task_app
+
+TASK_COUNT = 3000
+
+# Полный проход по таблице: SCAN без USING INDEX
+FULL_SCAN = re.compile(r'^SCAN (task|category)$')
+
+
+@pytest.fixture(scope='module')
+def seeded_app(tmp_path_factory):
+    """Приложение с несколькими тысячами задач и статистикой планировщика, как после migrate-db"""
+    app = make_app(tmp_path_factory.mktemp('plans') / 'tasks.db')
+    rnd = random.Random(42)
+    tasks = [{
+        'title': f'Задача {number}',
+        'status': rnd.choice(task_app.TASK_STATUSES),
+        'priority': rnd.choice(task_app.TASK_PRIORITIES),
+        'category': rnd.choice(['work', 'home', 'study', 'other']),
+        'due_date': rnd.choice([None, '2020-01-15', '2099-06-01'])
+    } for number in range(TASK_COUNT)]
+    response = app.test_client().post('/api/tasks/batch', json={'tasks': tasks})
+    assert response.status_code == 200
+    with app.app_context():
+        task_app.migrate_database()
+    yield app
+    with app.app_context():
+        task_app.db.engine.dispose()
+
+
+def query_plans(app, url):
+    """Выполнить GET url и вернуть {SQL: строки плана} для всех SELECT запроса"""
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    with app.app_context():
+        engine = task_app.db.engine
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = app.test_client().get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+    plans = {}
+    with app.app_context():
+        connection = task_app.db.session.connection()
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+            plans[statement] = [row[3] for row in rows]
+    return plans
+
+
+def task_plan(plans):
+    """План единственного запроса, читающего таблицу task"""
+    task_plans = [plan for plan in plans.values() if any(re.match(r'(SCAN|SEARCH) task\b', line) for line in plan)]
+    assert len(task_plans) == 1, plans
+    return task_plans[0]
+
+
+@pytest.mark.parametrize('url, index', [
+    ('/api/tasks?limit=50', 'ix_task_created_at_id'),
+    ('/api/tasks?limit=50&sort=due_date', 'ix_task_due_date_id'),
+    ('/api/tasks?limit=50&sort=priority', 'ix_task_priority_due_date_id'),
+    ('/api/tasks?limit=50&status=pending', 'ix_task_status_created_at_id'),
+    ('/api/tasks?limit=50&priority=high', 'ix_task_priority_created_at_id'),
+    ('/api/tasks?limit=50&category=work', 'ix_task_category_id_created_at_id'),
+    ('/api/tasks/overdue', 'ix_task_overdue'),
+])
+def test_task_list_uses_index(seeded_app, url, index):
+    plan = task_plan(query_plans(seeded_app, url))
+    assert any(re.search(rf'USING (COVERING )?INDEX {index}\b', line) for line in plan), plan
+    assert not any(FULL_SCAN.match(line) for line in plan), plan
+
+
+@pytest.mark.parametrize('url', [
+    '/api/tasks?limit=50',
+    '/api/tasks?limit=50&sort=due_date',
+    '/api/tasks?limit=50&sort=priority',
+    '/api/tasks?limit=50&status=completed',
+    '/api/tasks?limit=50&category=home',
+])
+def test_task_list_sorted_by_index(seeded_app, url):
+    """Страница берется из индекса в нужном порядке, без сортировки всех подходящих строк"""
+    plan = task_plan(query_plans(seeded_app, url))
+    assert 'USE TEMP B-TREE FOR ORDER BY' not in plan, plan
+
+
+@pytest.mark.parametrize('url', ['/api/stats', '/api/categories'])
+def test_counters_do_not_read_tasks(seeded_app, url):
+    """Статистика и категории читают счетчики, а не таблицу task"""
+    for statement, plan in query_plans(seeded_app, url).items():
+        assert not any(re.match(r'(SCAN|SEARCH) task\b', line) for line in plan), statement
+        assert not any(FULL_SCAN.match(line) for line in plan), statement
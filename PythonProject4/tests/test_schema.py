@@ -0,0 +1,68 @@
+"""init-db и migrate-db приводят одну и ту же старую базу к одной схеме"""
+import shutil
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from conftest import make_app, task_app
+
+
+def schema(db_path):
+    """Объекты схемы основной базы и архива без служебных таблиц SQLite"""
+    result = []
+    for path in (db_path, task_app.archive_database_path(str(db_path))):
+        with closing(sqlite3.connect(path)) as connection:
+            result.append(sorted(connection.execute(
+                "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+            )))
+    return result
+
+
+def copy_database(source, target):
+    shutil.copy(source, target)
+    shutil.copy(task_app.archive_database_path(str(source)), task_app.archive_database_path(str(target)))
+
+
+@pytest.fixture
+def old_database(tmp_path):
+    """База без индексов и триггеров, как после старой версии приложения"""
+    db_path = tmp_path / 'old.db'
+    app = make_app(db_path)
+    app.test_client().post('/api/tasks/batch', json={'tasks': [{'title': f'Задача {n}'} for n in range(5)]})
+    with app.app_context():
+        task_app.db.engine.dispose()
+
+    # Соединение закрывается: последнее закрытое соединение переносит WAL в
+    # файл базы, иначе копия файла не увидела бы удаления
+    with closing(sqlite3.connect(db_path)) as connection:
+        objects = connection.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+        ).fetchall()
+        for object_type, name in objects:
+            connection.execute(f'DROP {object_type.upper()} {name}')
+    return db_path
+
+
+def run_command(db_path, command):
+    app = task_app.create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'SECRET_KEY': 'test',
+        'EMAIL_INPROCESS_WORKERS': False
+    })
+    with app.app_context():
+        command()
+        task_app.db.engine.dispose()
+
+
+def test_init_and_migrate_give_same_schema(old_database, tmp_path):
+    init_path, migrate_path, fresh_path = tmp_path / 'init.db', tmp_path / 'migrate.db', tmp_path / 'fresh.db'
+    copy_database(old_database, init_path)
+    copy_database(old_database, migrate_path)
+
+    run_command(init_path, task_app.init_database)
+    run_command(migrate_path, task_app.migrate_database)
+    run_command(fresh_path, task_app.init_database)
+
+    assert schema(init_path) == schema(migrate_path)
+    assert schema(init_path) == schema(fresh_path)
@@ -0,0 +1,146 @@
+"""Пул SMTP-соединений против настоящего SMTP-сервера (заглушка на сокетах).
+
+Заглушка понимает ровно то, что шлет smtplib: EHLO, AUTH, MAIL, RCPT, DATA,
+NOOP и QUIT. Она считает соединения и письма и умеет оборвать все открытые
+соединения, как это делает почтовый сервер по таймауту простоя.
+"""
+import socket
+import socketserver
+import threading
+
+import pytest
+
+import app as task_app
+
+
+class SMTPStubHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        stub = self.server
+        with stub.lock:
+            stub.connections += 1
+            stub.sockets.append(self.connection)
+
+        self.reply('220 stub ESMTP')
+        while True:
+            try:
+                line = self.rfile.readline()
+            except OSError:
+                return
+            if not line:
+                return
+            command = line.decode().strip().upper()
+            if command.startswith('EHLO'):
+                self.reply('250-stub')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif command.startswith('AUTH'):
+                self.reply('235 Authentication successful')
+            elif command.startswith('DATA'):
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                body = []
+                for data_line in self.rfile:
+                    if data_line.rstrip(b'\r\n') == b'.':
+                        break
+                    body.append(data_line)
+                with stub.lock:
+                    stub.messages.append(b''.join(body))
+                self.reply('250 Queued')
+            elif command.startswith('QUIT'):
+                with stub.lock:
+                    stub.quits += 1
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+    def reply(self, text):
+        self.wfile.write(f'{text}\r\n'.encode())
+
+
+class SMTPStub(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPStubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.quits = 0
+        self.messages = []
+        self.sockets = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_connections(self):
+        """Оборвать все открытые соединения без QUIT"""
+        with self.lock:
+            sockets, self.sockets = self.sockets, []
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def smtp_stub():
+    stub = SMTPStub()
+    thread = threading.Thread(target=stub.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield stub
+    stub.shutdown()
+    stub.drop_connections()
+    stub.server_close()
+
+
+def save_settings(client, smtp_stub, password='secret'):
+    response = client.post('/api/email/settings', json={
+        'smtp_server': '127.0.0.1',
+        'smtp_port': smtp_stub.port,
+        'use_tls': False,
+        'use_ssl': False,
+        'username': 'sender@example.com',
+        'password': password
+    })
+    assert response.status_code == 200
+
+
+def send(app, client, title):
+    task = client.post('/api/tasks', json={'title': title}).get_json()
+    with app.app_context():
+        return task_app.send_task_email(task, 'recipient@example.com')
+
+
+def test_connection_is_reused(app, client, smtp_stub):
+    save_settings(client, smtp_stub)
+
+    assert send(app, client, 'Первая')[0]
+    assert send(app, client, 'Вторая')[0]
+
+    assert len(smtp_stub.messages) == 2
+    assert smtp_stub.connections == 1
+
+
+def test_reconnects_after_server_drops_connection(app, client, smtp_stub):
+    save_settings(client, smtp_stub)
+    assert send(app, client, 'Первая')[0]
+
+    # Сервер закрыл простаивающее соединение: NOOP не проходит, пул открывает новое
+    smtp_stub.drop_connections()
+    ok, message = send(app, client, 'Вторая')
+
+    assert ok, message
+    assert len(smtp_stub.messages) == 2
+    assert smtp_stub.connections == 2
+
+
+def test_settings_change_closes_pooled_connections(app, client, smtp_stub):
+    save_settings(client, smtp_stub)
+    assert send(app, client, 'Первая')[0]
+
+    save_settings(client, smtp_stub, password='changed')
+    assert send(app, client, 'Вторая')[0]
+
+    assert smtp_stub.connections == 2
+    assert smtp_stub.quits == 1
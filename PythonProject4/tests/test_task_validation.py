@@ -0,0 +1,46 @@
+"""Тело запроса с задачей - любой JSON: не-объект дает 400, а не 500"""
+import json
+
+import pytest
+
+NOT_OBJECTS = [[], 'задача', 5, None, True]
+
+
+@pytest.mark.parametrize('body', NOT_OBJECTS)
+def test_create_rejects_non_object(client, body):
+    response = client.post('/api/tasks', data=json.dumps(body), content_type='application/json')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Ожидается объект задачи'}
+
+
+@pytest.mark.parametrize('body', NOT_OBJECTS)
+def test_update_rejects_non_object(client, body):
+    task_id = client.post('/api/tasks', json={'title': 'Задача'}).get_json()['id']
+
+    response = client.put(f'/api/tasks/{task_id}', data=json.dumps(body), content_type='application/json')
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Ожидается объект задачи'}
+    assert [task['title'] for task in client.get('/api/tasks').get_json()] == ['Задача']
+
+
+def test_batch_create_rejects_non_object_items(client):
+    response = client.post('/api/tasks/batch', json={'tasks': [[], {'title': 'Задача'}, 'задача']})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['created'] == 1
+    assert [result['status'] for result in body['results']] == ['error', 'created', 'error']
+    assert body['results'][0]['error'] == 'Ожидается объект задачи'
+
+
+def test_batch_update_rejects_non_object_items(client):
+    task_id = client.post('/api/tasks', json={'title': 'Задача'}).get_json()['id']
+
+    response = client.put('/api/tasks/batch', json={'tasks': [5, {'id': task_id, 'status': 'completed'}]})
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0] == {'index': 0, 'id': None, 'status': 'error', 'error': 'Ожидается объект задачи'}
+    assert results[1]['status'] == 'updated'
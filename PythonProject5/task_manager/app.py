@@ -1,26 +1,122 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from datetime import datetime
+import click
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
-
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///tasks.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Настройки email (будут настраиваться через веб-интерфейс)
-app.config['EMAIL_CONFIG'] = {
-    'server': '',
-    'port': 587,
-    'username': '',
-    'password': '',
-    'from_email': '',
-    'use_tls': True
+import sys
+import base64
+import threading
+import time
+import json
+import hashlib
+from collections import OrderedDict
+
+# Пул SMTP-соединений общий с PythonProject4 (модуль smtp_pool.py рядом с его app.py)
+SHARED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          'PythonProject4', 'task_manager')
+if SHARED_DIR not in sys.path:
+    sys.path.append(SHARED_DIR)
+
+from smtp_pool import SMTPConnectionPool  # noqa: E402
+
+db = SQLAlchemy()
+
+# Маршруты и команды приложения; create_app() подключает их к экземпляру Flask
+bp = Blueprint('task_manager', __name__, cli_group=None)
+
+# Профили подключения к SQLite. production включает WAL (читатели не ждут писателя),
+# ожидание блокировки вместо мгновенной ошибки "database is locked" и пул побольше
+SQLITE_PROFILES = {
+    'default': {
+        'pragmas': {},
+        'engine_options': {}
+    },
+    'production': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',        # в режиме WAL безопасно и намного быстрее FULL
+            'busy_timeout': 5000,           # мс ожидания занятой базы
+            'cache_size': -64000,           # отрицательное значение - в КиБ, т.е. ~64 МБ
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY'
+        },
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30
+        }
+    }
 }
 
-db = SQLAlchemy(app)
+
+def create_app(config=None):
+    """Создать и настроить приложение.
+
+    config - словарь настроек поверх значений по умолчанию. Таблицы фабрика
+    не создает: это делает `flask init-db`.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('TASK_MANAGER_DATABASE_URI', 'sqlite:///tasks.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Настройки email хранятся в базе (EmailConfig), процесс держит их копию столько секунд
+    app.config['EMAIL_CONFIG_CACHE_TTL'] = 5
+
+    # Пул SMTP-соединений
+    app.config['SMTP_POOL_SIZE'] = 4
+    app.config['SMTP_POOL_IDLE_TIMEOUT'] = 60  # секунд простоя до закрытия соединения
+    app.config['SMTP_TIMEOUT'] = 30
+
+    # Сколько отрендеренных писем держать в памяти
+    app.config['EMAIL_RENDER_CACHE_SIZE'] = 1024
+
+    # Настройки SQLite: 'production' (см. SQLITE_PROFILES) или 'default' - как у драйвера
+    app.config['SQLITE_PROFILE'] = os.environ.get('SQLITE_PROFILE', 'production')
+
+    app.config.update(config or {})
+    app.config.setdefault(
+        'SQLALCHEMY_ENGINE_OPTIONS', SQLITE_PROFILES[app.config['SQLITE_PROFILE']]['engine_options']
+    )
+
+    db.init_app(app)
+    with app.app_context():
+        event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+
+    # Пул и кеши свои у каждого приложения: два приложения в одном процессе
+    # не делят соединения и настройки. Код берет их через current_app.extensions
+    app.extensions['smtp_pool'] = SMTPConnectionPool(app.config['SMTP_POOL_SIZE'], app.config['SMTP_POOL_IDLE_TIMEOUT'])
+    app.extensions['email_config_cache'] = EmailConfigCache()
+    app.extensions['email_parts_cache'] = EmailPartsCache()
+
+    app.register_blueprint(bp)
+    return app
+
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Выставляет PRAGMA выбранного профиля на каждом новом соединении"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PROFILES[current_app.config['SQLITE_PROFILE']]['pragmas'].items():
+        cursor.execute(f'PRAGMA {name}={value}')
+    cursor.close()
+    dbapi_connection.create_function('casefold', 1, sql_casefold, deterministic=True)
+
+
+def sql_casefold(value):
+    """casefold() для SQL: lower() и LIKE в SQLite не меняют регистр кириллицы"""
+    return value.casefold() if isinstance(value, str) else value
+
+
+def task_search_filter(search):
+    """Условие поиска подстроки в названии или описании без учета регистра"""
+    term = search.casefold()
+    return db.or_(
+        db.func.instr(db.func.casefold(Task.title), term) > 0,
+        db.func.instr(db.func.casefold(Task.description), term) > 0
+    )
 
 
 # Модель задачи
@@ -67,26 +163,142 @@ class EmailConfig(db.Model):
         }
 
 
-# Создаем таблицы
-with app.app_context():
+@bp.cli.command('init-db')
+def init_db_command():
+    """Создать таблицы базы данных"""
     db.create_all()
+    click.echo('База данных готова')
+
+
+# Размер страницы для постраничной выдачи задач
+TASKS_PAGE_SIZE = 50
+TASKS_MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(task):
+    """Кодирует позицию задачи (created_at, id) в непрозрачный курсор"""
+    raw = f"{task.created_at.isoformat()}|{task.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Декодирует курсор в пару (created_at, id). Бросает ValueError для некорректного курсора"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    created_at, task_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(task_id)
 
 
-# Загружаем настройки email
+# Кеш настроек email. Сохранение обновляет его сразу, а другие процессы
+# перечитают настройки из базы не позже чем через EMAIL_CONFIG_CACHE_TTL секунд
+class EmailConfigCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+
+    def get(self, ttl):
+        """Пара (свежие ли, настройки); настройки старше ttl секунд не свежие"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < ttl:
+                return True, self._value
+        return False, None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.monotonic()
+
+
+# Загружаем настройки email из базы в кеш
 def load_email_config():
-    with app.app_context():
-        config = EmailConfig.query.first()
-        if config:
-            app.config['EMAIL_CONFIG'] = config.to_dict()
-            app.config['EMAIL_CONFIG']['password'] = config.password
-        return config
+    config = EmailConfig.query.first()
+    value = None
+    if config:
+        value = config.to_dict()
+        value['password'] = config.password
+
+    current_app.extensions['email_config_cache'].set(value)
+    return value
+
+
+# Настройки email из кеша (None, если email не настроен)
+def get_cached_email_config():
+    fresh, value = current_app.extensions['email_config_cache'].get(current_app.config['EMAIL_CONFIG_CACHE_TTL'])
+    if fresh:
+        return value
+    return load_email_config()
+
+
+# Пул SMTP-соединений текущего приложения
+def get_smtp_pool():
+    return current_app.extensions['smtp_pool']
+
+
+def open_smtp_connection(config):
+    """Открыть и авторизовать новое SMTP-соединение"""
+    server = smtplib.SMTP(config['smtp_server'], config['smtp_port'], timeout=current_app.config['SMTP_TIMEOUT'])
+    try:
+        if config['use_tls']:
+            server.starttls()
+        server.login(config['username'], config['password'])
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+# LRU-кеш готовых MIME-частей писем
+class EmailPartsCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parts = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            parts = self._parts.get(key)
+            if parts is not None:
+                self._parts.move_to_end(key)
+            return parts
+
+    def put(self, key, parts, max_size):
+        with self._lock:
+            self._parts[key] = parts
+            while len(self._parts) > max_size:
+                self._parts.popitem(last=False)
+
+
+# Рендер письма с кешем готовых MIME-частей
+def render_email_parts(template_name, context, cache_key=None):
+    cache = current_app.extensions['email_parts_cache']
+    if cache_key is not None:
+        parts = cache.get(cache_key)
+        if parts is not None:
+            return parts
+
+    # Скомпилированные шаблоны кеширует jinja_env приложения
+    jinja_env = current_app.jinja_env
+    parts = (
+        MIMEText(jinja_env.get_template(f'email/{template_name}.txt').render(context), 'plain', 'utf-8'),
+        MIMEText(jinja_env.get_template(f'email/{template_name}.html').render(context), 'html', 'utf-8')
+    )
+
+    if cache_key is not None:
+        cache.put(cache_key, parts, current_app.config['EMAIL_RENDER_CACHE_SIZE'])
+
+    return parts
+
+
+# Письмо по задаче: повторная отправка той же версии задачи не рендерит шаблон заново
+def render_task_email(template_name, task_data):
+    version = hashlib.sha1(json.dumps(task_data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return render_email_parts(template_name, {'task': task_data}, cache_key=(template_name, task_data['id'], version))
 
 
 # Отправка email
-def send_email(to_email, subject, html_content, text_content):
-    config = app.config['EMAIL_CONFIG']
+def send_email(to_email, subject, parts):
+    config = get_cached_email_config()
 
-    if not config['username'] or not config['password']:
+    if not config or not config['username'] or not config['password']:
         return False, "Email не настроен"
 
     try:
@@ -95,18 +307,14 @@ def send_email(to_email, subject, html_content, text_content):
         msg['From'] = config['from_email']
         msg['To'] = to_email
 
-        part1 = MIMEText(text_content, 'plain')
-        part2 = MIMEText(html_content, 'html')
+        for part in parts:
+            msg.attach(part)
 
-        msg.attach(part1)
-        msg.attach(part2)
-
-        server = smtplib.SMTP(config['smtp_server'], config['smtp_port'])
-        if config['use_tls']:
-            server.starttls()
-        server.login(config['username'], config['password'])
-        server.send_message(msg)
-        server.quit()
+        # Ключ пула: соединение годится только для тех же настроек
+        key = (config['smtp_server'], config['smtp_port'], config['use_tls'],
+               config['username'], config['password'])
+        with get_smtp_pool().connection(key, lambda: open_smtp_connection(config)) as server:
+            server.send_message(msg)
 
         return True, "Письмо отправлено"
     except Exception as e:
@@ -114,31 +322,62 @@ def send_email(to_email, subject, html_content, text_content):
 
 
 # Главная страница
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template('index.html')
 
 
 # API: Получить все задачи
-@app.route('/api/tasks', methods=['GET'])
+@bp.route('/api/tasks', methods=['GET'])
 def get_tasks():
     status = request.args.get('status', 'all')
     priority = request.args.get('priority', 'all')
+    search = request.args.get('q', '').strip()
 
-    with app.app_context():
-        query = Task.query
+    query = Task.query
+
+    if status != 'all':
+        query = query.filter_by(status=status)
+    if priority != 'all':
+        query = query.filter_by(priority=priority)
+    if search:
+        query = query.filter(task_search_filter(search))
+
+    query = query.order_by(Task.created_at.desc(), Task.id.desc())
 
-        if status != 'all':
-            query = query.filter_by(status=status)
-        if priority != 'all':
-            query = query.filter_by(priority=priority)
+    # Без limit/after возвращаем весь список, как раньше
+    if 'limit' not in request.args and 'after' not in request.args:
+        return jsonify([task.to_dict() for task in query.all()])
 
-        tasks = query.order_by(Task.created_at.desc()).all()
-        return jsonify([task.to_dict() for task in tasks])
+    try:
+        limit = int(request.args.get('limit', TASKS_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'Некорректный параметр limit'}), 400
+    limit = max(1, min(limit, TASKS_MAX_PAGE_SIZE))
+
+    after = request.args.get('after')
+    if after:
+        try:
+            after_created_at, after_id = decode_cursor(after)
+        except ValueError:
+            return jsonify({'error': 'Некорректный курсор'}), 400
+        query = query.filter(db.or_(
+            Task.created_at < after_created_at,
+            db.and_(Task.created_at == after_created_at, Task.id < after_id)
+        ))
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    tasks = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(tasks[limit - 1]) if len(tasks) > limit else None
+
+    return jsonify({
+        'tasks': [task.to_dict() for task in tasks[:limit]],
+        'next_cursor': next_cursor
+    })
 
 
 # API: Создать задачу
-@app.route('/api/tasks', methods=['POST'])
+@bp.route('/api/tasks', methods=['POST'])
 def create_task():
     data = request.json
 
@@ -149,191 +388,149 @@ def create_task():
         except:
             pass
 
-    with app.app_context():
-        task = Task(
-            title=data['title'],
-            description=data.get('description', ''),
-            priority=data.get('priority', 'medium'),
-            due_date=due_date,
-            assigned_email=data.get('assigned_email')
+    task = Task(
+        title=data['title'],
+        description=data.get('description', ''),
+        priority=data.get('priority', 'medium'),
+        due_date=due_date,
+        assigned_email=data.get('assigned_email')
+    )
+
+    db.session.add(task)
+    db.session.commit()
+
+    # Отправляем email если нужно
+    if data.get('send_email') and data.get('assigned_email'):
+        task_data = task.to_dict()
+
+        success, message = send_email(
+            data['assigned_email'],
+            f"Новая задача: {task_data['title']}",
+            render_task_email('new_task', task_data)
         )
 
-        db.session.add(task)
-        db.session.commit()
-
-        # Отправляем email если нужно
-        if data.get('send_email') and data.get('assigned_email'):
-            task_data = task.to_dict()
-
-            html = f"""
-            <h2>Новая задача: {task_data['title']}</h2>
-            <p><strong>Описание:</strong> {task_data['description'] or 'Нет описания'}</p>
-            <p><strong>Статус:</strong> {task_data['status']}</p>
-            <p><strong>Приоритет:</strong> {task_data['priority']}</p>
-            <p><strong>Срок:</strong> {task_data['due_date'] or 'Не указан'}</p>
-            """
-
-            text = f"""
-            Новая задача: {task_data['title']}
-            Описание: {task_data['description'] or 'Нет описания'}
-            Статус: {task_data['status']}
-            Приоритет: {task_data['priority']}
-            Срок: {task_data['due_date'] or 'Не указан'}
-            """
-
-            success, message = send_email(
-                data['assigned_email'],
-                f"Новая задача: {task_data['title']}",
-                html,
-                text
-            )
-
-            return jsonify({
-                'task': task.to_dict(),
-                'email_sent': success,
-                'email_message': message
-            })
-
-        return jsonify(task.to_dict())
+        return jsonify({
+            'task': task.to_dict(),
+            'email_sent': success,
+            'email_message': message
+        })
+
+    return jsonify(task.to_dict())
 
 
 # API: Обновить задачу
-@app.route('/api/tasks/<int:task_id>', methods=['PUT'])
+@bp.route('/api/tasks/<int:task_id>', methods=['PUT'])
 def update_task(task_id):
     data = request.json
 
-    with app.app_context():
-        task = Task.query.get_or_404(task_id)
-
-        if 'title' in data:
-            task.title = data['title']
-        if 'description' in data:
-            task.description = data['description']
-        if 'status' in data:
-            task.status = data['status']
-        if 'priority' in data:
-            task.priority = data['priority']
-        if 'assigned_email' in data:
-            task.assigned_email = data['assigned_email']
-        if 'due_date' in data:
-            try:
-                task.due_date = datetime.strptime(data['due_date'], '%Y-%m-%d') if data['due_date'] else None
-            except:
-                pass
-
-        db.session.commit()
-        return jsonify(task.to_dict())
+    task = Task.query.get_or_404(task_id)
+
+    if 'title' in data:
+        task.title = data['title']
+    if 'description' in data:
+        task.description = data['description']
+    if 'status' in data:
+        task.status = data['status']
+    if 'priority' in data:
+        task.priority = data['priority']
+    if 'assigned_email' in data:
+        task.assigned_email = data['assigned_email']
+    if 'due_date' in data:
+        try:
+            task.due_date = datetime.strptime(data['due_date'], '%Y-%m-%d') if data['due_date'] else None
+        except:
+            pass
+
+    db.session.commit()
+    return jsonify(task.to_dict())
 
 
 # API: Удалить задачу
-@app.route('/api/tasks/<int:task_id>', methods=['DELETE'])
+@bp.route('/api/tasks/<int:task_id>', methods=['DELETE'])
 def delete_task(task_id):
-    with app.app_context():
-        task = Task.query.get_or_404(task_id)
-        db.session.delete(task)
-        db.session.commit()
-        return jsonify({'success': True})
+    task = Task.query.get_or_404(task_id)
+    db.session.delete(task)
+    db.session.commit()
+    return jsonify({'success': True})
 
 
 # API: Отправить задачу по email
-@app.route('/api/tasks/<int:task_id>/send', methods=['POST'])
+@bp.route('/api/tasks/<int:task_id>/send', methods=['POST'])
 def send_task_email(task_id):
     data = request.json
 
-    with app.app_context():
-        task = Task.query.get_or_404(task_id)
-
-        email = data.get('email', task.assigned_email)
-        if not email:
-            return jsonify({'error': 'Не указан email'}), 400
-
-        html = f"""
-        <h2>Задача: {task.title}</h2>
-        <p><strong>Описание:</strong> {task.description or 'Нет описания'}</p>
-        <p><strong>Статус:</strong> {task.status}</p>
-        <p><strong>Приоритет:</strong> {task.priority}</p>
-        <p><strong>Срок:</strong> {task.due_date.strftime('%Y-%m-%d') if task.due_date else 'Не указан'}</p>
-        <p><strong>Создана:</strong> {task.created_at.strftime('%Y-%m-%d %H:%M')}</p>
-        """
-
-        text = f"""
-        Задача: {task.title}
-        Описание: {task.description or 'Нет описания'}
-        Статус: {task.status}
-        Приоритет: {task.priority}
-        Срок: {task.due_date.strftime('%Y-%m-%d') if task.due_date else 'Не указан'}
-        Создана: {task.created_at.strftime('%Y-%m-%d %H:%M')}
-        """
+    task = Task.query.get_or_404(task_id)
 
-        success, message = send_email(
-            email,
-            f"Задача: {task.title}",
-            html,
-            text
-        )
+    email = data.get('email', task.assigned_email)
+    if not email:
+        return jsonify({'error': 'Не указан email'}), 400
 
-        return jsonify({
-            'success': success,
-            'message': message
-        })
+    success, message = send_email(
+        email,
+        f"Задача: {task.title}",
+        render_task_email('task', task.to_dict())
+    )
+
+    return jsonify({
+        'success': success,
+        'message': message
+    })
 
 
 # API: Получить статистику
-@app.route('/api/stats', methods=['GET'])
+@bp.route('/api/stats', methods=['GET'])
 def get_stats():
-    with app.app_context():
-        total = Task.query.count()
-        completed = Task.query.filter_by(status='completed').count()
-        pending = Task.query.filter_by(status='pending').count()
+    total = Task.query.count()
+    completed = Task.query.filter_by(status='completed').count()
+    pending = Task.query.filter_by(status='pending').count()
 
-        return jsonify({
-            'total': total,
-            'completed': completed,
-            'pending': pending
-        })
+    return jsonify({
+        'total': total,
+        'completed': completed,
+        'pending': pending
+    })
 
 
 # API: Настройки email
-@app.route('/api/email/config', methods=['GET'])
+@bp.route('/api/email/config', methods=['GET'])
 def get_email_config():
-    with app.app_context():
-        config = EmailConfig.query.first()
-        if config:
-            return jsonify(config.to_dict())
-        return jsonify({'configured': False})
+    config = EmailConfig.query.first()
+    if config:
+        return jsonify(config.to_dict())
+    return jsonify({'configured': False})
 
 
-@app.route('/api/email/config', methods=['POST'])
+@bp.route('/api/email/config', methods=['POST'])
 def save_email_config():
     data = request.json
 
-    with app.app_context():
-        # Удаляем старые настройки
-        EmailConfig.query.delete()
-
-        config = EmailConfig(
-            smtp_server=data.get('smtp_server', 'smtp.gmail.com'),
-            smtp_port=int(data.get('smtp_port', 587)),
-            username=data.get('username', ''),
-            password=data.get('password', ''),
-            from_email=data.get('from_email', data.get('username', '')),
-            use_tls=bool(data.get('use_tls', True))
-        )
+    # Удаляем старые настройки
+    EmailConfig.query.delete()
 
-        db.session.add(config)
-        db.session.commit()
+    config = EmailConfig(
+        smtp_server=data.get('smtp_server', 'smtp.gmail.com'),
+        smtp_port=int(data.get('smtp_port', 587)),
+        username=data.get('username', ''),
+        password=data.get('password', ''),
+        from_email=data.get('from_email', data.get('username', '')),
+        use_tls=bool(data.get('use_tls', True))
+    )
 
-        # Обновляем конфиг в памяти
-        load_email_config()
+    db.session.add(config)
+    db.session.commit()
 
-        return jsonify({
-            'success': True,
-            'config': config.to_dict()
-        })
+    # Обновляем конфиг в памяти
+    load_email_config()
+    get_smtp_pool().invalidate()
+
+    return jsonify({
+        'success': True,
+        'config': config.to_dict()
+    })
 
 
 # API: Тест email
-@app.route('/api/email/test', methods=['POST'])
+@bp.route('/api/email/test', methods=['POST'])
 def test_email():
     data = request.json
     email = data.get('email')
@@ -341,24 +538,10 @@ def test_email():
     if not email:
         return jsonify({'error': 'Не указан email'}), 400
 
-    html = """
-    <h2>Тестовое письмо от Task Manager</h2>
-    <p>Если вы видите это письмо, значит настройки email работают правильно!</p>
-    <p>Теперь вы можете отправлять задачи по email.</p>
-    """
-
-    text = """
-    Тестовое письмо от Task Manager
-
-    Если вы видите это письмо, значит настройки email работают правильно!
-    Теперь вы можете отправлять задачи по email.
-    """
-
     success, message = send_email(
         email,
         "Тестовое письмо от Task Manager",
-        html,
-        text
+        render_email_parts('test', {}, cache_key=('test',))
     )
 
     return jsonify({
@@ -368,20 +551,19 @@ def test_email():
 
 
 # Глобальная обработка ошибок
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return jsonify({'error': 'Не найдено'}), 404
 
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return jsonify({'error': 'Внутренняя ошибка сервера'}), 500
 
 
 if __name__ == '__main__':
-    # Загружаем настройки email при запуске
+    app = create_app()
     with app.app_context():
-        load_email_config()
-
+        db.create_all()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
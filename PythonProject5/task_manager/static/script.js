@@ -4,6 +4,7 @@ document.addEventListener('DOMContentLoaded', function() {
     const taskForm = document.getElementById('task-form');
     const emailSettingsBtn = document.getElementById('email-settings-btn');
     const emailModal = document.getElementById('email-modal');
+    const searchInput = document.getElementById('search-input');
 
     // Фильтры
     let currentFilters = {
@@ -11,13 +12,28 @@ document.addEventListener('DOMContentLoaded', function() {
         priority: 'all'
     };
 
+    // Постраничная загрузка задач (бесконечная прокрутка)
+    const TASKS_PAGE_SIZE = 50;
+    let nextCursor = null;
+    let loadingMoreTasks = false;
+    let tasksRequestId = 0;
+
+    const tasksSentinel = document.createElement('div');
+    tasksSentinel.className = 'tasks-sentinel';
+
+    const sentinelObserver = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreTasks();
+        }
+    }, { rootMargin: '200px' });
+
     // Инициализация
     loadTasks();
     loadStats();
 
     // ========== ФУНКЦИИ ==========
 
-    // Загрузить задачи
+    // Загрузить задачи (первая страница)
     function loadTasks() {
         tasksContainer.innerHTML = `
             <div class="loading">
@@ -25,12 +41,16 @@ document.addEventListener('DOMContentLoaded', function() {
             </div>
         `;
 
-        const params = new URLSearchParams(currentFilters);
+        const requestId = ++tasksRequestId;
+        nextCursor = null;
 
-        fetch(`/api/tasks?${params}`)
-            .then(response => response.json())
-            .then(tasks => {
-                displayTasks(tasks);
+        fetchTasksPage(null)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                nextCursor = page.next_cursor;
+                displayTasks(page.tasks);
             })
             .catch(error => {
                 console.error('Ошибка:', error);
@@ -42,6 +62,47 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
 
+    // Запросить одну страницу задач начиная с курсора
+    function fetchTasksPage(cursor) {
+        const params = new URLSearchParams(currentFilters);
+        const searchTerm = searchInput.value.trim();
+        if (searchTerm) {
+            params.set('q', searchTerm);
+        }
+        params.set('limit', TASKS_PAGE_SIZE);
+        if (cursor) {
+            params.set('after', cursor);
+        }
+
+        return fetch(`/api/tasks?${params}`)
+            .then(response => response.json());
+    }
+
+    // Догрузить следующую страницу при прокрутке
+    function loadMoreTasks() {
+        if (!nextCursor || loadingMoreTasks) {
+            return;
+        }
+
+        const requestId = tasksRequestId;
+        loadingMoreTasks = true;
+
+        fetchTasksPage(nextCursor)
+            .then(page => {
+                if (requestId !== tasksRequestId) {
+                    return;
+                }
+                nextCursor = page.next_cursor;
+                appendTasks(page.tasks);
+            })
+            .catch(error => {
+                console.error('Ошибка:', error);
+            })
+            .finally(() => {
+                loadingMoreTasks = false;
+            });
+    }
+
     // Отобразить задачи
     function displayTasks(tasks) {
         if (tasks.length === 0) {
@@ -56,11 +117,22 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         tasksContainer.innerHTML = '';
+        tasksContainer.appendChild(tasksSentinel);
+        appendTasks(tasks);
+    }
 
+    // Добавить задачи в конец списка
+    function appendTasks(tasks) {
         tasks.forEach(task => {
             const taskElement = createTaskElement(task);
-            tasksContainer.appendChild(taskElement);
+            tasksContainer.insertBefore(taskElement, tasksSentinel);
         });
+
+        // Повторно наблюдаем за маркером: если он все еще виден, догружаем дальше
+        sentinelObserver.unobserve(tasksSentinel);
+        if (nextCursor) {
+            sentinelObserver.observe(tasksSentinel);
+        }
     }
 
     // Создать элемент задачи
@@ -533,21 +605,13 @@ document.addEventListener('DOMContentLoaded', function() {
         loadTasks();
     });
 
-    // Поиск
-    document.getElementById('search-input').addEventListener('input', function() {
-        const searchTerm = this.value.toLowerCase();
-        const tasks = document.querySelectorAll('.task-card');
-
-        tasks.forEach(task => {
-            const title = task.querySelector('.task-title').textContent.toLowerCase();
-            const description = task.querySelector('.task-description').textContent.toLowerCase();
+    // Поиск выполняет сервер; запрос уходит после паузы в наборе
+    const SEARCH_DELAY = 300;
+    let searchTimer = null;
 
-            if (title.includes(searchTerm) || description.includes(searchTerm)) {
-                task.style.display = 'block';
-            } else {
-                task.style.display = 'none';
-            }
-        });
+    searchInput.addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadTasks, SEARCH_DELAY);
     });
 
     // Обновлять статистику каждые 30 секунд